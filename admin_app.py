@@ -3,9 +3,17 @@ from flask_cors import CORS
 import os
 from datetime import timedelta
 import hashlib
+import json
+import base64
 import psycopg2
+import psycopg2.errors
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
+from versoes_cache import incrementar_versao, VERSAO_TAREFAS, VERSAO_CLIENTES
+from jobs_importacao import (
+    IMPORTADORES, novo_job_id, caminho_planilha, submeter_importacao, obter_job, listar_jobs,
+    limpar_jobs_expirados, STATUS_CONCLUIDO
+)
 
 # Carregar variáveis de ambiente
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -14,8 +22,16 @@ load_dotenv(dotenv_path)
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=4)
+# Tamanho máximo da planilha enviada para importação
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('IMPORTACOES_TAMANHO_MAX_MB', '20')) * 1024 * 1024
 CORS(app)
 
+# Linhas por página nas listagens (paginação keyset)
+TAMANHO_PAGINA_ADMIN = int(os.getenv('ADMIN_TAMANHO_PAGINA', '100'))
+
+# Opções devolvidas por busca nos campos com autocompletar
+LIMITE_OPCOES_BUSCA = 20
+
 # Configurações do Banco de Dados
 DB_CONFIG = {
     'host': os.getenv('HOST_DW'),
@@ -65,6 +81,204 @@ def verificar_admin(usuario, senha):
     finally:
         conn.close()
 
+# ========================================
+# PAGINAÇÃO DAS LISTAGENS (keyset)
+# ========================================
+
+def codificar_cursor_pagina(chave):
+    """Cursor opaco (usado na URL) que aponta para depois da linha com esta chave"""
+    return base64.urlsafe_b64encode(json.dumps(chave, default=str).encode()).decode()
+
+def decodificar_cursor_pagina(valor, tamanho):
+    """Chave de ordenação do cursor, ou None se ausente/inválido (volta à primeira página)"""
+    if not valor:
+        return None
+    try:
+        chave = json.loads(base64.urlsafe_b64decode(valor.encode()).decode())
+    except Exception:
+        return None
+    if not isinstance(chave, list) or len(chave) != tamanho:
+        return None
+    return chave
+
+def estimar_total(cursor, tabela, query=None, params=None):
+    """
+    Total aproximado sem COUNT(*): sem filtros usa pg_class.reltuples; com
+    filtros, a estimativa de linhas do planejador (EXPLAIN)
+    """
+    if query is None:
+        cursor.execute("""
+            SELECT GREATEST(reltuples, 0)::bigint AS total
+            FROM pg_class
+            WHERE oid = %s::regclass
+        """, (tabela,))
+        resultado = cursor.fetchone()
+        return resultado['total'] if resultado else 0
+    
+    cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plano = cursor.fetchone()['QUERY PLAN']
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]['Plan']['Plan Rows'])
+
+def paginar_listagem(cursor, query, params, tabela, colunas_ordem, filtrado):
+    """
+    Executa a listagem com paginação keyset e retorna (linhas, pagina)
+    
+    query deve terminar em "WHERE ..." (sem ORDER BY); colunas_ordem são
+    (expressão SQL, nome da coluna no resultado) e a última deve ser única.
+    O cursor da página vem do parâmetro "apos" da URL.
+    """
+    expressoes = [expr for expr, _ in colunas_ordem]
+    chave = decodificar_cursor_pagina(request.args.get('apos'), len(colunas_ordem))
+    
+    total_estimado = estimar_total(cursor, tabela, query if filtrado else None, params)
+    
+    query_pagina = query
+    params_pagina = list(params)
+    if chave:
+        query_pagina += f" AND ({', '.join(expressoes)}) > ({', '.join(['%s'] * len(chave))})"
+        params_pagina.extend(chave)
+    query_pagina += f" ORDER BY {', '.join(expressoes)} LIMIT %s"
+    params_pagina.append(TAMANHO_PAGINA_ADMIN + 1)
+    
+    cursor.execute(query_pagina, params_pagina)
+    linhas = cursor.fetchall()
+    
+    tem_proxima = len(linhas) > TAMANHO_PAGINA_ADMIN
+    linhas = linhas[:TAMANHO_PAGINA_ADMIN]
+    
+    # Links mantêm os filtros atuais
+    args = {k: v for k, v in request.args.items() if k != 'apos'}
+    url_proxima = None
+    if tem_proxima:
+        ultima = linhas[-1]
+        valores = [ultima[nome] if ultima[nome] is not None else '' for _, nome in colunas_ordem]
+        url_proxima = url_for(request.endpoint, apos=codificar_cursor_pagina(valores), **args)
+    
+    pagina = {
+        'exibindo': len(linhas),
+        'total_estimado': max(total_estimado, len(linhas)),
+        'url_proxima': url_proxima,
+        'url_primeira': url_for(request.endpoint, **args) if chave else None
+    }
+    return linhas, pagina
+
+# ========================================
+# OPÇÕES DOS FORMULÁRIOS (autocompletar)
+# ========================================
+
+# tipo -> consulta das opções (valor, nome, texto); "filtro" usa %(contem)s,
+# %(prefixo)s e %(documento)s (só dígitos, CNPJ/CPF) e "chave" é a coluna do valor
+OPCOES_BUSCA = {
+    'clientes': {
+        'colunas': "num_cnpj_cpf AS valor, nom_cliente AS nome, CONCAT(nom_cliente, ' (', num_cnpj_cpf, ')') AS texto",
+        'tabela': 'clientes',
+        'chave': 'num_cnpj_cpf',
+        'filtro': "(nom_cliente ILIKE %(contem)s OR num_cnpj_cpf LIKE %(documento)s)",
+        'ordem': "nom_cliente ILIKE %(prefixo)s DESC, nom_cliente"
+    },
+    'grupos': {
+        'colunas': "cod_grupo_tarefa AS valor, nome_grupo_tarefa AS nome, CONCAT(cod_grupo_tarefa, ' - ', nome_grupo_tarefa) AS texto",
+        'tabela': 'grupo_tarefas',
+        'chave': 'cod_grupo_tarefa',
+        'filtro': "(cod_grupo_tarefa ILIKE %(prefixo)s OR nome_grupo_tarefa ILIKE %(contem)s)",
+        'ordem': "cod_grupo_tarefa"
+    },
+    'colaboradores': {
+        'colunas': "usuario AS valor, nome_completo AS nome, CONCAT(nome_completo, ' (', usuario, ')') AS texto",
+        'tabela': 'funcionarios',
+        'chave': 'usuario',
+        'filtro': "ativo = TRUE AND (nome_completo ILIKE %(contem)s OR usuario ILIKE %(prefixo)s)",
+        'ordem': "nome_completo ILIKE %(prefixo)s DESC, nome_completo"
+    },
+}
+
+def _escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def buscar_opcoes(cursor, tipo, termo, limite=LIMITE_OPCOES_BUSCA):
+    """
+    Opções que casam com o termo: prefixo primeiro, depois "contém"
+    (índices trigram em scripts/indices_busca_admin.sql). Termo com menos de
+    2 letras busca só por prefixo.
+    """
+    config = OPCOES_BUSCA[tipo]
+    termo = _escapar_like(termo.strip())
+    digitos = ''.join(c for c in termo if c.isdigit())
+    
+    params = {
+        'prefixo': f'{termo}%',
+        'contem': f'%{termo}%' if len(termo) >= 2 else f'{termo}%',
+        'documento': f'{digitos}%' if digitos else None,
+        'limite': limite
+    }
+    cursor.execute(f"""
+        SELECT {config['colunas']}
+        FROM {config['tabela']}
+        WHERE {config['filtro']}
+        ORDER BY {config['ordem']}
+        LIMIT %(limite)s
+    """, params)
+    return [dict(o) for o in cursor.fetchall()]
+
+def obter_opcoes_selecionadas(cursor, tipo, valores):
+    """Opções dos valores já gravados (para exibir a seleção atual no formulário)"""
+    valores = [v for v in valores if v]
+    if not valores:
+        return {}
+    
+    config = OPCOES_BUSCA[tipo]
+    cursor.execute(f"""
+        SELECT {config['colunas']}
+        FROM {config['tabela']}
+        WHERE {config['chave']} = ANY(%s)
+    """, (valores,))
+    return {o['valor']: dict(o) for o in cursor.fetchall()}
+
+# ========================================
+# CONTADORES DO DASHBOARD
+# ========================================
+
+# Contador -> tabela usada na estimativa (pg_class.reltuples) quando falta o contador
+TABELAS_CONTADORES = {
+    'usuarios': 'funcionarios',
+    'clientes': 'clientes',
+    'tarefas': 'tarefas_colaborador',
+    'grupos': 'grupo_tarefas'
+}
+
+def obter_contadores_dashboard(conn, cursor):
+    """
+    Totais do dashboard lidos de contadores_dashboard (mantida por triggers,
+    ver scripts/contadores_dashboard.sql). Sem a tabela, usa as estimativas
+    do pg_class; stats['estimado'] lista os totais aproximados.
+    """
+    contadores = {}
+    try:
+        cursor.execute("SELECT nome, total FROM contadores_dashboard")
+        contadores = {c['nome']: c['total'] for c in cursor.fetchall()}
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        print("⚠️ contadores_dashboard não existe: usando estimativas (scripts/contadores_dashboard.sql)")
+    
+    stats = {nome: contadores[nome] for nome in TABELAS_CONTADORES if nome in contadores}
+    faltando = [nome for nome in TABELAS_CONTADORES if nome not in stats]
+    
+    if faltando:
+        cursor.execute("""
+            SELECT relname, GREATEST(reltuples, 0)::bigint AS total
+            FROM pg_class
+            WHERE oid = ANY(%s::regclass[])
+        """, ([TABELAS_CONTADORES[nome] for nome in faltando],))
+        estimativas = {e['relname']: e['total'] for e in cursor.fetchall()}
+        
+        for nome in faltando:
+            stats[nome] = estimativas.get(TABELAS_CONTADORES[nome], 0)
+    
+    stats['estimado'] = faltando
+    return stats
+
 # ========================================
 # ROTAS DE AUTENTICAÇÃO
 # ========================================
@@ -119,26 +333,7 @@ def dashboard():
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Estatísticas
-        cursor.execute("SELECT COUNT(*) as total FROM funcionarios WHERE ativo = true")
-        total_usuarios = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM clientes")
-        total_clientes = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM tarefas_colaborador")
-        total_tarefas = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM grupo_tarefas")
-        total_grupos = cursor.fetchone()['total']
-        
-        stats = {
-            'usuarios': total_usuarios,
-            'clientes': total_clientes,
-            'tarefas': total_tarefas,
-            'grupos': total_grupos
-        }
-        
+        stats = obter_contadores_dashboard(conn, cursor)
         return render_template('admin_dashboard.html', stats=stats)
         
     except Exception as e:
@@ -163,15 +358,19 @@ def listar_usuarios():
     
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
+        query = """
             SELECT id, usuario, nome_completo, email, departamento, 
                    nivel, nome_gestor, ativo
             FROM funcionarios
-            ORDER BY nome_completo
-        """)
+            WHERE 1=1
+        """
         
-        usuarios = cursor.fetchall()
-        return render_template('admin_usuarios.html', usuarios=usuarios)
+        usuarios, pagina = paginar_listagem(
+            cursor, query, [], 'funcionarios',
+            [("COALESCE(nome_completo, '')", 'nome_completo'), ('id', 'id')],
+            filtrado=False
+        )
+        return render_template('admin_usuarios.html', usuarios=usuarios, pagina=pagina)
         
     except Exception as e:
         flash(f'Erro ao listar usuários: {str(e)}', 'error')
@@ -335,23 +534,16 @@ def listar_tarefas():
             query += " AND (t.colaborador_1 = %s OR t.colaborador_2 = %s)"
             params.extend([colaborador, colaborador])
         
-        query += " ORDER BY c.nom_cliente, t.nome_tarefa"
-        
-        cursor.execute(query, params)
-        tarefas = cursor.fetchall()
-        
-        # Buscar clientes para dropdown
-        cursor.execute("SELECT DISTINCT nom_cliente FROM clientes ORDER BY nom_cliente")
-        clientes = [row['nom_cliente'] for row in cursor.fetchall()]
-        
-        # Buscar colaboradores para dropdown
-        cursor.execute("SELECT DISTINCT usuario FROM funcionarios WHERE ativo = true ORDER BY usuario")
-        colaboradores = [row['usuario'] for row in cursor.fetchall()]
+        tarefas, pagina = paginar_listagem(
+            cursor, query, params, 'tarefas_colaborador',
+            [("COALESCE(c.nom_cliente, '')", 'nom_cliente'), ("COALESCE(t.nome_tarefa, '')", 'nome_tarefa'), ('t.id', 'id')],
+            filtrado=bool(busca or cliente or colaborador)
+        )
         
+        # Filtros de cliente/colaborador carregam as opções sob demanda (/api/opcoes)
         return render_template('admin_tarefas.html', 
                              tarefas=tarefas,
-                             clientes=clientes,
-                             colaboradores=colaboradores,
+                             pagina=pagina,
                              filtros={'busca': busca, 'cliente': cliente, 'colaborador': colaborador})
         
     except Exception as e:
@@ -396,24 +588,14 @@ def nova_tarefa():
                   colaborador_1, colaborador_2, estimativa_horas, prioridade))
             
             conn.commit()
+            incrementar_versao(VERSAO_TAREFAS)
             flash('Tarefa cadastrada com sucesso!', 'success')
             return redirect(url_for('listar_tarefas'))
         
-        # GET - carregar dados para form
-        cursor.execute("SELECT num_cnpj_cpf, nom_cliente FROM clientes ORDER BY nom_cliente")
-        clientes = cursor.fetchall()
-        
-        cursor.execute("SELECT cod_grupo_tarefa, nome_grupo_tarefa FROM grupo_tarefas ORDER BY cod_grupo_tarefa")
-        grupos = cursor.fetchall()
-        
-        cursor.execute("SELECT usuario, nome_completo FROM funcionarios WHERE ativo = true ORDER BY nome_completo")
-        colaboradores = cursor.fetchall()
-        
+        # GET - opções de cliente, grupo e colaborador são buscadas sob demanda
         return render_template('admin_tarefa_form.html', 
                              tarefa=None,
-                             clientes=clientes,
-                             grupos=grupos,
-                             colaboradores=colaboradores)
+                             selecionados={})
         
     except Exception as e:
         if conn:
@@ -461,6 +643,7 @@ def editar_tarefa(id):
                   colaborador_1, colaborador_2, estimativa_horas, prioridade, id))
             
             conn.commit()
+            incrementar_versao(VERSAO_TAREFAS)
             flash('Tarefa atualizada com sucesso! (ID preservado)', 'success')
             return redirect(url_for('listar_tarefas'))
         
@@ -472,20 +655,16 @@ def editar_tarefa(id):
             flash('Tarefa não encontrada', 'error')
             return redirect(url_for('listar_tarefas'))
         
-        cursor.execute("SELECT num_cnpj_cpf, nom_cliente FROM clientes ORDER BY nom_cliente")
-        clientes = cursor.fetchall()
-        
-        cursor.execute("SELECT cod_grupo_tarefa, nome_grupo_tarefa FROM grupo_tarefas ORDER BY cod_grupo_tarefa")
-        grupos = cursor.fetchall()
-        
-        cursor.execute("SELECT usuario, nome_completo FROM funcionarios WHERE ativo = true ORDER BY nome_completo")
-        colaboradores = cursor.fetchall()
+        # Só as opções já selecionadas; as demais são buscadas sob demanda
+        selecionados = {
+            'clientes': obter_opcoes_selecionadas(cursor, 'clientes', [tarefa['cnpj_cpf']]),
+            'grupos': obter_opcoes_selecionadas(cursor, 'grupos', [tarefa['cod_grupo_tarefa']]),
+            'colaboradores': obter_opcoes_selecionadas(cursor, 'colaboradores', [tarefa['colaborador_1'], tarefa['colaborador_2']])
+        }
         
         return render_template('admin_tarefa_form.html',
                              tarefa=tarefa,
-                             clientes=clientes,
-                             grupos=grupos,
-                             colaboradores=colaboradores)
+                             selecionados=selecionados)
         
     except Exception as e:
         if conn:
@@ -519,6 +698,7 @@ def deletar_tarefa(id):
         
         cursor.execute("DELETE FROM tarefas_colaborador WHERE id = %s", (id,))
         conn.commit()
+        incrementar_versao(VERSAO_TAREFAS)
         
         return jsonify({'success': True, 'message': 'Tarefa deletada com sucesso!'})
         
@@ -529,6 +709,199 @@ def deletar_tarefa(id):
     finally:
         conn.close()
 
+# ========================================
+# ALTERAÇÃO DE TAREFAS EM LOTE
+# ========================================
+
+# Máximo de tarefas listadas na prévia (o total é sempre exato)
+AMOSTRA_PREVIA_LOTE = 20
+
+def ler_lote_tarefas(dados):
+    """
+    Valida o pedido de alteração em lote
+    
+    Retorna (filtros, acao, novo_colaborador, erro); erro é None se válido.
+    """
+    filtros = {
+        'colaborador': (dados.get('colaborador') or '').strip() or None,
+        'cliente': (dados.get('cliente') or '').strip() or None,
+        'grupo': (dados.get('grupo') or '').strip() or None
+    }
+    acao = dados.get('acao')
+    novo_colaborador = (dados.get('novo_colaborador') or '').strip() or None
+    
+    if not any(filtros.values()):
+        return filtros, acao, novo_colaborador, 'Informe ao menos um filtro (colaborador, cliente ou grupo)'
+    
+    if acao not in ('reatribuir', 'desativar'):
+        return filtros, acao, novo_colaborador, 'Ação inválida (use reatribuir ou desativar)'
+    
+    if acao == 'reatribuir':
+        if not filtros['colaborador']:
+            return filtros, acao, novo_colaborador, 'Para reatribuir, informe o colaborador atual'
+        if not novo_colaborador:
+            return filtros, acao, novo_colaborador, 'Informe o novo colaborador'
+        if novo_colaborador == filtros['colaborador']:
+            return filtros, acao, novo_colaborador, 'O novo colaborador é o mesmo do filtro'
+    
+    return filtros, acao, novo_colaborador, None
+
+def montar_filtro_lote_tarefas(filtros, acao):
+    """WHERE das tarefas afetadas (parâmetros nomeados, alias t)"""
+    condicoes = []
+    
+    if filtros['colaborador']:
+        condicoes.append("(t.colaborador_1 = %(colaborador)s OR t.colaborador_2 = %(colaborador)s)")
+    elif acao == 'desativar':
+        # Sem colaborador no filtro: só conta tarefas que ainda têm alguém
+        condicoes.append("(t.colaborador_1 IS NOT NULL OR t.colaborador_2 IS NOT NULL)")
+    
+    if filtros['cliente']:
+        condicoes.append("t.cnpj_cpf = %(cliente)s")
+    
+    if filtros['grupo']:
+        condicoes.append("t.cod_grupo_tarefa = %(grupo)s")
+    
+    return ' AND '.join(condicoes)
+
+# Novos valores de colaborador_1/colaborador_2 por ação. Reatribuir troca o
+# colaborador do filtro pelo novo (sem duplicar quem já está na outra vaga);
+# desativar remove o colaborador do filtro (o secundário vira principal) ou,
+# sem colaborador no filtro, remove os dois - como na edição manual
+SET_LOTE_TAREFAS = {
+    'reatribuir': """
+        colaborador_1 = CASE WHEN t.colaborador_1 = %(colaborador)s THEN %(novo)s ELSE t.colaborador_1 END,
+        colaborador_2 = CASE
+            WHEN t.colaborador_2 = %(colaborador)s AND t.colaborador_1 = %(novo)s THEN NULL
+            WHEN t.colaborador_2 = %(colaborador)s THEN %(novo)s
+            WHEN t.colaborador_2 = %(novo)s AND t.colaborador_1 = %(colaborador)s THEN NULL
+            ELSE t.colaborador_2
+        END
+    """,
+    'desativar': """
+        colaborador_1 = CASE
+            WHEN %(colaborador)s::text IS NULL THEN NULL
+            WHEN t.colaborador_1 = %(colaborador)s THEN NULLIF(t.colaborador_2, %(colaborador)s)
+            ELSE t.colaborador_1
+        END,
+        colaborador_2 = CASE
+            WHEN %(colaborador)s::text IS NULL THEN NULL
+            WHEN t.colaborador_1 = %(colaborador)s OR t.colaborador_2 = %(colaborador)s THEN NULL
+            ELSE t.colaborador_2
+        END
+    """
+}
+
+@app.route('/tarefas/lote')
+def tarefas_lote():
+    if 'admin_usuario' not in session:
+        return redirect(url_for('login'))
+    
+    return render_template('admin_tarefas_lote.html')
+
+@app.route('/tarefas/lote/previa', methods=['POST'])
+def previa_tarefas_lote():
+    """Quantas e quais tarefas serão alteradas (nada é gravado)"""
+    if 'admin_usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autorizado'}), 401
+    
+    filtros, acao, novo_colaborador, erro = ler_lote_tarefas(request.get_json() or {})
+    if erro:
+        return jsonify({'success': False, 'message': erro}), 400
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        where_sql = montar_filtro_lote_tarefas(filtros, acao)
+        
+        cursor.execute(f"SELECT COUNT(*) AS total FROM tarefas_colaborador t WHERE {where_sql}", filtros)
+        total = cursor.fetchone()['total']
+        
+        cursor.execute(f"""
+            SELECT t.id, c.nom_cliente, t.nome_tarefa, t.colaborador_1, t.colaborador_2
+            FROM tarefas_colaborador t
+            LEFT JOIN clientes c ON t.cnpj_cpf = c.num_cnpj_cpf
+            WHERE {where_sql}
+            ORDER BY c.nom_cliente, t.nome_tarefa, t.id
+            LIMIT %(limite)s
+        """, dict(filtros, limite=AMOSTRA_PREVIA_LOTE))
+        amostra = [dict(t) for t in cursor.fetchall()]
+        
+        return jsonify({'success': True, 'total': total, 'amostra': amostra})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/tarefas/lote/aplicar', methods=['POST'])
+def aplicar_tarefas_lote():
+    """
+    Reatribui ou desativa todas as tarefas do filtro em uma transação
+    
+    total_previsto (da prévia) precisa bater com as linhas alteradas; se as
+    tarefas mudaram desde a prévia, nada é gravado.
+    """
+    if 'admin_usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autorizado'}), 401
+    
+    dados = request.get_json() or {}
+    filtros, acao, novo_colaborador, erro = ler_lote_tarefas(dados)
+    if erro:
+        return jsonify({'success': False, 'message': erro}), 400
+    
+    try:
+        total_previsto = int(dados.get('total_previsto'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Faça a prévia antes de aplicar'}), 400
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        if novo_colaborador:
+            cursor.execute("SELECT ativo FROM funcionarios WHERE usuario = %s", (novo_colaborador,))
+            novo = cursor.fetchone()
+            if not novo or not novo['ativo']:
+                return jsonify({'success': False, 'message': f'Colaborador {novo_colaborador} não existe ou está inativo'}), 400
+        
+        cursor.execute(f"""
+            UPDATE tarefas_colaborador t
+            SET {SET_LOTE_TAREFAS[acao]}
+            WHERE {montar_filtro_lote_tarefas(filtros, acao)}
+        """, dict(filtros, novo=novo_colaborador))
+        alteradas = cursor.rowcount
+        
+        if alteradas != total_previsto:
+            conn.rollback()
+            return jsonify({
+                'success': False,
+                'message': f'As tarefas mudaram desde a prévia ({alteradas} em vez de {total_previsto}). Refaça a prévia.',
+                'total': alteradas
+            }), 409
+        
+        conn.commit()
+        incrementar_versao(VERSAO_TAREFAS)
+        
+        print(f"📦 Lote de tarefas '{acao}' por {session.get('admin_usuario')}: {alteradas} tarefa(s) | filtros={filtros} novo={novo_colaborador}")
+        return jsonify({
+            'success': True,
+            'message': f"{alteradas} tarefa(s) {'reatribuída(s)' if acao == 'reatribuir' else 'desativada(s)'} com sucesso!",
+            'total': alteradas
+        })
+        
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
 # ========================================
 # GERENCIAMENTO DE GRUPOS DE TAREFAS
 # ========================================
@@ -565,10 +938,11 @@ def listar_grupos():
             query += " AND departamento ILIKE %s"
             params.append(f'%{departamento_filtro}%')
         
-        query += " ORDER BY departamento, cod_grupo_tarefa"
-        
-        cursor.execute(query, params)
-        grupos = cursor.fetchall()
+        grupos, pagina = paginar_listagem(
+            cursor, query, params, 'grupo_tarefas',
+            [("COALESCE(departamento, '')", 'departamento'), ('cod_grupo_tarefa', 'cod_grupo_tarefa')],
+            filtrado=bool(busca or departamento_filtro)
+        )
         
         # Buscar lista de departamentos únicos para o filtro
         cursor.execute("""
@@ -581,6 +955,7 @@ def listar_grupos():
         
         return render_template('admin_grupos.html', 
                              grupos=grupos, 
+                             pagina=pagina,
                              departamentos=departamentos,
                              filtros={'busca': busca, 'departamento': departamento_filtro})
         
@@ -678,6 +1053,11 @@ def editar_grupo(cod):
             """, (novo_cod, nome_grupo_tarefa, departamento if departamento else None, cod))
             
             conn.commit()
+            
+            # Código do grupo aparece na lista de tarefas dos usuários
+            if novo_cod != cod:
+                incrementar_versao(VERSAO_TAREFAS)
+            
             flash('Grupo atualizado com sucesso!', 'success')
             return redirect(url_for('listar_grupos'))
         
@@ -785,10 +1165,11 @@ def listar_clientes():
             query += " AND des_grupo ILIKE %s"
             params.append(f'%{grupo}%')
         
-        query += " ORDER BY nom_cliente"
-        
-        cursor.execute(query, params)
-        clientes = cursor.fetchall()
+        clientes, pagina = paginar_listagem(
+            cursor, query, params, 'clientes',
+            [("COALESCE(nom_cliente, '')", 'nom_cliente'), ('id', 'id')],
+            filtrado=bool(busca or grupo)
+        )
         
         # Buscar lista de grupos únicos para o filtro
         cursor.execute("""
@@ -801,6 +1182,7 @@ def listar_clientes():
         
         return render_template('admin_clientes.html', 
                              clientes=clientes, 
+                             pagina=pagina,
                              grupos=grupos,
                              filtros={'busca': busca, 'grupo': grupo})
         
@@ -834,6 +1216,7 @@ def novo_cliente():
             """, (num_cnpj_cpf, nom_cliente, cod_grupo_cliente, des_grupo))
             
             conn.commit()
+            incrementar_versao(VERSAO_CLIENTES)
             flash(f'Cliente {nom_cliente} cadastrado com sucesso!', 'success')
             return redirect(url_for('listar_clientes'))
             
@@ -893,6 +1276,7 @@ def editar_cliente(id):
             """, (num_cnpj_cpf, nom_cliente, cod_grupo_cliente, des_grupo, id))
             
             conn.commit()
+            incrementar_versao(VERSAO_CLIENTES)
             flash('Cliente atualizado com sucesso!', 'success')
             return redirect(url_for('listar_clientes'))
         
@@ -951,6 +1335,7 @@ def deletar_cliente(id):
         
         cursor.execute("DELETE FROM clientes WHERE id = %s", (id,))
         conn.commit()
+        incrementar_versao(VERSAO_CLIENTES)
         
         return jsonify({'success': True, 'message': 'Cliente deletado com sucesso!'})
         
@@ -961,6 +1346,88 @@ def deletar_cliente(id):
     finally:
         conn.close()
 
+# ========================================
+# IMPORTAÇÃO DE PLANILHAS
+# ========================================
+
+@app.route('/importacoes')
+def importacoes():
+    if 'admin_usuario' not in session:
+        return redirect(url_for('login'))
+    
+    limpar_jobs_expirados()
+    return render_template('admin_importacoes.html', importadores=IMPORTADORES, jobs=listar_jobs())
+
+@app.route('/importacoes', methods=['POST'])
+def nova_importacao():
+    """Recebe a planilha e enfileira a importação (ou a simulação) em segundo plano"""
+    if 'admin_usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autorizado'}), 401
+    
+    tipo = request.form.get('tipo')
+    arquivo = request.files.get('arquivo')
+    simular = request.form.get('simular') == '1'
+    
+    if tipo not in IMPORTADORES:
+        return jsonify({'success': False, 'message': 'Tipo de importação inválido'}), 400
+    
+    if not arquivo or not arquivo.filename.lower().endswith('.xlsx'):
+        return jsonify({'success': False, 'message': 'Envie uma planilha .xlsx'}), 400
+    
+    try:
+        job_id = novo_job_id()
+        arquivo.save(caminho_planilha(job_id))
+        job, erro = submeter_importacao(job_id, session['admin_usuario'], tipo, arquivo.filename, simular)
+    except OSError as e:
+        print(f"❌ Erro ao enfileirar importação: {e}")
+        return jsonify({'success': False, 'message': f'Erro ao salvar a planilha: {e}'}), 500
+    
+    if erro:
+        os.remove(caminho_planilha(job_id))
+        return jsonify({'success': False, 'message': erro}), 409
+    
+    return jsonify({'success': True, 'job': job}), 202
+
+@app.route('/importacoes/<job_id>/confirmar', methods=['POST'])
+def confirmar_importacao(job_id):
+    """Importa de verdade a planilha de uma simulação concluída (sem reenviar o arquivo)"""
+    if 'admin_usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autorizado'}), 401
+    
+    simulacao = obter_job(job_id)
+    if not simulacao or not simulacao['simular'] or simulacao['status'] != STATUS_CONCLUIDO:
+        return jsonify({'success': False, 'message': 'Simulação não encontrada ou não concluída'}), 404
+    
+    if simulacao['resultado'] and simulacao['resultado']['erros']:
+        return jsonify({'success': False, 'message': 'A simulação encontrou erros: corrija a planilha e envie de novo'}), 400
+    
+    if not os.path.exists(simulacao['planilha']):
+        return jsonify({'success': False, 'message': 'A planilha da simulação expirou: envie de novo'}), 410
+    
+    try:
+        job, erro = submeter_importacao(novo_job_id(), session['admin_usuario'], simulacao['tipo'],
+                                        simulacao['arquivo'], False, planilha=simulacao['planilha'])
+    except OSError as e:
+        print(f"❌ Erro ao enfileirar importação: {e}")
+        return jsonify({'success': False, 'message': f'Erro ao enfileirar a importação: {e}'}), 500
+    
+    if erro:
+        return jsonify({'success': False, 'message': erro}), 409
+    
+    return jsonify({'success': True, 'job': job}), 202
+
+@app.route('/api/importacoes/<job_id>')
+def api_importacao(job_id):
+    """Estado, progresso e resultado (diff) de uma importação"""
+    if 'admin_usuario' not in session:
+        return jsonify({'success': False}), 401
+    
+    job = obter_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Importação não encontrada ou expirada'}), 404
+    
+    return jsonify({'success': True, 'job': job})
+
 # ========================================
 # API AUXILIAR
 # ========================================
@@ -989,6 +1456,29 @@ def api_buscar_cliente(cnpj):
     finally:
         conn.close()
 
+@app.route('/api/opcoes/<tipo>')
+def api_opcoes(tipo):
+    """Opções para os campos com autocompletar (?q=termo)"""
+    if 'admin_usuario' not in session:
+        return jsonify({'success': False}), 401
+    
+    if tipo not in OPCOES_BUSCA:
+        return jsonify({'success': False, 'error': 'Tipo de opção inválido'}), 404
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False}), 500
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        opcoes = buscar_opcoes(cursor, tipo, request.args.get('q', ''))
+        return jsonify({'success': True, 'opcoes': opcoes})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+
 if __name__ == '__main__':
     print("🔒 Sistema Administrativo - Booker Brasil")
     print("📊 Gerenciamento de Usuários e Tarefas")
@@ -1,15 +1,28 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
 from flask_cors import CORS
 import requests
 import os
 from datetime import timedelta, datetime
 import hashlib
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.errors
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 import uuid
-from threading import Thread
+import unicodedata
+import json
+import base64
+import csv
+import io
+import zlib
+from threading import Thread, BoundedSemaphore
 import time
+from versoes_cache import obter_versao, VERSAO_TAREFAS, VERSAO_CLIENTES
+from relatorios_mensais import escopo_relatorio_mensal, obter_relatorio_mensal, invalidar_relatorios_mensais
+from cliente_n8n import enviar_webhook, CircuitoAberto, registrar_falha, estado_circuito
+from jobs_relatorios import (
+    submeter_job, registrar_job_concluido, obter_job, caminho_resultado, limpar_jobs_expirados, STATUS_CONCLUIDO
+)
 
 # Carregar variáveis de ambiente
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -30,12 +43,60 @@ DB_CONFIG = {
     'options': '-c search_path=apontador_horas,public'
 }
 
-# URL do webhook do n8n
-N8N_WEBHOOK_URL = "https://n8n.bookerbrasil.com/webhook/9d8f9a85-c21d-4aed-bd52-124af0d116c3/chat"
+# Chamadas simultâneas ao n8n por processo: o restante das threads do worker
+# (gunicorn gthread) fica livre para timers, buscas e pausar/finalizar
+CHAT_MAX_CONCORRENTES = int(os.getenv('CHAT_MAX_CONCORRENTES', '4'))
+vagas_chat = BoundedSemaphore(CHAT_MAX_CONCORRENTES)
 
 # Sistema de alertas - POR USUÁRIO
 alertas_por_usuario = {}  # {usuario: [alertas]}
 
+# Cache de tarefas atribuídas - POR USUÁRIO
+cache_tarefas_usuario = {}  # {usuario: {'versao': (...), 'tarefas': [tarefas]}}
+
+# Cache CNPJ/CPF -> id do cliente (usado nas gravações de apontamentos)
+cache_ids_clientes = {'versao': None, 'ids': {}}  # {'versao': ..., 'ids': {cnpj: cliente_id}}
+
+# Paginação da lista "todas as minhas tarefas"
+TAMANHO_PAGINA_TAREFAS_MAX = 200
+
+# Limite de linhas por lote de apontamentos atrasados
+LOTE_ATRASADO_MAX = 200
+
+# Linhas buscadas por ida ao banco nos cursores de exportação (server-side)
+EXPORTACAO_ITERSIZE = 2000
+
+# Tarefas do usuário ordenadas por prioridade, cliente e nome (id desempata a paginação)
+SQL_TAREFAS_USUARIO = """
+    SELECT *
+    FROM (
+        SELECT 
+            t.id,
+            t.nome_tarefa,
+            t.cod_grupo_tarefa,
+            t.prioridade,
+            t.estimativa_horas,
+            t.cnpj_cpf,
+            c.nom_cliente,
+            c.des_grupo,
+            CASE 
+                WHEN LOWER(t.prioridade) LIKE '%%alta%%' OR LOWER(t.prioridade) LIKE '%%p2%%' THEN 1
+                WHEN LOWER(t.prioridade) LIKE '%%média%%' OR LOWER(t.prioridade) LIKE '%%media%%' OR LOWER(t.prioridade) LIKE '%%p1%%' THEN 2
+                WHEN LOWER(t.prioridade) LIKE '%%baixa%%' OR LOWER(t.prioridade) LIKE '%%p3%%' THEN 3
+                ELSE 4
+            END AS ordem_prioridade
+        FROM tarefas_colaborador t
+        LEFT JOIN clientes c ON t.cnpj_cpf = c.num_cnpj_cpf
+        WHERE (t.colaborador_1 = %s OR t.colaborador_2 = %s)
+    ) tarefas
+    WHERE {filtro_cursor}
+    ORDER BY ordem_prioridade, COALESCE(nom_cliente, ''), COALESCE(nome_tarefa, ''), id
+    {limite}
+"""
+
+# Colunas usadas só na ordenação/cursor: não vão para o JSON da API
+COLUNAS_INTERNAS_TAREFA = ('ordem_prioridade',)
+
 def get_db_connection():
     """Cria uma conexão com o banco de dados PostgreSQL"""
     try:
@@ -258,6 +319,359 @@ def get_usuarios_permitidos(usuario_logado, nivel_logado):
     finally:
         conn.close()
 
+def obter_tarefas_usuario(usuario):
+    """
+    Retorna todas as tarefas atribuídas ao usuário, servidas do cache em memória
+    
+    O cache é invalidado quando admin_app.py ou os importadores incrementam
+    a versão de tarefas/clientes (ver versoes_cache.py)
+    """
+    # Ler a versão ANTES de consultar o banco: uma gravação concorrente
+    # incrementa a versão e a próxima chamada recarrega a lista
+    versao = (obter_versao(VERSAO_TAREFAS), obter_versao(VERSAO_CLIENTES))
+    
+    em_cache = cache_tarefas_usuario.get(usuario)
+    if em_cache and em_cache['versao'] == versao:
+        return em_cache['tarefas']
+    
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            SQL_TAREFAS_USUARIO.format(filtro_cursor='TRUE', limite=''),
+            (usuario, usuario)
+        )
+        
+        tarefas = [dict(t) for t in cursor.fetchall()]
+        cache_tarefas_usuario[usuario] = {'versao': versao, 'tarefas': tarefas}
+        
+        print(f"🗂️ Cache de tarefas recarregado: {usuario} - {len(tarefas)} tarefas")
+        return tarefas
+    finally:
+        conn.close()
+
+def obter_cliente_id(cursor, cnpj):
+    """
+    Resolve CNPJ/CPF -> clientes.id usando o cache em memória
+    
+    O cache é descartado quando admin_app.py ou importar_clientes.py
+    incrementam a versão de clientes. Retorna None se o cliente não existe.
+    """
+    global cache_ids_clientes
+    
+    versao = obter_versao(VERSAO_CLIENTES)
+    if cache_ids_clientes['versao'] != versao:
+        cache_ids_clientes = {'versao': versao, 'ids': {}}
+    
+    ids = cache_ids_clientes['ids']
+    if cnpj in ids:
+        return ids[cnpj]
+    
+    cursor.execute("SELECT id FROM clientes WHERE num_cnpj_cpf = %s", (cnpj,))
+    cliente = cursor.fetchone()
+    if not cliente:
+        return None
+    
+    ids[cnpj] = cliente['id']
+    return cliente['id']
+
+def converter_intervalo_atrasado(data_inicio, data_fim):
+    """
+    Valida e converte o intervalo de um apontamento atrasado
+    Retorna (data_inicio_str, data_fim_str) para o PostgreSQL; ValueError se inválido
+    """
+    try:
+        dt_inicio = datetime.fromisoformat(str(data_inicio).replace('Z', '+00:00'))
+        dt_fim = datetime.fromisoformat(str(data_fim).replace('Z', '+00:00'))
+        posterior = dt_fim > dt_inicio
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Formato de data inválido: {e}')
+    
+    if not posterior:
+        raise ValueError('Data fim deve ser posterior à data início')
+    
+    # Converter para string no formato adequado para PostgreSQL
+    return dt_inicio.strftime('%Y-%m-%d %H:%M:%S'), dt_fim.strftime('%Y-%m-%d %H:%M:%S')
+
+def buscar_sobreposicoes(cursor, funcionario_id, data_inicio_str, data_fim_str, ignorar_id=None):
+    """
+    Retorna os apontamentos do funcionário que se sobrepõem ao intervalo
+    
+    Usa o índice GiST idx_apontamentos_funcionario_periodo
+    (scripts/indice_sobreposicao_apontamentos.sql): a expressão
+    tsrange(data_inicio, data_fim) e o filtro de data_fim < data_inicio
+    precisam ser os mesmos do índice (parcial)
+    """
+    cursor.execute("""
+        SELECT 
+            a.id AS apontamento_id,
+            a.status,
+            c.nom_cliente AS cliente_nome,
+            t.nome_tarefa AS tarefa_nome,
+            TO_CHAR(a.data_inicio AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS') AS data_inicio,
+            TO_CHAR(a.data_fim AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS') AS data_fim
+        FROM apontamentos_horas a
+        INNER JOIN clientes c ON a.cliente_id = c.id
+        INNER JOIN tarefas_colaborador t ON a.tarefa_id = t.id
+        WHERE a.funcionario_id = %s
+          AND (a.data_fim IS NULL OR a.data_fim >= a.data_inicio)
+          AND tsrange(a.data_inicio, a.data_fim) && tsrange(%s::timestamp, %s::timestamp)
+          AND a.id IS DISTINCT FROM %s
+        ORDER BY a.data_inicio
+        LIMIT 20
+    """, (funcionario_id, data_inicio_str, data_fim_str, ignorar_id))
+    
+    return [dict(a) for a in cursor.fetchall()]
+
+def bloquear_apontamento(cursor, apontamento_id, funcionario_id):
+    """
+    Trava a linha do apontamento (SELECT ... FOR UPDATE) e retorna o status atual
+    
+    Duas abas ou um clique duplo na mesma tarefa ficam em fila nesta linha;
+    a segunda requisição já enxerga o status gravado pela primeira.
+    Retorna None se o apontamento não existe ou não pertence ao funcionário.
+    """
+    cursor.execute("""
+        SELECT status
+        FROM apontamentos_horas
+        WHERE id = %s AND funcionario_id = %s
+        FOR UPDATE
+    """, (apontamento_id, funcionario_id))
+    
+    apontamento = cursor.fetchone()
+    return apontamento['status'] if apontamento else None
+
+def resposta_conflito(status_atual, mensagem):
+    """Resposta HTTP 409 para transição inválida (tarefa mudou de estado em outra aba)"""
+    return jsonify({
+        'success': False,
+        'conflito': True,
+        'status_atual': status_atual,
+        'message': mensagem
+    }), 409
+
+# Ações aceitas pelo endpoint em lote: ação -> (tipo do evento, status de origem)
+ACOES_LOTE_TAREFAS = {
+    'pausar': ('pausa', ('em_andamento',)),
+    'finalizar': ('finalizacao', ('em_andamento', 'pausado')),
+}
+
+def consultar_tarefas_ativas(cursor, usuario):
+    """Tarefas em andamento ou pausadas do usuário (mais recente primeiro)"""
+    cursor.execute("""
+        SELECT 
+            a.id AS apontamento_id,
+            a.status,
+            c.nom_cliente AS cliente_nome,
+            c.num_cnpj_cpf AS cnpj,
+            t.nome_tarefa AS tarefa_nome,
+            a.tarefa_id,
+            TO_CHAR(a.data_inicio AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS') AS data_inicio,
+            CASE 
+                WHEN a.status = 'pausado' THEN 
+                    (SELECT TO_CHAR(p.data_pausa AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS')
+                     FROM apontador_horas.pausas p 
+                     WHERE p.apontamento_id = a.id 
+                       AND p.data_retomada IS NULL 
+                     LIMIT 1)
+                ELSE NULL
+            END AS data_pausa,
+            COALESCE(
+                (SELECT SUM(EXTRACT(EPOCH FROM (
+                    COALESCE(p.data_retomada, NOW()) - p.data_pausa
+                )) * 1000)
+                FROM apontador_horas.pausas p
+                WHERE p.apontamento_id = a.id),
+                0
+            ) AS tempo_pausado_ms
+        FROM apontador_horas.apontamentos_horas a
+        INNER JOIN apontador_horas.funcionarios f ON a.funcionario_id = f.id
+        INNER JOIN apontador_horas.clientes c ON a.cliente_id = c.id
+        INNER JOIN apontador_horas.tarefas_colaborador t ON a.tarefa_id = t.id
+        WHERE f.usuario = %s
+          AND a.status IN ('em_andamento', 'pausado')
+        ORDER BY a.data_inicio DESC
+    """, (usuario,))
+    
+    return cursor.fetchall()
+
+def executar_lote_tarefas(cursor, acao, apontamento_ids, funcionario_id):
+    """
+    Aplica pausar/finalizar aos apontamentos do funcionário (sem commit)
+    
+    Retorna (status_por_id, aplicar_ids, apontamentos): status encontrado de
+    cada id, ids em que a ação foi aplicada e as horas trabalhadas de cada um.
+    """
+    tipo_evento, status_origem = ACOES_LOTE_TAREFAS[acao]
+    
+    # Travar todas as linhas de uma vez (ordem por id evita deadlock entre lotes)
+    cursor.execute("""
+        SELECT id, status
+        FROM apontamentos_horas
+        WHERE id = ANY(%s) AND funcionario_id = %s
+        ORDER BY id
+        FOR UPDATE
+    """, (apontamento_ids, funcionario_id))
+    
+    status_por_id = {a['id']: a['status'] for a in cursor.fetchall()}
+    aplicar_ids = [i for i in apontamento_ids if status_por_id.get(i) in status_origem]
+    
+    if not aplicar_ids:
+        return status_por_id, aplicar_ids, []
+    
+    # Um INSERT para o lote inteiro (o trigger aplica cada transição)
+    cursor.execute("""
+        INSERT INTO eventos_apontamento (apontamento_id, tipo)
+        SELECT UNNEST(%s::int[]), %s
+    """, (aplicar_ids, tipo_evento))
+    
+    # Horas trabalhadas de todos os apontamentos do lote em uma consulta
+    cursor.execute("""
+        SELECT 
+            a.id,
+            a.data_inicio,
+            EXTRACT(EPOCH FROM (COALESCE(a.data_fim, NOW()) - a.data_inicio))/3600
+            - COALESCE(SUM(EXTRACT(EPOCH FROM (
+                COALESCE(p.data_retomada, NOW()) - p.data_pausa
+            )))/3600, 0) AS horas_trabalhadas
+        FROM apontamentos_horas a
+        LEFT JOIN pausas p ON p.apontamento_id = a.id
+        WHERE a.id = ANY(%s)
+        GROUP BY a.id, a.data_inicio, a.data_fim
+    """, (aplicar_ids,))
+    
+    return status_por_id, aplicar_ids, cursor.fetchall()
+
+def codificar_cursor_tarefa(tarefa):
+    """Gera o cursor opaco (keyset) que aponta para depois desta tarefa"""
+    chave = [tarefa['ordem_prioridade'], tarefa['nom_cliente'] or '', tarefa['nome_tarefa'] or '', tarefa['id']]
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode()
+
+def decodificar_cursor_tarefa(cursor_pagina):
+    """Converte o cursor recebido do frontend na chave (prioridade, cliente, nome, id)"""
+    try:
+        chave = json.loads(base64.urlsafe_b64decode(cursor_pagina.encode()).decode())
+        ordem, nom_cliente, nome_tarefa, tarefa_id = chave
+        return int(ordem), str(nom_cliente), str(nome_tarefa), int(tarefa_id)
+    except Exception:
+        raise ValueError('Cursor de paginação inválido')
+
+def paginar_tarefas_usuario(usuario, limite, cursor_pagina=None):
+    """
+    Retorna uma página (keyset) das tarefas do usuário e o cursor da próxima
+    
+    Com o cache em memória válido, a página é recortada da lista já montada;
+    caso contrário, busca no banco apenas as linhas da página
+    """
+    chave = decodificar_cursor_tarefa(cursor_pagina) if cursor_pagina else None
+    
+    versao = (obter_versao(VERSAO_TAREFAS), obter_versao(VERSAO_CLIENTES))
+    em_cache = cache_tarefas_usuario.get(usuario)
+    
+    if em_cache and em_cache['versao'] == versao:
+        tarefas = em_cache['tarefas']
+        inicio = 0
+        if chave:
+            # Mesma ordenação do SQL: a página começa depois da tarefa do cursor
+            inicio = next((i + 1 for i, t in enumerate(tarefas) if t['id'] == chave[3]), None)
+        
+        if inicio is not None:
+            pagina = tarefas[inicio:inicio + limite + 1]
+            return _montar_pagina_tarefas(pagina, limite)
+    
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        filtro_cursor = 'TRUE'
+        params = [usuario, usuario]
+        if chave:
+            filtro_cursor = "(ordem_prioridade, COALESCE(nom_cliente, ''), COALESCE(nome_tarefa, ''), id) > (%s, %s, %s, %s)"
+            params.extend(chave)
+        params.append(limite + 1)
+        
+        cursor.execute(
+            SQL_TAREFAS_USUARIO.format(filtro_cursor=filtro_cursor, limite='LIMIT %s'),
+            params
+        )
+        
+        pagina = [dict(t) for t in cursor.fetchall()]
+        return _montar_pagina_tarefas(pagina, limite)
+    finally:
+        conn.close()
+
+def _montar_pagina_tarefas(pagina, limite):
+    """Separa a linha extra (limite + 1) que indica se existe próxima página"""
+    tarefas = pagina[:limite]
+    proximo_cursor = codificar_cursor_tarefa(tarefas[-1]) if len(pagina) > limite else None
+    return serializar_tarefas(tarefas), proximo_cursor
+
+def serializar_tarefas(tarefas):
+    """Cópia das tarefas sem as colunas internas (a lista do cache não é alterada)"""
+    return [
+        {campo: valor for campo, valor in tarefa.items() if campo not in COLUNAS_INTERNAS_TAREFA}
+        for tarefa in tarefas
+    ]
+
+def montar_filtros_relatorio(filtros, usuarios_permitidos):
+    """
+    Monta o WHERE dos relatórios (aliases a, f, c, t) a partir dos filtros da tela
+    
+    Retorna (where_sql, params) ou None se o funcionário filtrado não está
+    entre os usuários permitidos.
+    """
+    where_clauses = ["a.status = 'finalizado'"]
+    params = []
+    
+    # 🔐 FILTRO OBRIGATÓRIO: Usuários permitidos
+    where_clauses.append("f.usuario = ANY(%s)")
+    params.append(usuarios_permitidos)
+    
+    if filtros.get('ano'):
+        where_clauses.append("EXTRACT(YEAR FROM a.data_inicio AT TIME ZONE 'America/Sao_Paulo') = %s")
+        params.append(filtros['ano'])
+    
+    if filtros.get('mes'):
+        where_clauses.append("EXTRACT(MONTH FROM a.data_inicio AT TIME ZONE 'America/Sao_Paulo') = %s")
+        params.append(filtros['mes'])
+    
+    if filtros.get('departamento') and filtros['departamento'] != 'Todos':
+        where_clauses.append("f.departamento = %s")
+        params.append(filtros['departamento'])
+    
+    if filtros.get('funcionario') and filtros['funcionario'] != 'Todos':
+        if filtros['funcionario'] not in usuarios_permitidos:
+            return None
+        where_clauses.append("f.usuario = %s")
+        params.append(filtros['funcionario'])
+    
+    if filtros.get('grupo') and filtros['grupo'] != 'Todos':
+        where_clauses.append("c.cod_grupo_cliente = %s::INTEGER")
+        params.append(filtros['grupo'])
+    
+    if filtros.get('tarefa') and filtros['tarefa'] != 'Todos':
+        where_clauses.append("t.cod_grupo_tarefa = %s")
+        params.append(filtros['tarefa'])
+    
+    return " AND ".join(where_clauses), params
+
+def _iterar_com_primeira(primeira, cursor):
+    """Itera um cursor do servidor já tendo lido a primeira linha (usada para testar vazio)"""
+    yield primeira
+    yield from cursor
+
+def converter_horas_para_tempo(horas_decimal):
+    """Converte horas decimais (ex: 2.5) para formato de tempo HH:MM (ex: 02:30)"""
+    horas = int(horas_decimal)
+    minutos = int((horas_decimal - horas) * 60)
+    return f"{horas:02d}:{minutos:02d}"
+
 # ========================================
 # ROTAS DE AUTENTICAÇÃO
 # ========================================
@@ -453,78 +867,47 @@ def buscar_tarefas():
     
     dados = request.get_json()
     cnpj = dados.get('cnpj', '').strip()
+    limite = dados.get('limite')
+    cursor_pagina = dados.get('cursor')
     usuario = session.get('usuario')
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
-    
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        # Sem CNPJ e com limite: lista "todas as minhas tarefas" paginada por cursor
+        if not cnpj and limite:
+            try:
+                limite = max(1, min(int(limite), TAMANHO_PAGINA_TAREFAS_MAX))
+                pagina = paginar_tarefas_usuario(usuario, limite, cursor_pagina)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            
+            if pagina is None:
+                return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+            
+            tarefas, proximo_cursor = pagina
+            return jsonify({
+                'success': True,
+                'tarefas': tarefas,
+                'proximo_cursor': proximo_cursor
+            })
         
-        # Se CNPJ foi fornecido, busca apenas tarefas daquele cliente
+        tarefas = obter_tarefas_usuario(usuario)
+        
+        if tarefas is None:
+            return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+        
+        # Se CNPJ foi fornecido, retorna apenas tarefas daquele cliente
+        # (a lista já vem ordenada por prioridade, cliente e nome)
         if cnpj:
-            cursor.execute("""
-                SELECT 
-                    t.id,
-                    t.nome_tarefa,
-                    t.cod_grupo_tarefa,
-                    t.prioridade,
-                    t.estimativa_horas,
-                    t.cnpj_cpf,
-                    c.nom_cliente,
-                    c.des_grupo
-                FROM tarefas_colaborador t
-                LEFT JOIN clientes c ON t.cnpj_cpf = c.num_cnpj_cpf
-                WHERE t.cnpj_cpf = %s
-                  AND (t.colaborador_1 = %s OR t.colaborador_2 = %s)
-                ORDER BY 
-                    CASE 
-                        WHEN LOWER(t.prioridade) LIKE '%%alta%%' OR LOWER(t.prioridade) LIKE '%%p2%%' THEN 1
-                        WHEN LOWER(t.prioridade) LIKE '%%média%%' OR LOWER(t.prioridade) LIKE '%%media%%' OR LOWER(t.prioridade) LIKE '%%p1%%' THEN 2
-                        WHEN LOWER(t.prioridade) LIKE '%%baixa%%' OR LOWER(t.prioridade) LIKE '%%p3%%' THEN 3
-                        ELSE 4
-                    END,
-                    t.nome_tarefa
-            """, (cnpj, usuario, usuario))
-        else:
-            # Se CNPJ não foi fornecido, busca todas as tarefas do usuário
-            cursor.execute("""
-                SELECT 
-                    t.id,
-                    t.nome_tarefa,
-                    t.cod_grupo_tarefa,
-                    t.prioridade,
-                    t.estimativa_horas,
-                    t.cnpj_cpf,
-                    c.nom_cliente,
-                    c.des_grupo
-                FROM tarefas_colaborador t
-                LEFT JOIN clientes c ON t.cnpj_cpf = c.num_cnpj_cpf
-                WHERE (t.colaborador_1 = %s OR t.colaborador_2 = %s)
-                ORDER BY 
-                    CASE 
-                        WHEN LOWER(t.prioridade) LIKE '%%alta%%' OR LOWER(t.prioridade) LIKE '%%p2%%' THEN 1
-                        WHEN LOWER(t.prioridade) LIKE '%%média%%' OR LOWER(t.prioridade) LIKE '%%media%%' OR LOWER(t.prioridade) LIKE '%%p1%%' THEN 2
-                        WHEN LOWER(t.prioridade) LIKE '%%baixa%%' OR LOWER(t.prioridade) LIKE '%%p3%%' THEN 3
-                        ELSE 4
-                    END,
-                    c.nom_cliente,
-                    t.nome_tarefa
-            """, (usuario, usuario))
-        
-        tarefas = cursor.fetchall()
+            tarefas = [t for t in tarefas if t['cnpj_cpf'] == cnpj]
         
         return jsonify({
             'success': True,
-            'tarefas': [dict(t) for t in tarefas]
+            'tarefas': serializar_tarefas(tarefas)
         })
         
     except Exception as e:
         print(f"❌ Erro ao buscar tarefas: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        conn.close()
 
 # ========================================
 # ROTAS DE CONTROLE DE TAREFAS (MÚLTIPLAS)
@@ -543,6 +926,7 @@ def iniciar_tarefa():
     nome_tarefa = dados.get('nome_tarefa')
     observacao = dados.get('observacao', '')  # ⭐ NOVO: Campo observação (opcional)
     usuario = session.get('usuario')
+    funcionario_id = session.get('usuario_id')  # Definido no login
     
     if not all([cnpj_cliente, tarefa_id]):
         return jsonify({'success': False, 'message': 'Dados incompletos'}), 400
@@ -554,19 +938,11 @@ def iniciar_tarefa():
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
+        cliente_id = obter_cliente_id(cursor, cnpj_cliente)
+        if not cliente_id:
+            return jsonify({'success': False, 'message': 'Cliente não encontrado'}), 400
+        
         cursor.execute("""
-            WITH ids_resolvidos AS (
-                SELECT 
-                    f.id AS funcionario_id,
-                    c.id AS cliente_id,
-                    f.nome_completo,
-                    c.nom_cliente
-                FROM funcionarios f
-                CROSS JOIN clientes c
-                WHERE f.usuario = %s
-                  AND c.num_cnpj_cpf = %s
-                LIMIT 1
-            )
             INSERT INTO apontamentos_horas (
                 funcionario_id,
                 cliente_id,
@@ -575,18 +951,11 @@ def iniciar_tarefa():
                 status,
                 observacao  -- ⭐ NOVO: Campo observação
             )
-            SELECT 
-                funcionario_id,
-                cliente_id,
-                %s,
-                NOW(),
-                'em_andamento',
-                %s  -- ⭐ NOVO: Parâmetro observação
-            FROM ids_resolvidos
+            VALUES (%s, %s, %s, NOW(), 'em_andamento', %s)
             RETURNING 
                 id,
                 TO_CHAR(data_inicio AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS') AS data_inicio_br
-        """, (usuario, cnpj_cliente, tarefa_id, observacao))  # ⭐ NOVO: Adicionar observacao nos parâmetros
+        """, (funcionario_id, cliente_id, tarefa_id, observacao))
         
         resultado = cursor.fetchone()
         conn.commit()
@@ -622,6 +991,7 @@ def pausar_tarefa():
         return jsonify({'success': False, 'message': 'ID da tarefa não fornecido'}), 400
     
     usuario = session.get('usuario')
+    funcionario_id = session.get('usuario_id')
     
     conn = get_db_connection()
     if not conn:
@@ -630,28 +1000,19 @@ def pausar_tarefa():
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Verificar se a tarefa pertence ao usuário
-        cursor.execute("""
-            SELECT a.id 
-            FROM apontamentos_horas a
-            INNER JOIN funcionarios f ON a.funcionario_id = f.id
-            WHERE a.id = %s AND f.usuario = %s AND a.status = 'em_andamento'
-        """, (apontamento_id, usuario))
+        # Travar o apontamento do usuário: cliques concorrentes esperam aqui
+        status_atual = bloquear_apontamento(cursor, apontamento_id, funcionario_id)
         
-        if not cursor.fetchone():
-            return jsonify({'success': False, 'message': 'Tarefa não encontrada ou não pode ser pausada'}), 400
+        if status_atual is None:
+            return jsonify({'success': False, 'message': 'Tarefa não encontrada'}), 404
         
-        # Pausar tarefa
-        cursor.execute("""
-            UPDATE apontamentos_horas
-            SET status = 'pausado', atualizado_em = NOW()
-            WHERE id = %s
-        """, (apontamento_id,))
+        if status_atual != 'em_andamento':
+            return resposta_conflito(status_atual, 'Tarefa não pode ser pausada: ela não está em andamento')
         
-        # Criar registro de pausa
+        # Registrar evento de pausa (o trigger atualiza status e cria a pausa)
         cursor.execute("""
-            INSERT INTO pausas (apontamento_id, data_pausa)
-            VALUES (%s, NOW())
+            INSERT INTO eventos_apontamento (apontamento_id, tipo)
+            VALUES (%s, 'pausa')
         """, (apontamento_id,))
         
         conn.commit()
@@ -659,6 +1020,10 @@ def pausar_tarefa():
         print(f"⏸️ Tarefa {apontamento_id} pausada: {usuario}")
         return jsonify({'success': True})
         
+    except psycopg2.errors.CheckViolation as e:
+        # Transição rejeitada pelo trigger de eventos_apontamento
+        conn.rollback()
+        return resposta_conflito(None, str(e.diag.message_primary))
     except Exception as e:
         conn.rollback()
         print(f"❌ Erro ao pausar tarefa: {e}")
@@ -679,6 +1044,7 @@ def retomar_tarefa():
         return jsonify({'success': False, 'message': 'ID da tarefa não fornecido'}), 400
     
     usuario = session.get('usuario')
+    funcionario_id = session.get('usuario_id')
     
     conn = get_db_connection()
     if not conn:
@@ -687,29 +1053,19 @@ def retomar_tarefa():
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Verificar se a tarefa pertence ao usuário
-        cursor.execute("""
-            SELECT a.id 
-            FROM apontamentos_horas a
-            INNER JOIN funcionarios f ON a.funcionario_id = f.id
-            WHERE a.id = %s AND f.usuario = %s AND a.status = 'pausado'
-        """, (apontamento_id, usuario))
+        # Travar o apontamento do usuário: cliques concorrentes esperam aqui
+        status_atual = bloquear_apontamento(cursor, apontamento_id, funcionario_id)
         
-        if not cursor.fetchone():
-            return jsonify({'success': False, 'message': 'Tarefa não encontrada ou não está pausada'}), 400
+        if status_atual is None:
+            return jsonify({'success': False, 'message': 'Tarefa não encontrada'}), 404
         
-        # Fechar pausa atual
-        cursor.execute("""
-            UPDATE pausas
-            SET data_retomada = NOW()
-            WHERE apontamento_id = %s AND data_retomada IS NULL
-        """, (apontamento_id,))
+        if status_atual != 'pausado':
+            return resposta_conflito(status_atual, 'Tarefa não pode ser retomada: ela não está pausada')
         
-        # Retomar tarefa
+        # Registrar evento de retomada (o trigger fecha a pausa e atualiza o status)
         cursor.execute("""
-            UPDATE apontamentos_horas
-            SET status = 'em_andamento', atualizado_em = NOW()
-            WHERE id = %s
+            INSERT INTO eventos_apontamento (apontamento_id, tipo)
+            VALUES (%s, 'retomada')
         """, (apontamento_id,))
         
         conn.commit()
@@ -717,6 +1073,10 @@ def retomar_tarefa():
         print(f"▶️ Tarefa {apontamento_id} retomada: {usuario}")
         return jsonify({'success': True})
         
+    except psycopg2.errors.CheckViolation as e:
+        # Transição rejeitada pelo trigger de eventos_apontamento
+        conn.rollback()
+        return resposta_conflito(None, str(e.diag.message_primary))
     except Exception as e:
         conn.rollback()
         print(f"❌ Erro ao retomar tarefa: {e}")
@@ -737,6 +1097,7 @@ def finalizar_tarefa():
         return jsonify({'success': False, 'message': 'ID da tarefa não fornecido'}), 400
     
     usuario = session.get('usuario')
+    funcionario_id = session.get('usuario_id')
     
     conn = get_db_connection()
     if not conn:
@@ -745,32 +1106,25 @@ def finalizar_tarefa():
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Verificar se a tarefa pertence ao usuário
-        cursor.execute("""
-            SELECT a.id 
-            FROM apontamentos_horas a
-            INNER JOIN funcionarios f ON a.funcionario_id = f.id
-            WHERE a.id = %s AND f.usuario = %s AND a.status IN ('em_andamento', 'pausado')
-        """, (apontamento_id, usuario))
+        # Travar o apontamento do usuário: cliques concorrentes esperam aqui
+        status_atual = bloquear_apontamento(cursor, apontamento_id, funcionario_id)
         
-        if not cursor.fetchone():
-            return jsonify({'success': False, 'message': 'Tarefa não encontrada ou já finalizada'}), 400
+        if status_atual is None:
+            return jsonify({'success': False, 'message': 'Tarefa não encontrada'}), 404
         
-        # Fechar pausa se existir
+        if status_atual not in ('em_andamento', 'pausado'):
+            return resposta_conflito(status_atual, 'Tarefa já finalizada')
+        
+        # Registrar evento de finalização (o trigger fecha a pausa e grava data_fim)
         cursor.execute("""
-            UPDATE pausas
-            SET data_retomada = NOW()
-            WHERE apontamento_id = %s AND data_retomada IS NULL
+            INSERT INTO eventos_apontamento (apontamento_id, tipo)
+            VALUES (%s, 'finalizacao')
         """, (apontamento_id,))
         
-        # Finalizar tarefa
         cursor.execute("""
-            UPDATE apontamentos_horas
-            SET data_fim = NOW(), 
-                status = 'finalizado', 
-                atualizado_em = NOW()
+            SELECT data_inicio, data_fim
+            FROM apontamentos_horas
             WHERE id = %s
-            RETURNING data_inicio, data_fim
         """, (apontamento_id,))
         
         tarefa = cursor.fetchone()
@@ -794,12 +1148,19 @@ def finalizar_tarefa():
         
         conn.commit()
         
+        # Tarefa iniciada em mês já fechado entra agora no relatório daquele mês
+        invalidar_relatorios_mensais([tarefa['data_inicio']])
+        
         print(f"✅ Tarefa {apontamento_id} finalizada: {usuario} | {horas_trabalhadas:.2f}h")
         return jsonify({
             'success': True,
             'horas_trabalhadas': round(horas_trabalhadas, 2)
         })
         
+    except psycopg2.errors.CheckViolation as e:
+        # Transição rejeitada pelo trigger de eventos_apontamento
+        conn.rollback()
+        return resposta_conflito(None, str(e.diag.message_primary))
     except Exception as e:
         conn.rollback()
         print(f"❌ Erro ao finalizar tarefa: {e}")
@@ -809,6 +1170,83 @@ def finalizar_tarefa():
     finally:
         conn.close()
 
+@app.route('/api/tarefas/lote', methods=['POST'])
+def tarefas_lote():
+    """Pausa ou finaliza vários apontamentos do usuário em uma única transação"""
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    dados = request.get_json() or {}
+    acao = dados.get('acao')
+    apontamento_ids = dados.get('apontamento_ids') or []
+    
+    if acao not in ACOES_LOTE_TAREFAS:
+        return jsonify({'success': False, 'message': 'Ação inválida (use pausar ou finalizar)'}), 400
+    
+    try:
+        apontamento_ids = sorted({int(i) for i in apontamento_ids})
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'IDs de tarefa inválidos'}), 400
+    
+    if not apontamento_ids:
+        return jsonify({'success': False, 'message': 'Nenhuma tarefa informada'}), 400
+    
+    usuario = session.get('usuario')
+    funcionario_id = session.get('usuario_id')
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        status_por_id, aplicar_ids, apontamentos = executar_lote_tarefas(cursor, acao, apontamento_ids, funcionario_id)
+        horas_por_id = {a['id']: float(a['horas_trabalhadas']) for a in apontamentos}
+        
+        resultados = []
+        for apontamento_id in apontamento_ids:
+            if apontamento_id not in status_por_id:
+                resultados.append({'apontamento_id': apontamento_id, 'success': False,
+                                   'message': 'Tarefa não encontrada'})
+            elif apontamento_id not in aplicar_ids:
+                resultados.append({'apontamento_id': apontamento_id, 'success': False, 'conflito': True,
+                                   'status_atual': status_por_id[apontamento_id],
+                                   'message': f"Tarefa não pode ser {'pausada' if acao == 'pausar' else 'finalizada'}"})
+        
+        conn.commit()
+        
+        if acao == 'finalizar' and aplicar_ids:
+            invalidar_relatorios_mensais(a['data_inicio'] for a in apontamentos)
+        
+        for apontamento_id in aplicar_ids:
+            resultados.append({
+                'apontamento_id': apontamento_id,
+                'success': True,
+                'horas_trabalhadas': round(horas_por_id.get(apontamento_id, 0), 2)
+            })
+        resultados.sort(key=lambda r: r['apontamento_id'])
+        
+        print(f"📦 Lote '{acao}': {usuario} | {len(aplicar_ids)}/{len(apontamento_ids)} tarefa(s)")
+        return jsonify({
+            'success': True,
+            'processados': len(aplicar_ids),
+            'resultados': resultados
+        })
+        
+    except psycopg2.errors.CheckViolation as e:
+        # Transição rejeitada pelo trigger de eventos_apontamento
+        conn.rollback()
+        return resposta_conflito(None, str(e.diag.message_primary))
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erro ao processar lote de tarefas: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
 @app.route('/api/registrar-atrasado', methods=['POST'])
 def registrar_atrasado():
     """Registra apontamento de horas atrasado (com data/hora passadas)"""
@@ -824,6 +1262,7 @@ def registrar_atrasado():
     data_fim = dados.get('data_fim')
     observacao = dados.get('observacao', '')  # ⭐ NOVO: Campo observação (opcional)
     usuario = session.get('usuario')
+    funcionario_id = session.get('usuario_id')  # Definido no login
     
     if not all([cnpj_cliente, tarefa_id, data_inicio, data_fim]):
         return jsonify({'success': False, 'message': 'Dados incompletos'}), 400
@@ -836,32 +1275,16 @@ def registrar_atrasado():
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         # Validar e converter datas
-        from datetime import datetime
         try:
-            dt_inicio = datetime.fromisoformat(data_inicio.replace('Z', '+00:00'))
-            dt_fim = datetime.fromisoformat(data_fim.replace('Z', '+00:00'))
-            
-            if dt_fim <= dt_inicio:
-                return jsonify({'success': False, 'message': 'Data fim deve ser posterior à data início'}), 400
-            
-            # Converter para string no formato adequado para PostgreSQL
-            data_inicio_str = dt_inicio.strftime('%Y-%m-%d %H:%M:%S')
-            data_fim_str = dt_fim.strftime('%Y-%m-%d %H:%M:%S')
-            
+            data_inicio_str, data_fim_str = converter_intervalo_atrasado(data_inicio, data_fim)
         except ValueError as e:
-            return jsonify({'success': False, 'message': f'Formato de data inválido: {e}'}), 400
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        cliente_id = obter_cliente_id(cursor, cnpj_cliente)
+        if not cliente_id:
+            return jsonify({'success': False, 'message': 'Cliente não encontrado'}), 400
         
         cursor.execute("""
-            WITH ids_resolvidos AS (
-                SELECT 
-                    f.id AS funcionario_id,
-                    c.id AS cliente_id
-                FROM funcionarios f
-                CROSS JOIN clientes c
-                WHERE f.usuario = %s
-                  AND c.num_cnpj_cpf = %s
-                LIMIT 1
-            )
             INSERT INTO apontamentos_horas (
                 funcionario_id,
                 cliente_id,
@@ -873,9 +1296,9 @@ def registrar_atrasado():
                 atualizado_em,
                 observacao  -- ⭐ NOVO: Campo observação
             )
-            SELECT 
-                funcionario_id,
-                cliente_id,
+            VALUES (
+                %s,
+                %s,
                 %s,
                 %s AT TIME ZONE 'America/Sao_Paulo',
                 %s AT TIME ZONE 'America/Sao_Paulo',
@@ -883,15 +1306,18 @@ def registrar_atrasado():
                 NOW(),
                 NOW(),
                 %s  -- ⭐ NOVO: Parâmetro observação
-            FROM ids_resolvidos
+            )
             RETURNING 
                 id,
                 EXTRACT(EPOCH FROM (data_fim - data_inicio))/3600 AS horas_trabalhadas
-        """, (usuario, cnpj_cliente, tarefa_id, data_inicio_str, data_fim_str, observacao))  # ⭐ NOVO: Adicionar observacao
+        """, (funcionario_id, cliente_id, tarefa_id, data_inicio_str, data_fim_str, observacao))
         
         resultado = cursor.fetchone()
         conn.commit()
         
+        # Lançamento em mês fechado: relatório pré-gerado deixa de valer
+        invalidar_relatorios_mensais([data_inicio_str])
+        
         horas = round(resultado['horas_trabalhadas'], 2)
         
         print(f"✅ Apontamento atrasado registrado: {usuario} | Tarefa ID: {tarefa_id} | {nome_tarefa} | {horas}h | {data_inicio_str} até {data_fim_str} | Obs: {observacao[:50] if observacao else 'N/A'}")
@@ -911,13 +1337,59 @@ def registrar_atrasado():
     finally:
         conn.close()
 
-@app.route('/api/verificar-tarefas-ativas', methods=['GET'])
-def verificar_tarefas_ativas():
-    """Verifica TODAS as tarefas ativas do usuário"""
+def ler_lote_atrasado():
+    """
+    Lê as linhas do lote de apontamentos atrasados
+    - JSON: {"apontamentos": [{cnpj_cliente, tarefa_id, data_inicio, data_fim, observacao}]}
+    - CSV (campo "arquivo"): mesmas colunas no cabeçalho, separador ";" ou ","
+    """
+    arquivo = request.files.get('arquivo')
+    
+    if not arquivo:
+        dados = request.get_json(silent=True) or {}
+        apontamentos = dados.get('apontamentos')
+        if not isinstance(apontamentos, list):
+            raise ValueError('Envie a lista "apontamentos" ou um arquivo CSV')
+        return apontamentos
+    
+    conteudo = arquivo.read().decode('utf-8-sig')
+    primeira_linha = conteudo.split('\n', 1)[0]
+    separador = ';' if primeira_linha.count(';') > primeira_linha.count(',') else ','
+    
+    leitor = csv.DictReader(io.StringIO(conteudo), delimiter=separador)
+    return [
+        {(chave or '').strip(): (valor or '').strip() for chave, valor in linha.items()}
+        for linha in leitor
+    ]
+
+@app.route('/api/registrar-atrasado/lote', methods=['POST'])
+def registrar_atrasado_lote():
+    """
+    Registra vários apontamentos atrasados de uma vez (JSON ou CSV)
+    
+    Todas as linhas são validadas antes de gravar; se alguma for inválida,
+    nada é gravado e a resposta traz o erro de cada linha.
+    As válidas são inseridas com um único INSERT multi-linha na mesma transação.
+    """
     if 'usuario' not in session:
         return jsonify({'success': False, 'message': 'Não autenticado'}), 401
     
     usuario = session.get('usuario')
+    funcionario_id = session.get('usuario_id')
+    
+    try:
+        linhas = ler_lote_atrasado()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'success': False, 'message': f'Lote inválido: {e}'}), 400
+    
+    if not linhas:
+        return jsonify({'success': False, 'message': 'Nenhum apontamento enviado'}), 400
+    
+    if len(linhas) > LOTE_ATRASADO_MAX:
+        return jsonify({
+            'success': False,
+            'message': f'Máximo de {LOTE_ATRASADO_MAX} apontamentos por lote'
+        }), 400
     
     conn = get_db_connection()
     if not conn:
@@ -926,78 +1398,123 @@ def verificar_tarefas_ativas():
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.execute("""
-            SELECT 
-                a.id AS apontamento_id,
-                a.status,
-                c.nom_cliente AS cliente_nome,
-                c.num_cnpj_cpf AS cnpj,
-                t.nome_tarefa AS tarefa_nome,
-                a.tarefa_id,
-                TO_CHAR(a.data_inicio AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS') AS data_inicio,
-                CASE 
-                    WHEN a.status = 'pausado' THEN 
-                        (SELECT TO_CHAR(p.data_pausa AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS')
-                         FROM apontador_horas.pausas p 
-                         WHERE p.apontamento_id = a.id 
-                           AND p.data_retomada IS NULL 
-                         LIMIT 1)
-                    ELSE NULL
-                END AS data_pausa,
-                COALESCE(
-                    (SELECT SUM(EXTRACT(EPOCH FROM (
-                        COALESCE(p.data_retomada, NOW()) - p.data_pausa
-                    )) * 1000)
-                    FROM apontador_horas.pausas p
-                    WHERE p.apontamento_id = a.id),
-                    0
-                ) AS tempo_pausado_ms
-            FROM apontador_horas.apontamentos_horas a
-            INNER JOIN apontador_horas.funcionarios f ON a.funcionario_id = f.id
-            INNER JOIN apontador_horas.clientes c ON a.cliente_id = c.id
-            INNER JOIN apontador_horas.tarefas_colaborador t ON a.tarefa_id = t.id
-            WHERE f.usuario = %s
-              AND a.status IN ('em_andamento', 'pausado')
-            ORDER BY a.data_inicio DESC
-        """, (usuario,))
+        # Tarefas do usuário (cache) para validar tarefa x cliente
+        tarefas_usuario = obter_tarefas_usuario(usuario)
+        if tarefas_usuario is None:
+            return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+        cnpj_por_tarefa = {t['id']: t['cnpj_cpf'] for t in tarefas_usuario}
+        
+        # ==== VALIDAÇÃO (uma passada em todas as linhas) ====
+        resultados = []
+        valores = []
+        
+        for numero, linha in enumerate(linhas, 1):
+            if not isinstance(linha, dict):
+                resultados.append({'linha': numero, 'success': False, 'message': 'Linha inválida'})
+                continue
+            
+            cnpj_cliente = str(linha.get('cnpj_cliente') or '').strip()
+            data_inicio = linha.get('data_inicio')
+            data_fim = linha.get('data_fim')
+            observacao = linha.get('observacao') or ''
+            
+            try:
+                if not all([cnpj_cliente, linha.get('tarefa_id'), data_inicio, data_fim]):
+                    raise ValueError('Dados incompletos')
+                
+                try:
+                    tarefa_id = int(linha.get('tarefa_id'))
+                except (ValueError, TypeError):
+                    raise ValueError('ID da tarefa inválido')
+                
+                if cnpj_por_tarefa.get(tarefa_id) != cnpj_cliente:
+                    raise ValueError('Tarefa não atribuída a você para este cliente')
+                
+                data_inicio_str, data_fim_str = converter_intervalo_atrasado(data_inicio, data_fim)
+                
+                cliente_id = obter_cliente_id(cursor, cnpj_cliente)
+                if not cliente_id:
+                    raise ValueError('Cliente não encontrado')
+                
+            except ValueError as e:
+                resultados.append({'linha': numero, 'success': False, 'message': str(e)})
+                continue
+            
+            resultados.append({'linha': numero, 'success': True})
+            valores.append((funcionario_id, cliente_id, tarefa_id, data_inicio_str, data_fim_str, observacao))
         
-        tarefas = cursor.fetchall()
+        erros = [r for r in resultados if not r['success']]
+        if erros:
+            print(f"⚠️ Lote atrasado rejeitado: {usuario} | {len(erros)} de {len(linhas)} linha(s) inválida(s)")
+            return jsonify({
+                'success': False,
+                'message': f'{len(erros)} linha(s) inválida(s). Nenhum apontamento foi registrado.',
+                'resultados': resultados
+            }), 400
+        
+        # ==== GRAVAÇÃO (um único INSERT multi-linha) ====
+        inseridos = execute_values(cursor, """
+            INSERT INTO apontamentos_horas (
+                funcionario_id,
+                cliente_id,
+                tarefa_id,
+                data_inicio,
+                data_fim,
+                status,
+                criado_em,
+                atualizado_em,
+                observacao
+            )
+            VALUES %s
+            RETURNING 
+                id,
+                EXTRACT(EPOCH FROM (data_fim - data_inicio))/3600 AS horas_trabalhadas
+        """, valores,
+            template="""(
+                %s, %s, %s,
+                %s AT TIME ZONE 'America/Sao_Paulo',
+                %s AT TIME ZONE 'America/Sao_Paulo',
+                'finalizado', NOW(), NOW(), %s
+            )""",
+            page_size=len(valores),
+            fetch=True)
+        
+        conn.commit()
+        
+        # Lançamentos em meses fechados: relatórios pré-gerados deixam de valer
+        invalidar_relatorios_mensais(v[3] for v in valores)
+        
+        for resultado, inserido in zip(resultados, inseridos):
+            resultado['apontamento_id'] = inserido['id']
+            resultado['horas_trabalhadas'] = round(float(inserido['horas_trabalhadas']), 2)
+        
+        total_horas = round(sum(r['horas_trabalhadas'] for r in resultados), 2)
+        print(f"✅ Lote atrasado registrado: {usuario} | {len(inseridos)} apontamento(s) | {total_horas}h")
         
         return jsonify({
             'success': True,
-            'tarefas': [dict(t) for t in tarefas]
+            'total_registrados': len(inseridos),
+            'horas_trabalhadas': total_horas,
+            'resultados': resultados
         })
         
     except Exception as e:
-        print(f"❌ Erro ao verificar tarefas ativas: {e}")
+        conn.rollback()
+        print(f"❌ Erro ao registrar lote atrasado: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)}), 500
     finally:
         conn.close()
 
-# ========================================
-# ROTAS DE RELATÓRIOS (COM CONTROLE DE ACESSO)
-# ========================================
-
-@app.route('/api/relatorio-tempo', methods=['POST'])
-def relatorio_tempo():
-    """Retorna relatório de tempo decorrido por atividades"""
+@app.route('/api/apontamentos/<int:apontamento_id>/eventos', methods=['GET'])
+def linha_tempo_apontamento(apontamento_id):
+    """Retorna a linha do tempo (início, pausas, retomadas, fim) de um apontamento"""
     if 'usuario' not in session:
         return jsonify({'success': False, 'message': 'Não autenticado'}), 401
     
-    usuario_logado = session.get('usuario')
-    nivel_logado = session.get('nivel')
-    
-    dados = request.get_json()
-    filtros = {
-        'ano': dados.get('ano'),
-        'mes': dados.get('mes'),
-        'departamento': dados.get('departamento'),
-        'funcionario': dados.get('funcionario'),
-        'grupo': dados.get('grupo'),
-        'tarefa': dados.get('tarefa')
-    }
+    usuario = session.get('usuario')
+    nivel = session.get('nivel')
     
     conn = get_db_connection()
     if not conn:
@@ -1006,107 +1523,489 @@ def relatorio_tempo():
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # 🔐 CONTROLE DE ACESSO: Obter usuários permitidos
-        usuarios_permitidos = get_usuarios_permitidos(usuario_logado, nivel_logado)
+        # 🔐 CONTROLE DE ACESSO: mesmo escopo dos relatórios
+        usuarios_permitidos = get_usuarios_permitidos(usuario, nivel)
         
-        # Construir query dinâmica com filtros
-        where_clauses = ["a.status = 'finalizado'"]
-        params = []
+        cursor.execute("""
+            SELECT 
+                e.tipo,
+                TO_CHAR(e.ocorrido_em AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS') AS ocorrido_em
+            FROM eventos_apontamento e
+            INNER JOIN apontamentos_horas a ON e.apontamento_id = a.id
+            INNER JOIN funcionarios f ON a.funcionario_id = f.id
+            WHERE e.apontamento_id = %s
+              AND f.usuario = ANY(%s)
+            ORDER BY e.ocorrido_em, e.id
+        """, (apontamento_id, usuarios_permitidos))
         
-        # 🔐 FILTRO OBRIGATÓRIO: Usuários permitidos
-        where_clauses.append(f"f.usuario = ANY(%s)")
-        params.append(usuarios_permitidos)
+        eventos = cursor.fetchall()
         
-        if filtros['ano']:
-            where_clauses.append("EXTRACT(YEAR FROM a.data_inicio AT TIME ZONE 'America/Sao_Paulo') = %s")
-            params.append(filtros['ano'])
+        if not eventos:
+            return jsonify({'success': False, 'message': 'Apontamento não encontrado'}), 404
         
-        if filtros['mes']:
-            where_clauses.append("EXTRACT(MONTH FROM a.data_inicio AT TIME ZONE 'America/Sao_Paulo') = %s")
-            params.append(filtros['mes'])
+        return jsonify({
+            'success': True,
+            'eventos': [dict(e) for e in eventos]
+        })
         
-        if filtros['departamento'] and filtros['departamento'] != 'Todos':
-            where_clauses.append("f.departamento = %s")
-            params.append(filtros['departamento'])
+    except Exception as e:
+        print(f"❌ Erro ao buscar linha do tempo: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/verificar-sobreposicao', methods=['POST'])
+def verificar_sobreposicao():
+    """Verifica se um intervalo se sobrepõe a apontamentos do usuário logado"""
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    dados = request.get_json()
+    data_inicio = dados.get('data_inicio')
+    data_fim = dados.get('data_fim')
+    ignorar_id = dados.get('ignorar_apontamento_id')
+    funcionario_id = session.get('usuario_id')
+    
+    if not all([data_inicio, data_fim]):
+        return jsonify({'success': False, 'message': 'Dados incompletos'}), 400
+    
+    try:
+        data_inicio_str, data_fim_str = converter_intervalo_atrasado(data_inicio, data_fim)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        sobreposicoes = buscar_sobreposicoes(cursor, funcionario_id, data_inicio_str, data_fim_str, ignorar_id)
         
-        if filtros['funcionario'] and filtros['funcionario'] != 'Todos':
-            # Verificar se o usuário filtrado está na lista permitida
-            if filtros['funcionario'] in usuarios_permitidos:
-                where_clauses.append("f.usuario = %s")
-                params.append(filtros['funcionario'])
-            else:
-                # Se tentar filtrar por um usuário não permitido, retorna vazio
-                return jsonify({'success': True, 'dados': {}})
+        return jsonify({
+            'success': True,
+            'sobreposto': len(sobreposicoes) > 0,
+            'apontamentos': sobreposicoes
+        })
         
-        if filtros['grupo'] and filtros['grupo'] != 'Todos':
-            where_clauses.append("c.cod_grupo_cliente = %s::INTEGER")
-            params.append(filtros['grupo'])
+    except Exception as e:
+        print(f"❌ Erro ao verificar sobreposição: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/verificar-tarefas-ativas', methods=['GET'])
+def verificar_tarefas_ativas():
+    """Verifica TODAS as tarefas ativas do usuário"""
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    usuario = session.get('usuario')
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        if filtros['tarefa'] and filtros['tarefa'] != 'Todos':
-            where_clauses.append("t.cod_grupo_tarefa = %s")
-            params.append(filtros['tarefa'])
+        tarefas = consultar_tarefas_ativas(cursor, usuario)
         
-        where_sql = " AND ".join(where_clauses)
+        return jsonify({
+            'success': True,
+            'tarefas': [dict(t) for t in tarefas]
+        })
         
-        # Query principal
-        query = f"""
+    except Exception as e:
+        print(f"❌ Erro ao verificar tarefas ativas: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
+# ========================================
+# FUNÇÕES DE RELATÓRIO (usadas pelas rotas e pelos jobs)
+# ========================================
+
+def consultar_relatorio_tempo(conn, where_sql, params):
+    """
+    Executa o relatório de tempo e organiza em grupo > cliente > funcionário > tarefa
+    
+    Retorna (dados_hierarquicos, total_registros).
+    """
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    
+    # Query principal
+    query = f"""
+        SELECT 
+            c.des_grupo AS grupo_empresa,
+            c.nom_cliente AS nome_cliente,
+            f.nome_completo AS funcionario,
+            t.cod_grupo_tarefa,
+            gt.nome_grupo_tarefa AS nome_tarefa,
+            COALESCE(
+                ROUND(
+                    EXTRACT(EPOCH FROM SUM(a.horas_trabalhadas)) / 3600, 
+                    2
+                ), 
+                0
+            ) AS horas_totais
+        FROM apontador_horas.apontamentos_horas a
+        INNER JOIN apontador_horas.funcionarios f ON a.funcionario_id = f.id
+        INNER JOIN apontador_horas.clientes c ON a.cliente_id = c.id
+        INNER JOIN apontador_horas.tarefas_colaborador t ON a.tarefa_id = t.id
+        INNER JOIN apontador_horas.grupo_tarefas gt ON t.cod_grupo_tarefa = gt.cod_grupo_tarefa
+        WHERE {where_sql}
+        GROUP BY 
+            c.des_grupo,
+            c.nom_cliente,
+            f.nome_completo,
+            t.cod_grupo_tarefa,
+            gt.nome_grupo_tarefa
+        ORDER BY 
+            c.des_grupo,
+            c.nom_cliente,
+            f.nome_completo,
+            gt.nome_grupo_tarefa
+    """
+    
+    cursor.execute(query, params)
+    resultados = cursor.fetchall()
+    
+    # Organizar dados hierarquicamente
+    dados_hierarquicos = {}
+    
+    for row in resultados:
+        grupo = row['grupo_empresa'] or 'SEM GRUPO'
+        cliente = row['nome_cliente']
+        funcionario = row['funcionario']
+        tarefa = row['nome_tarefa']
+        horas = float(row['horas_totais'])
+        
+        if grupo not in dados_hierarquicos:
+            dados_hierarquicos[grupo] = {}
+        
+        if cliente not in dados_hierarquicos[grupo]:
+            dados_hierarquicos[grupo][cliente] = {}
+        
+        if funcionario not in dados_hierarquicos[grupo][cliente]:
+            dados_hierarquicos[grupo][cliente][funcionario] = {}
+        
+        dados_hierarquicos[grupo][cliente][funcionario][tarefa] = horas
+    
+    return dados_hierarquicos, len(resultados)
+
+def gravar_excel_relatorio(conn, where_sql, params, filtros, gerado_por, arquivo):
+    """
+    Grava o relatório de horas em xlsx (workbook write-only) no arquivo informado
+    
+    Retorna o total de registros; 0 se não há dados (nada é gravado).
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment, Border, Side
+    
+    # Query principal
+    query = f"""
+        SELECT 
+            c.des_grupo AS grupo_empresa,
+            c.nom_cliente AS nome_cliente,
+            f.nome_completo AS funcionario,
+            gt.nome_grupo_tarefa AS nome_tarefa,
+            COALESCE(
+                ROUND(
+                    EXTRACT(EPOCH FROM SUM(a.horas_trabalhadas)) / 3600, 
+                    2
+                ), 
+                0
+            ) AS horas_totais
+        FROM apontador_horas.apontamentos_horas a
+        INNER JOIN apontador_horas.funcionarios f ON a.funcionario_id = f.id
+        INNER JOIN apontador_horas.clientes c ON a.cliente_id = c.id
+        INNER JOIN apontador_horas.tarefas_colaborador t ON a.tarefa_id = t.id
+        INNER JOIN apontador_horas.grupo_tarefas gt ON t.cod_grupo_tarefa = gt.cod_grupo_tarefa
+        WHERE {where_sql}
+        GROUP BY 
+            c.des_grupo,
+            c.nom_cliente,
+            f.nome_completo,
+            gt.nome_grupo_tarefa
+        ORDER BY 
+            c.des_grupo,
+            c.nom_cliente,
+            f.nome_completo,
+            gt.nome_grupo_tarefa
+    """
+    
+    # Cursor no servidor: as linhas chegam em blocos, sem fetchall
+    cursor = conn.cursor(name='exportar_relatorio_excel')
+    cursor.itersize = EXPORTACAO_ITERSIZE
+    cursor.execute(query, params)
+    
+    primeira = cursor.fetchone()
+    if primeira is None:
+        cursor.close()
+        return 0
+    
+    # Workbook write-only: cada linha vai direto para o disco
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Relatório de Horas")
+    
+    # Estilos nomeados: registrados uma vez e referenciados por nome em cada célula
+    borda = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    estilos = [
+        NamedStyle(name='titulo', font=Font(bold=True, size=14, color="3F3F41"),
+                   fill=PatternFill(start_color="FFD500", end_color="FFD500", fill_type="solid"),
+                   alignment=Alignment(horizontal='center', vertical='center')),
+        NamedStyle(name='negrito', font=Font(bold=True)),
+        NamedStyle(name='cabecalho', font=Font(bold=True, color="3F3F41", size=12),
+                   fill=PatternFill(start_color="FFD500", end_color="FFD500", fill_type="solid"),
+                   alignment=Alignment(horizontal='center', vertical='center'), border=borda),
+        NamedStyle(name='dado', border=borda),
+        NamedStyle(name='dado_horas', border=borda, alignment=Alignment(horizontal='center')),
+        NamedStyle(name='total_rotulo', font=Font(bold=True, size=12), alignment=Alignment(horizontal='right')),
+        NamedStyle(name='total_valor', font=Font(bold=True, size=12),
+                   fill=PatternFill(start_color="FFF9E6", end_color="FFF9E6", fill_type="solid"),
+                   alignment=Alignment(horizontal='center')),
+    ]
+    for estilo in estilos:
+        wb.add_named_style(estilo)
+    
+    def celula(valor, estilo):
+        cell = WriteOnlyCell(ws, value=valor)
+        cell.style = estilo
+        return cell
+    
+    # Largura das colunas (precisa ser definida antes da primeira linha)
+    ws.column_dimensions['A'].width = 25
+    ws.column_dimensions['B'].width = 35
+    ws.column_dimensions['C'].width = 30
+    ws.column_dimensions['D'].width = 30
+    ws.column_dimensions['E'].width = 12
+    
+    # Título e informações do filtro
+    ws.append([celula("RELATÓRIO DE APONTAMENTO DE HORAS - BOOKER BRASIL", 'titulo')])
+    ws.append([])
+    ws.append([celula(f"Gerado por: {gerado_por}", 'negrito')])
+    ws.append([celula(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 'negrito')])
+    
+    # Filtros aplicados
+    if filtros['ano']:
+        ws.append([f"Ano: {filtros['ano']}"])
+    if filtros['mes']:
+        meses = ['', 'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+                'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+        ws.append([f"Mês: {meses[int(filtros['mes'])]}"])
+    
+    ws.append([])  # Linha em branco
+    
+    # Cabeçalhos
+    headers = ['Grupo de Empresas', 'Cliente', 'Funcionário', 'Tarefa', 'Horas']
+    ws.append([celula(header, 'cabecalho') for header in headers])
+    
+    # Dados
+    total_geral = 0
+    total_registros = 0
+    for grupo_empresa, nome_cliente, funcionario, nome_tarefa, horas_totais in _iterar_com_primeira(primeira, cursor):
+        horas_decimal = float(horas_totais)
+        total_geral += horas_decimal
+        total_registros += 1
+        
+        ws.append([
+            celula(grupo_empresa or 'SEM GRUPO', 'dado'),
+            celula(nome_cliente, 'dado'),
+            celula(funcionario, 'dado'),
+            celula(nome_tarefa, 'dado'),
+            celula(converter_horas_para_tempo(horas_decimal), 'dado_horas'),
+        ])
+    
+    # Total geral
+    ws.append([])
+    ws.append([None, None, None,
+               celula("TOTAL GERAL:", 'total_rotulo'),
+               celula(converter_horas_para_tempo(total_geral), 'total_valor')])
+    
+    cursor.close()
+    
+    wb.save(arquivo)
+    return total_registros
+
+# Colunas da exportação linha a linha (uma linha por apontamento)
+COLUNAS_EXPORTACAO_APONTAMENTOS = [
+    'apontamento_id', 'usuario', 'funcionario', 'departamento',
+    'cnpj_cpf', 'cliente', 'grupo_empresa', 'grupo_tarefa', 'tarefa', 'status',
+    'data_inicio', 'data_fim', 'horas_trabalhadas', 'qtd_pausas', 'horas_pausadas',
+    'pausas', 'observacao'
+]
+
+def abrir_cursor_apontamentos(conn, where_sql, params):
+    """Abre o cursor no servidor da exportação linha a linha (EXPORTACAO_ITERSIZE linhas por vez)"""
+    query = f"""
+        SELECT 
+            a.id,
+            f.usuario,
+            f.nome_completo,
+            f.departamento,
+            c.num_cnpj_cpf,
+            c.nom_cliente,
+            c.des_grupo,
+            gt.nome_grupo_tarefa,
+            t.nome_tarefa,
+            a.status,
+            TO_CHAR(a.data_inicio AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS'),
+            TO_CHAR(a.data_fim AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS'),
+            ROUND(EXTRACT(EPOCH FROM a.horas_trabalhadas) / 3600, 4),
+            COALESCE(p.qtd_pausas, 0),
+            ROUND(COALESCE(p.segundos_pausados, 0) / 3600, 4),
+            p.pausas,
+            a.observacao
+        FROM apontador_horas.apontamentos_horas a
+        INNER JOIN apontador_horas.funcionarios f ON a.funcionario_id = f.id
+        INNER JOIN apontador_horas.clientes c ON a.cliente_id = c.id
+        INNER JOIN apontador_horas.tarefas_colaborador t ON a.tarefa_id = t.id
+        INNER JOIN apontador_horas.grupo_tarefas gt ON t.cod_grupo_tarefa = gt.cod_grupo_tarefa
+        LEFT JOIN LATERAL (
             SELECT 
-                c.des_grupo AS grupo_empresa,
-                c.nom_cliente AS nome_cliente,
-                f.nome_completo AS funcionario,
-                t.cod_grupo_tarefa,
-                gt.nome_grupo_tarefa AS nome_tarefa,
-                COALESCE(
-                    ROUND(
-                        EXTRACT(EPOCH FROM SUM(a.horas_trabalhadas)) / 3600, 
-                        2
-                    ), 
-                    0
-                ) AS horas_totais
-            FROM apontador_horas.apontamentos_horas a
-            INNER JOIN apontador_horas.funcionarios f ON a.funcionario_id = f.id
-            INNER JOIN apontador_horas.clientes c ON a.cliente_id = c.id
-            INNER JOIN apontador_horas.tarefas_colaborador t ON a.tarefa_id = t.id
-            INNER JOIN apontador_horas.grupo_tarefas gt ON t.cod_grupo_tarefa = gt.cod_grupo_tarefa
-            WHERE {where_sql}
-            GROUP BY 
-                c.des_grupo,
-                c.nom_cliente,
-                f.nome_completo,
-                t.cod_grupo_tarefa,
-                gt.nome_grupo_tarefa
-            ORDER BY 
-                c.des_grupo,
-                c.nom_cliente,
-                f.nome_completo,
-                gt.nome_grupo_tarefa
-        """
+                COUNT(*) AS qtd_pausas,
+                SUM(EXTRACT(EPOCH FROM (COALESCE(pa.data_retomada, a.data_fim) - pa.data_pausa))) AS segundos_pausados,
+                STRING_AGG(
+                    TO_CHAR(pa.data_pausa AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS') || '/' ||
+                    COALESCE(TO_CHAR(pa.data_retomada AT TIME ZONE 'America/Sao_Paulo', 'YYYY-MM-DD HH24:MI:SS'), ''),
+                    '|' ORDER BY pa.data_pausa
+                ) AS pausas
+            FROM apontador_horas.pausas pa
+            WHERE pa.apontamento_id = a.id
+        ) p ON TRUE
+        WHERE {where_sql}
+        ORDER BY a.data_inicio, a.id
+    """
+    
+    cursor = conn.cursor(name='exportar_apontamentos')
+    cursor.itersize = EXPORTACAO_ITERSIZE
+    cursor.execute(query, params)
+    return cursor
+
+def gerar_csv_apontamentos(cursor, formato, compactar, usuario):
+    """Gera o CSV/TSV (opcionalmente gzip) em blocos de EXPORTACAO_ITERSIZE linhas"""
+    delimitador = ';' if formato == 'csv' else '\t'
+    
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compactar else None
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=delimitador, lineterminator='\n')
+    total = 0
+    
+    def esvaziar():
+        bloco = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(bloco) if compressor else bloco
+    
+    escritor.writerow(COLUNAS_EXPORTACAO_APONTAMENTOS)
+    
+    for linha in cursor:
+        escritor.writerow(linha)
+        total += 1
         
-        cursor.execute(query, params)
-        resultados = cursor.fetchall()
+        if total % EXPORTACAO_ITERSIZE == 0:
+            yield esvaziar()
+    
+    yield esvaziar()
+    if compressor:
+        yield compressor.flush()
+    
+    print(f"📄 Apontamentos exportados ({formato}{'.gz' if compactar else ''}): {usuario} - {total} registros")
+
+def gravar_csv_apontamentos(arquivo, conn, where_sql, params, formato, compactar, usuario):
+    """Grava a exportação linha a linha em arquivo (usado pelos jobs)"""
+    cursor = abrir_cursor_apontamentos(conn, where_sql, params)
+    for bloco in gerar_csv_apontamentos(cursor, formato, compactar, usuario):
+        arquivo.write(bloco)
+    cursor.close()
+
+def executar_job_relatorio(caminho, tipo, where_sql, params, filtros, gerado_por, usuario, formato, compactar):
+    """Corpo dos jobs de relatório: roda no pool, com conexão própria"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError('Erro de conexão')
+    
+    try:
+        if tipo == 'relatorio':
+            dados_hierarquicos, total_registros = consultar_relatorio_tempo(conn, where_sql, params)
+            with open(caminho, 'w') as arquivo:
+                json.dump(dados_hierarquicos, arquivo)
+        elif tipo == 'excel':
+            with open(caminho, 'wb') as arquivo:
+                total_registros = gravar_excel_relatorio(conn, where_sql, params, filtros, gerado_por, arquivo)
+            if total_registros == 0:
+                raise ValueError('Nenhum dado para exportar')
+        else:
+            total_registros = None
+            with open(caminho, 'wb') as arquivo:
+                gravar_csv_apontamentos(arquivo, conn, where_sql, params, formato, compactar, usuario)
         
-        # Organizar dados hierarquicamente
-        dados_hierarquicos = {}
+        return {'total_registros': total_registros}
+    finally:
+        conn.close()
+
+# ========================================
+# ROTAS DE RELATÓRIOS (COM CONTROLE DE ACESSO)
+# ========================================
+
+@app.route('/api/relatorio-tempo', methods=['POST'])
+def relatorio_tempo():
+    """Retorna relatório de tempo decorrido por atividades"""
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    usuario_logado = session.get('usuario')
+    nivel_logado = session.get('nivel')
+    
+    dados = request.get_json()
+    filtros = {
+        'ano': dados.get('ano'),
+        'mes': dados.get('mes'),
+        'departamento': dados.get('departamento'),
+        'funcionario': dados.get('funcionario'),
+        'grupo': dados.get('grupo'),
+        'tarefa': dados.get('tarefa')
+    }
+    
+    # 🔐 CONTROLE DE ACESSO: Obter usuários permitidos
+    usuarios_permitidos = get_usuarios_permitidos(usuario_logado, nivel_logado)
+    
+    # Mês fechado com filtros padrão: servir o relatório pré-gerado
+    # (só se foi gerado para a mesma equipe de hoje)
+    pre_gerado = escopo_relatorio_mensal(filtros, usuario_logado, nivel_logado)
+    relatorio_mensal = obter_relatorio_mensal(*pre_gerado, usuarios_permitidos) if pre_gerado else None
+    if relatorio_mensal:
+        print(f"📊 Relatório pré-gerado servido: {usuario_logado} ({nivel_logado}) - {pre_gerado[2]} {pre_gerado[1]:02d}/{pre_gerado[0]}")
+        return jsonify({
+            'success': True,
+            'dados': relatorio_mensal[0],
+            'pre_gerado': True
+        })
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+    
+    try:
+        # Construir query dinâmica com filtros
+        filtro_sql = montar_filtros_relatorio(filtros, usuarios_permitidos)
+        if filtro_sql is None:
+            # Se tentar filtrar por um usuário não permitido, retorna vazio
+            return jsonify({'success': True, 'dados': {}})
+        where_sql, params = filtro_sql
         
-        for row in resultados:
-            grupo = row['grupo_empresa'] or 'SEM GRUPO'
-            cliente = row['nome_cliente']
-            funcionario = row['funcionario']
-            tarefa = row['nome_tarefa']
-            horas = float(row['horas_totais'])
-            
-            if grupo not in dados_hierarquicos:
-                dados_hierarquicos[grupo] = {}
-            
-            if cliente not in dados_hierarquicos[grupo]:
-                dados_hierarquicos[grupo][cliente] = {}
-            
-            if funcionario not in dados_hierarquicos[grupo][cliente]:
-                dados_hierarquicos[grupo][cliente][funcionario] = {}
-            
-            dados_hierarquicos[grupo][cliente][funcionario][tarefa] = horas
+        dados_hierarquicos, total_registros = consultar_relatorio_tempo(conn, where_sql, params)
         
-        print(f"📊 Relatório gerado: {usuario_logado} ({nivel_logado}) - {len(resultados)} registros")
+        print(f"📊 Relatório gerado: {usuario_logado} ({nivel_logado}) - {total_registros} registros")
         
         return jsonify({
             'success': True,
@@ -1280,221 +2179,60 @@ def exportar_relatorio_excel():
         'tarefa': dados.get('tarefa')
     }
     
+    from flask import send_file
+    
+    # Buscar usuários permitidos
+    usuarios_permitidos = get_usuarios_permitidos(usuario_logado, nivel_logado)
+    
+    # Mês fechado com filtros padrão: enviar a planilha pré-gerada
+    pre_gerado = escopo_relatorio_mensal(filtros, usuario_logado, nivel_logado)
+    relatorio_mensal = obter_relatorio_mensal(*pre_gerado, usuarios_permitidos) if pre_gerado else None
+    if relatorio_mensal:
+        dados_mes, caminho_xlsx = relatorio_mensal
+        if not dados_mes:
+            return jsonify({'success': False, 'message': 'Nenhum dado para exportar'}), 400
+        if caminho_xlsx:
+            print(f"📊 Excel pré-gerado enviado: {usuario_logado} - {pre_gerado[2]} {pre_gerado[1]:02d}/{pre_gerado[0]}")
+            return send_file(
+                caminho_xlsx,
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                as_attachment=True,
+                download_name=f"relatorio_horas_{pre_gerado[0]}_{pre_gerado[1]:02d}.xlsx"
+            )
+    
     conn = get_db_connection()
     if not conn:
         return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
     
     try:
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from openpyxl.utils import get_column_letter
-        from io import BytesIO
-        from datetime import datetime
-        
-        # Buscar usuários permitidos
-        usuarios_permitidos = get_usuarios_permitidos(usuario_logado, nivel_logado)
-        
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        import tempfile
         
         # Construir query (mesma lógica do relatório web)
-        where_clauses = ["a.status = 'finalizado'"]
-        params = []
-        
-        # Filtro obrigatório: apenas usuários permitidos
-        where_clauses.append("f.usuario = ANY(%s)")
-        params.append(usuarios_permitidos)
-        
-        if filtros['ano']:
-            where_clauses.append("EXTRACT(YEAR FROM a.data_inicio AT TIME ZONE 'America/Sao_Paulo') = %s")
-            params.append(filtros['ano'])
-        
-        if filtros['mes']:
-            where_clauses.append("EXTRACT(MONTH FROM a.data_inicio AT TIME ZONE 'America/Sao_Paulo') = %s")
-            params.append(filtros['mes'])
-        
-        if filtros['departamento'] and filtros['departamento'] != 'Todos':
-            where_clauses.append("f.departamento = %s")
-            params.append(filtros['departamento'])
-        
-        if filtros['funcionario'] and filtros['funcionario'] != 'Todos':
-            if filtros['funcionario'] in usuarios_permitidos:
-                where_clauses.append("f.usuario = %s")
-                params.append(filtros['funcionario'])
-            else:
-                return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
-        if filtros['grupo'] and filtros['grupo'] != 'Todos':
-            where_clauses.append("c.cod_grupo_cliente = %s::INTEGER")
-            params.append(filtros['grupo'])
-        
-        if filtros['tarefa'] and filtros['tarefa'] != 'Todos':
-            where_clauses.append("t.cod_grupo_tarefa = %s")
-            params.append(filtros['tarefa'])
-        
-        where_sql = " AND ".join(where_clauses)
-        
-        # Query principal
-        query = f"""
-            SELECT 
-                c.des_grupo AS grupo_empresa,
-                c.nom_cliente AS nome_cliente,
-                f.nome_completo AS funcionario,
-                gt.nome_grupo_tarefa AS nome_tarefa,
-                COALESCE(
-                    ROUND(
-                        EXTRACT(EPOCH FROM SUM(a.horas_trabalhadas)) / 3600, 
-                        2
-                    ), 
-                    0
-                ) AS horas_totais
-            FROM apontador_horas.apontamentos_horas a
-            INNER JOIN apontador_horas.funcionarios f ON a.funcionario_id = f.id
-            INNER JOIN apontador_horas.clientes c ON a.cliente_id = c.id
-            INNER JOIN apontador_horas.tarefas_colaborador t ON a.tarefa_id = t.id
-            INNER JOIN apontador_horas.grupo_tarefas gt ON t.cod_grupo_tarefa = gt.cod_grupo_tarefa
-            WHERE {where_sql}
-            GROUP BY 
-                c.des_grupo,
-                c.nom_cliente,
-                f.nome_completo,
-                gt.nome_grupo_tarefa
-            ORDER BY 
-                c.des_grupo,
-                c.nom_cliente,
-                f.nome_completo,
-                gt.nome_grupo_tarefa
-        """
-        
-        cursor.execute(query, params)
-        resultados = cursor.fetchall()
+        filtro_sql = montar_filtros_relatorio(filtros, usuarios_permitidos)
+        if filtro_sql is None:
+            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        where_sql, params = filtro_sql
+        
+        # O zip do xlsx só é fechado no save: grava em arquivo temporário e envia em blocos
+        arquivo = tempfile.TemporaryFile(suffix='.xlsx')
+        total_registros = gravar_excel_relatorio(
+            conn, where_sql, params, filtros, session.get('nome_completo', usuario_logado), arquivo
+        )
         
-        if len(resultados) == 0:
+        if total_registros == 0:
+            arquivo.close()
             return jsonify({'success': False, 'message': 'Nenhum dado para exportar'}), 400
         
-        # Criar workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Relatório de Horas"
-        
-        # Estilos
-        header_fill = PatternFill(start_color="FFD500", end_color="FFD500", fill_type="solid")
-        header_font = Font(bold=True, color="3F3F41", size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Título
-        ws.merge_cells('A1:E1')
-        title_cell = ws['A1']
-        title_cell.value = "RELATÓRIO DE APONTAMENTO DE HORAS - BOOKER BRASIL"
-        title_cell.font = Font(bold=True, size=14, color="3F3F41")
-        title_cell.fill = PatternFill(start_color="FFD500", end_color="FFD500", fill_type="solid")
-        title_cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Informações do filtro
-        linha = 3
-        ws[f'A{linha}'] = f"Gerado por: {session.get('nome_completo', usuario_logado)}"
-        ws[f'A{linha}'].font = Font(bold=True)
-        linha += 1
-        
-        ws[f'A{linha}'] = f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-        ws[f'A{linha}'].font = Font(bold=True)
-        linha += 1
-        
-        # Filtros aplicados
-        if filtros['ano']:
-            ws[f'A{linha}'] = f"Ano: {filtros['ano']}"
-            linha += 1
-        if filtros['mes']:
-            meses = ['', 'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
-                    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
-            ws[f'A{linha}'] = f"Mês: {meses[int(filtros['mes'])]}"
-            linha += 1
-        
-        linha += 1  # Linha em branco
-        
-        # Cabeçalhos
-        headers = ['Grupo de Empresas', 'Cliente', 'Funcionário', 'Tarefa', 'Horas']
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=linha, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        linha += 1
-        
-        # Função para converter horas decimais em formato HH:MM
-        def converter_horas_para_tempo(horas_decimal):
-            """Converte horas decimais (ex: 2.5) para formato de tempo HH:MM (ex: 02:30)"""
-            horas = int(horas_decimal)
-            minutos = int((horas_decimal - horas) * 60)
-            return f"{horas:02d}:{minutos:02d}"
-        
-        # Dados
-        total_geral = 0
-        for row in resultados:
-            ws.cell(row=linha, column=1, value=row['grupo_empresa'] or 'SEM GRUPO')
-            ws.cell(row=linha, column=2, value=row['nome_cliente'])
-            ws.cell(row=linha, column=3, value=row['funcionario'])
-            ws.cell(row=linha, column=4, value=row['nome_tarefa'])
-            
-            # Converter horas decimais para formato HH:MM
-            horas_decimal = float(row['horas_totais'])
-            horas_formatadas = converter_horas_para_tempo(horas_decimal)
-            
-            horas_cell = ws.cell(row=linha, column=5, value=horas_formatadas)
-            horas_cell.alignment = Alignment(horizontal='center')
-            
-            total_geral += horas_decimal
-            
-            # Aplicar bordas
-            for col in range(1, 6):
-                ws.cell(row=linha, column=col).border = border
-            
-            linha += 1
-        
-        # Total geral
-        linha += 1
-        total_cell = ws.cell(row=linha, column=4)
-        total_cell.value = "TOTAL GERAL:"
-        total_cell.font = Font(bold=True, size=12)
-        total_cell.alignment = Alignment(horizontal='right')
-        
-        # Converter total geral para formato HH:MM
-        total_formatado = converter_horas_para_tempo(total_geral)
-        
-        total_value_cell = ws.cell(row=linha, column=5)
-        total_value_cell.value = total_formatado
-        total_value_cell.font = Font(bold=True, size=12)
-        total_value_cell.fill = PatternFill(start_color="FFF9E6", end_color="FFF9E6", fill_type="solid")
-        total_value_cell.alignment = Alignment(horizontal='center')
-        
-        # Ajustar largura das colunas
-        ws.column_dimensions['A'].width = 25
-        ws.column_dimensions['B'].width = 35
-        ws.column_dimensions['C'].width = 30
-        ws.column_dimensions['D'].width = 30
-        ws.column_dimensions['E'].width = 12
-        
-        # Salvar em BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        arquivo.seek(0)
         
         # Gerar nome do arquivo
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         nome_arquivo = f"relatorio_horas_{timestamp}.xlsx"
         
-        print(f"📊 Excel exportado: {usuario_logado} - {len(resultados)} registros")
+        print(f"📊 Excel exportado: {usuario_logado} - {total_registros} registros")
         
-        from flask import send_file
         return send_file(
-            output,
+            arquivo,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
             download_name=nome_arquivo
@@ -1508,6 +2246,218 @@ def exportar_relatorio_excel():
     finally:
         conn.close()
 
+@app.route('/api/exportar-apontamentos', methods=['GET'])
+def exportar_apontamentos():
+    """
+    Exporta os apontamentos (com pausas) em CSV/TSV, opcionalmente gzip
+    
+    Mesmos filtros e controle de acesso do relatório de tempo, via query string.
+    As linhas vêm de um cursor no servidor e são enviadas em blocos.
+    """
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    usuario_logado = session.get('usuario')
+    nivel_logado = session.get('nivel')
+    
+    filtros = {
+        'ano': request.args.get('ano'),
+        'mes': request.args.get('mes'),
+        'departamento': request.args.get('departamento'),
+        'funcionario': request.args.get('funcionario'),
+        'grupo': request.args.get('grupo'),
+        'tarefa': request.args.get('tarefa')
+    }
+    formato = request.args.get('formato', 'csv').lower()
+    compactar = request.args.get('gzip', '').lower() in ('1', 'true', 'sim')
+    
+    if formato not in ('csv', 'tsv'):
+        return jsonify({'success': False, 'message': 'Formato inválido (use csv ou tsv)'}), 400
+    
+    usuarios_permitidos = get_usuarios_permitidos(usuario_logado, nivel_logado)
+    
+    filtro_sql = montar_filtros_relatorio(filtros, usuarios_permitidos)
+    if filtro_sql is None:
+        return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+    where_sql, params = filtro_sql
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Erro de conexão'}), 500
+    
+    try:
+        cursor = abrir_cursor_apontamentos(conn, where_sql, params)
+    except Exception as e:
+        conn.close()
+        print(f"❌ Erro ao exportar apontamentos: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    nome_arquivo = f"apontamentos_{timestamp}.{formato}" + ('.gz' if compactar else '')
+    mimetype = 'application/gzip' if compactar else ('text/csv' if formato == 'csv' else 'text/tab-separated-values')
+    
+    resposta = Response(
+        stream_with_context(gerar_csv_apontamentos(cursor, formato, compactar, usuario_logado)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={nome_arquivo}'}
+    )
+    # Fecha a conexão ao fim do download (inclusive se o cliente desistir no meio)
+    resposta.call_on_close(conn.close)
+    return resposta
+
+# ========================================
+# JOBS DE RELATÓRIO (EXECUÇÃO ASSÍNCRONA)
+# ========================================
+
+@app.route('/api/relatorios/jobs', methods=['POST'])
+def criar_job_relatorio():
+    """
+    Enfileira um relatório pesado e retorna o job_id (HTTP 202)
+    
+    tipo: relatorio (JSON do relatório de tempo), excel ou csv.
+    O worker do gunicorn é liberado na hora; o resultado fica em disco.
+    """
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    usuario_logado = session.get('usuario')
+    nivel_logado = session.get('nivel')
+    
+    dados = request.get_json() or {}
+    tipo = dados.get('tipo')
+    filtros = {
+        'ano': dados.get('ano'),
+        'mes': dados.get('mes'),
+        'departamento': dados.get('departamento'),
+        'funcionario': dados.get('funcionario'),
+        'grupo': dados.get('grupo'),
+        'tarefa': dados.get('tarefa')
+    }
+    formato = (dados.get('formato') or 'csv').lower()
+    compactar = bool(dados.get('gzip'))
+    
+    if tipo not in ('relatorio', 'excel', 'csv'):
+        return jsonify({'success': False, 'message': 'Tipo inválido (use relatorio, excel ou csv)'}), 400
+    
+    if tipo == 'csv' and formato not in ('csv', 'tsv'):
+        return jsonify({'success': False, 'message': 'Formato inválido (use csv ou tsv)'}), 400
+    
+    limpar_jobs_expirados()
+    
+    usuarios_permitidos = get_usuarios_permitidos(usuario_logado, nivel_logado)
+    
+    # Mês fechado já pré-gerado: job já concluído apontando para o resultado pronto
+    # (mesmo contrato 202 + job_id; o polling devolve concluido na primeira consulta)
+    if tipo in ('relatorio', 'excel'):
+        pre_gerado = escopo_relatorio_mensal(filtros, usuario_logado, nivel_logado)
+        relatorio_mensal = obter_relatorio_mensal(*pre_gerado, usuarios_permitidos) if pre_gerado else None
+        if relatorio_mensal:
+            dados_mes, caminho_xlsx = relatorio_mensal
+            job = None
+            if tipo == 'relatorio':
+                def gravar_json(caminho):
+                    with open(caminho, 'w') as arquivo:
+                        json.dump(dados_mes, arquivo)
+                job = registrar_job_concluido(usuario_logado, tipo, 'json', gravar=gravar_json,
+                                              info={'total_registros': None, 'pre_gerado': True})
+            elif caminho_xlsx and dados_mes:
+                job = registrar_job_concluido(usuario_logado, tipo, 'xlsx', arquivo=caminho_xlsx,
+                                              info={'total_registros': None, 'pre_gerado': True})
+            if job:
+                print(f"📊 Relatório pré-gerado via job: {usuario_logado} - {pre_gerado[2]} {pre_gerado[1]:02d}/{pre_gerado[0]}")
+                return jsonify({'success': True, 'job_id': job['id'], 'status': job['status']}), 202
+    
+    filtro_sql = montar_filtros_relatorio(filtros, usuarios_permitidos)
+    if filtro_sql is None:
+        return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+    where_sql, params = filtro_sql
+    
+    if tipo == 'relatorio':
+        extensao = 'json'
+    elif tipo == 'excel':
+        extensao = 'xlsx'
+    else:
+        extensao = formato + ('.gz' if compactar else '')
+    
+    try:
+        job = submeter_job(
+            usuario_logado, tipo, extensao, executar_job_relatorio,
+            tipo, where_sql, params, filtros, session.get('nome_completo', usuario_logado),
+            usuario_logado, formato, compactar
+        )
+    except Exception as e:
+        print(f"❌ Erro ao enfileirar job de relatório: {e}")
+        return jsonify({'success': False, 'message': 'Erro ao enfileirar o relatório'}), 500
+    
+    if job is None:
+        return jsonify({'success': False, 'message': 'Fila de relatórios cheia. Tente novamente em instantes.'}), 503
+    
+    return jsonify({'success': True, 'job_id': job['id'], 'status': job['status']}), 202
+
+@app.route('/api/relatorios/jobs/<job_id>', methods=['GET'])
+def status_job_relatorio(job_id):
+    """Consulta o andamento de um job de relatório (polling)"""
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    job = obter_job(job_id)
+    if not job or job['usuario'] != session.get('usuario'):
+        return jsonify({'success': False, 'message': 'Job não encontrado ou expirado'}), 404
+    
+    resposta = {
+        'success': True,
+        'job_id': job['id'],
+        'tipo': job['tipo'],
+        'status': job['status'],
+        'criado_em': job['criado_em'],
+        'concluido_em': job['concluido_em'],
+        'mensagem': job['mensagem'],
+        'info': job['info']
+    }
+    if job['status'] == STATUS_CONCLUIDO:
+        resposta['download_url'] = url_for('download_job_relatorio', job_id=job['id'])
+    
+    return jsonify(resposta)
+
+@app.route('/api/relatorios/jobs/<job_id>/download', methods=['GET'])
+def download_job_relatorio(job_id):
+    """Baixa o resultado de um job concluído"""
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    job = obter_job(job_id)
+    if not job or job['usuario'] != session.get('usuario'):
+        return jsonify({'success': False, 'message': 'Job não encontrado ou expirado'}), 404
+    
+    if job['status'] != STATUS_CONCLUIDO:
+        return jsonify({'success': False, 'message': 'Relatório ainda não está pronto', 'status': job['status']}), 409
+    
+    caminho = caminho_resultado(job)
+    if not os.path.exists(caminho):
+        return jsonify({'success': False, 'message': 'Job não encontrado ou expirado'}), 404
+    
+    from flask import send_file
+    
+    if job['tipo'] == 'relatorio':
+        return send_file(caminho, mimetype='application/json')
+    
+    mimetypes = {
+        'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'csv': 'application/gzip' if job['extensao'].endswith('.gz') else
+               ('text/tab-separated-values' if job['extensao'] == 'tsv' else 'text/csv')
+    }
+    prefixo = 'relatorio_horas' if job['tipo'] == 'excel' else 'apontamentos'
+    timestamp = job['criado_em'].replace('-', '').replace(':', '').replace('T', '_')
+    
+    return send_file(
+        caminho,
+        mimetype=mimetypes[job['tipo']],
+        as_attachment=True,
+        download_name=f"{prefixo}_{timestamp}.{job['extensao']}"
+    )
+
 @app.route('/api/filtros-relatorio', methods=['GET'])
 def filtros_relatorio():
     """Retorna opções disponíveis para filtros (com controle de acesso)"""
@@ -1582,6 +2532,213 @@ def filtros_relatorio():
 # ROTA DE CHAT (mantém compatibilidade)
 # ========================================
 
+# ========================================
+# CHAT (PROXY PARA O N8N)
+# ========================================
+
+RESPOSTA_FORMATO_INESPERADO = 'Desculpe, recebi uma resposta em formato inesperado do servidor.'
+MENSAGEM_CHAT_INDISPONIVEL = 'O assistente está temporariamente indisponível. Tente novamente em alguns instantes.'
+
+def montar_payload_chat(mensagem):
+    """Payload enviado ao webhook do n8n (cria o sessionId da conversa se preciso)"""
+    session_id = session.get('session_id')
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        session['session_id'] = session_id
+    
+    return {
+        'chatInput': mensagem,
+        'usuario': session.get('usuario'),
+        'nome_completo': session.get('nome_completo'),
+        'usuario_id': session.get('usuario_id'),
+        'sessionId': session_id
+    }
+
+def extrair_resposta_bot(data):
+    """Texto da resposta do n8n, aceitando os formatos de saída usados nos workflows"""
+    resposta_bot = None
+    if isinstance(data, dict):
+        resposta_bot = (
+            data.get('output') or
+            data.get('text') or
+            data.get('response') or
+            data.get('resposta') or
+            data.get('message')
+        )
+        
+        if not resposta_bot and 'data' in data:
+            if isinstance(data['data'], dict):
+                resposta_bot = data['data'].get('output') or data['data'].get('text')
+            elif isinstance(data['data'], str):
+                resposta_bot = data['data']
+    elif isinstance(data, list) and data:
+        # "Respond to Webhook" com todos os itens: usa o primeiro
+        resposta_bot = extrair_resposta_bot(data[0])
+    elif isinstance(data, str):
+        resposta_bot = data
+    
+    return resposta_bot
+
+def extrair_token_stream(linha):
+    """
+    Interpreta uma linha do stream do n8n (NDJSON ou SSE)
+    
+    Retorna (tipo, texto): ('token', ...), ('erro', ...), ('controle', None)
+    ou ('bruto', linha) se a linha não é JSON.
+    """
+    if linha.startswith('data:'):
+        linha = linha[5:].strip()
+    
+    if not linha or linha == '[DONE]':
+        return 'controle', None
+    
+    try:
+        evento = json.loads(linha)
+    except ValueError:
+        return 'bruto', linha
+    
+    if isinstance(evento, dict) and 'type' in evento:
+        # Streaming nativo do n8n: begin / item / end / error
+        if evento['type'] == 'item':
+            return 'token', evento.get('content') or ''
+        if evento['type'] == 'error':
+            return 'erro', evento.get('content') or 'Erro no workflow do chatbot'
+        return 'controle', None
+    
+    # Resposta completa em uma linha: mesma extração do modo sem streaming
+    return 'token', extrair_resposta_bot(evento) or ''
+
+def _evento_chat(tipo, texto=None, **extras):
+    """Linha NDJSON enviada ao chat.js"""
+    evento = {'tipo': tipo}
+    if texto is not None:
+        evento['texto'] = texto
+    evento.update(extras)
+    return json.dumps(evento, ensure_ascii=False) + '\n'
+
+# ========================================
+# CHAT: COMANDOS RESPONDIDOS LOCALMENTE
+# ========================================
+
+# Frases exatas (já normalizadas) -> intenção; o resto vai para o n8n
+COMANDOS_LOCAIS_CHAT = {
+    'status': 'status',
+    'minhas tarefas': 'status',
+    'tarefas ativas': 'status',
+    'pausar tudo': 'pausar_tudo',
+    'pausar todas': 'pausar_tudo',
+    'pausar todas as tarefas': 'pausar_tudo',
+    'quanto trabalhei hoje': 'horas_hoje',
+    'quantas horas trabalhei hoje': 'horas_hoje',
+    'horas hoje': 'horas_hoje',
+}
+
+def normalizar_comando_chat(mensagem):
+    """Minúsculas, sem acentos, pontuação nem espaços extras"""
+    texto = unicodedata.normalize('NFKD', mensagem.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = ''.join(c if c.isalnum() else ' ' for c in texto)
+    return ' '.join(texto.split())
+
+def identificar_comando_local(mensagem):
+    """Intenção do comando, ou None se a mensagem é livre (vai para o n8n)"""
+    return COMANDOS_LOCAIS_CHAT.get(normalizar_comando_chat(mensagem))
+
+def _texto_tarefas_ativas(tarefas):
+    if not tarefas:
+        return 'Você não tem tarefas ativas no momento.'
+    
+    linhas = [f"Você tem **{len(tarefas)}** tarefa(s) ativa(s):"]
+    for t in tarefas:
+        if t['status'] == 'pausado':
+            situacao = f"pausada às {t['data_pausa'][11:16]}" if t['data_pausa'] else 'pausada'
+        else:
+            situacao = f"em andamento desde {t['data_inicio'][11:16]}"
+        linhas.append(f"• **{t['cliente_nome']}** - {t['tarefa_nome']} ({situacao})")
+    return '\n'.join(linhas)
+
+def _comando_status(cursor, usuario, funcionario_id):
+    return _texto_tarefas_ativas(consultar_tarefas_ativas(cursor, usuario)), False
+
+def _comando_pausar_tudo(cursor, usuario, funcionario_id):
+    tarefas = consultar_tarefas_ativas(cursor, usuario)
+    ids = sorted(t['apontamento_id'] for t in tarefas if t['status'] == 'em_andamento')
+    
+    if not ids:
+        return 'Você não tem tarefas em andamento para pausar.', False
+    
+    _, aplicar_ids, _ = executar_lote_tarefas(cursor, 'pausar', ids, funcionario_id)
+    
+    print(f"📦 Lote 'pausar' (chat): {usuario} | {len(aplicar_ids)}/{len(ids)} tarefa(s)")
+    nomes = [f"• **{t['cliente_nome']}** - {t['tarefa_nome']}" for t in tarefas if t['apontamento_id'] in aplicar_ids]
+    return '\n'.join([f"⏸️ Pausei {len(aplicar_ids)} tarefa(s):"] + nomes), True
+
+def _comando_horas_hoje(cursor, usuario, funcionario_id):
+    # Mesmo cálculo do endpoint em lote (total - pausas), somado sobre o dia em São Paulo
+    cursor.execute("""
+        SELECT 
+            COUNT(*) AS apontamentos,
+            COUNT(*) FILTER (WHERE status <> 'finalizado') AS ativos,
+            COALESCE(SUM(horas), 0) AS horas
+        FROM (
+            SELECT 
+                a.status,
+                EXTRACT(EPOCH FROM (COALESCE(a.data_fim, NOW()) - a.data_inicio))/3600
+                - COALESCE(SUM(EXTRACT(EPOCH FROM (
+                    COALESCE(p.data_retomada, NOW()) - p.data_pausa
+                )))/3600, 0) AS horas
+            FROM apontamentos_horas a
+            LEFT JOIN pausas p ON p.apontamento_id = a.id
+            WHERE a.funcionario_id = %s
+              AND a.data_inicio >= (DATE_TRUNC('day', NOW() AT TIME ZONE 'America/Sao_Paulo') AT TIME ZONE 'America/Sao_Paulo')
+            GROUP BY a.id, a.status, a.data_inicio, a.data_fim
+        ) dia
+    """, (funcionario_id,))
+    
+    resultado = cursor.fetchone()
+    if not resultado['apontamentos']:
+        return 'Você ainda não registrou horas hoje.', False
+    
+    texto = (f"Hoje você trabalhou **{converter_horas_para_tempo(float(resultado['horas']))}** "
+             f"em {resultado['apontamentos']} apontamento(s).")
+    if resultado['ativos']:
+        texto += f" Há {resultado['ativos']} tarefa(s) ainda ativa(s): o total continua contando."
+    return texto, False
+
+EXECUTORES_COMANDOS_LOCAIS = {
+    'status': _comando_status,
+    'pausar_tudo': _comando_pausar_tudo,
+    'horas_hoje': _comando_horas_hoje,
+}
+
+def responder_comando_local(comando):
+    """
+    Responde o comando com os dados do próprio app
+    
+    Retorna (texto, atualizar_tarefas) ou None se não foi possível
+    (a mensagem segue para o n8n).
+    """
+    usuario = session.get('usuario')
+    
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        texto, atualizar_tarefas = EXECUTORES_COMANDOS_LOCAIS[comando](cursor, usuario, session.get('usuario_id'))
+        conn.commit()
+        print(f"⚡ Comando local '{comando}': {usuario}")
+        return texto, atualizar_tarefas
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erro no comando local '{comando}': {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+    finally:
+        conn.close()
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     if 'usuario' not in session:
@@ -1590,27 +2747,33 @@ def chat():
     dados = request.get_json()
     mensagem = dados.get('mensagem')
     usuario = session.get('usuario')
-    nome_completo = session.get('nome_completo')
-    usuario_id = session.get('usuario_id')
-    session_id = session.get('session_id')
-    
-    if not session_id:
-        session_id = str(uuid.uuid4())
-        session['session_id'] = session_id
     
     if not mensagem:
         return jsonify({'success': False, 'message': 'Mensagem vazia'}), 400
     
+    # Comandos conhecidos são respondidos aqui mesmo, sem passar pelo n8n
+    comando = identificar_comando_local(mensagem)
+    resposta_local = responder_comando_local(comando) if comando else None
+    if resposta_local:
+        texto, atualizar_tarefas = resposta_local
+        return jsonify({
+            'success': True,
+            'resposta': texto,
+            'atualizar_tarefas': atualizar_tarefas
+        })
+    
+    # Sem vaga: responde na hora em vez de enfileirar mais threads esperando o n8n
+    if not vagas_chat.acquire(blocking=False):
+        print(f"⚠️ Chat sem vagas ({CHAT_MAX_CONCORRENTES} em andamento): {usuario}")
+        return jsonify({
+            'success': False,
+            'message': 'O assistente está atendendo muitas conversas agora. Tente novamente em instantes.'
+        }), 503
+    
     try:
-        payload = {
-            'chatInput': mensagem,
-            'usuario': usuario,
-            'nome_completo': nome_completo,
-            'usuario_id': usuario_id,
-            'sessionId': session_id
-        }
+        payload = montar_payload_chat(mensagem)
         
-        response = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=30)
+        response = enviar_webhook(payload)
         
         if response.status_code != 200:
             return jsonify({
@@ -1620,43 +2783,167 @@ def chat():
         
         data = response.json()
         
-        resposta_bot = None
-        if isinstance(data, dict):
-            resposta_bot = (
-                data.get('output') or
-                data.get('text') or
-                data.get('response') or
-                data.get('resposta') or
-                data.get('message')
-            )
-            
-            if not resposta_bot and 'data' in data:
-                if isinstance(data['data'], dict):
-                    resposta_bot = data['data'].get('output') or data['data'].get('text')
-                elif isinstance(data['data'], str):
-                    resposta_bot = data['data']
-        elif isinstance(data, str):
-            resposta_bot = data
+        resposta_bot = extrair_resposta_bot(data)
         
         if not resposta_bot:
-            resposta_bot = 'Desculpe, recebi uma resposta em formato inesperado do servidor.'
+            resposta_bot = RESPOSTA_FORMATO_INESPERADO
         
         return jsonify({
             'success': True,
             'resposta': resposta_bot
         })
         
+    except CircuitoAberto:
+        return jsonify({'success': False, 'message': MENSAGEM_CHAT_INDISPONIVEL}), 503
+    except requests.exceptions.Timeout:
+        return jsonify({
+            'success': False,
+            'message': 'O chatbot demorou muito para responder. Tente novamente.'
+        }), 500
+    except Exception as e:
+        print(f"❌ Erro no chat: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Erro ao processar resposta: {str(e)}'
+        }), 500
+    finally:
+        vagas_chat.release()
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Chat com resposta incremental (NDJSON: token / fim / erro)
+    
+    Repassa o streaming do n8n (NDJSON nativo, SSE ou texto) conforme chega;
+    resposta JSON completa cai na mesma extração do /api/chat.
+    """
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    dados = request.get_json()
+    mensagem = dados.get('mensagem')
+    usuario = session.get('usuario')
+    
+    if not mensagem:
+        return jsonify({'success': False, 'message': 'Mensagem vazia'}), 400
+    
+    comando = identificar_comando_local(mensagem)
+    resposta_local = responder_comando_local(comando) if comando else None
+    if resposta_local:
+        texto, atualizar_tarefas = resposta_local
+        return Response(
+            _evento_chat('token', texto) + _evento_chat('fim', atualizar_tarefas=atualizar_tarefas),
+            mimetype='application/x-ndjson'
+        )
+    
+    if not vagas_chat.acquire(blocking=False):
+        print(f"⚠️ Chat sem vagas ({CHAT_MAX_CONCORRENTES} em andamento): {usuario}")
+        return jsonify({
+            'success': False,
+            'message': 'O assistente está atendendo muitas conversas agora. Tente novamente em instantes.'
+        }), 503
+    
+    try:
+        response = enviar_webhook(montar_payload_chat(mensagem), stream=True)
+    except CircuitoAberto:
+        vagas_chat.release()
+        return jsonify({'success': False, 'message': MENSAGEM_CHAT_INDISPONIVEL}), 503
     except requests.exceptions.Timeout:
+        vagas_chat.release()
         return jsonify({
             'success': False,
             'message': 'O chatbot demorou muito para responder. Tente novamente.'
         }), 500
     except Exception as e:
+        vagas_chat.release()
         print(f"❌ Erro no chat: {str(e)}")
         return jsonify({
             'success': False,
             'message': f'Erro ao processar resposta: {str(e)}'
         }), 500
+    
+    if response.status_code != 200:
+        response.close()
+        vagas_chat.release()
+        return jsonify({
+            'success': False,
+            'message': f'Erro no servidor do chatbot (HTTP {response.status_code})'
+        }), 500
+    
+    tipo_conteudo = response.headers.get('Content-Type', '')
+    if 'charset' not in tipo_conteudo:
+        response.encoding = 'utf-8'  # requests assume latin-1 para text/* sem charset
+    
+    def gerar():
+        enviou_texto = False
+        linhas_json = []  # JSON completo formatado em várias linhas
+        
+        try:
+            if tipo_conteudo.startswith('text/plain'):
+                for pedaco in response.iter_content(chunk_size=None, decode_unicode=True):
+                    if pedaco:
+                        enviou_texto = True
+                        yield _evento_chat('token', pedaco)
+            else:
+                for linha in response.iter_lines(decode_unicode=True):
+                    tipo, texto = extrair_token_stream(linha.strip())
+                    
+                    if tipo == 'token' and texto:
+                        enviou_texto = True
+                        yield _evento_chat('token', texto)
+                    elif tipo == 'erro':
+                        yield _evento_chat('erro', texto)
+                        return
+                    elif tipo == 'bruto':
+                        if 'json' in tipo_conteudo:
+                            linhas_json.append(linha)
+                        else:
+                            enviou_texto = True
+                            yield _evento_chat('token', texto + '\n')
+                
+                if linhas_json:
+                    texto = extrair_resposta_bot(json.loads('\n'.join(linhas_json)))
+                    if texto:
+                        enviou_texto = True
+                        yield _evento_chat('token', texto)
+            
+            if not enviou_texto:
+                yield _evento_chat('token', RESPOSTA_FORMATO_INESPERADO)
+            yield _evento_chat('fim')
+            
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError) as e:
+            # Stream parado no meio vem como ConnectionError (ReadTimeoutError do urllib3), não Timeout
+            print(f"⚠️ Stream do chat interrompido: {type(e).__name__}: {e}")
+            registrar_falha(f'stream interrompido ({type(e).__name__})')
+            yield _evento_chat('erro', 'O chatbot demorou muito para responder. Tente novamente.')
+        except Exception as e:
+            print(f"❌ Erro no stream do chat: {str(e)}")
+            yield _evento_chat('erro', f'Erro ao processar resposta: {str(e)}')
+        finally:
+            response.close()
+    
+    resposta = Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # Nginx: repassar sem bufferizar
+    resposta.call_on_close(vagas_chat.release)
+    return resposta
+
+@app.route('/api/metricas/chat', methods=['GET'])
+def metricas_chat():
+    """Estado do circuit breaker do n8n neste processo (admin/sócio)"""
+    if 'usuario' not in session:
+        return jsonify({'success': False, 'message': 'Não autenticado'}), 401
+    
+    if session.get('nivel') not in ['admin', 'socio']:
+        return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+    
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'max_concorrentes': CHAT_MAX_CONCORRENTES,
+        'circuito_n8n': estado_circuito()
+    })
 
 if __name__ == '__main__':
     # Teste de conexão ao iniciar
@@ -0,0 +1,181 @@
+"""
+Cliente HTTP do webhook do n8n (chat)
+- Uma Session por processo, com pool de conexões keep-alive: o handshake
+  TCP+TLS acontece uma vez, não a cada mensagem
+- Timeouts separados de conexão e de leitura
+- Nova tentativa com backoff só quando a conexão falha (a mensagem não
+  chegou ao n8n); erro depois do envio não é repetido (POST não é idempotente)
+- Circuit breaker: depois de N8N_CIRCUITO_FALHAS falhas ou respostas lentas
+  seguidas o circuito abre e as chamadas falham na hora; passado
+  N8N_CIRCUITO_ESPERA, uma única chamada de teste (meio aberto) decide se fecha
+  (estado por processo do gunicorn)
+"""
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# Configurações lidas na importação: carregar o .env antes (app.py importa este módulo primeiro)
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(dotenv_path)
+
+# Configurações (via .env)
+N8N_WEBHOOK_URL = os.getenv('N8N_WEBHOOK_URL', 'https://n8n.bookerbrasil.com/webhook/9d8f9a85-c21d-4aed-bd52-124af0d116c3/chat')
+N8N_TIMEOUT_CONEXAO = float(os.getenv('N8N_TIMEOUT_CONEXAO', '5'))
+N8N_TIMEOUT_LEITURA = float(os.getenv('N8N_TIMEOUT_LEITURA', '30'))
+N8N_POOL_CONEXOES = int(os.getenv('N8N_POOL_CONEXOES', '10'))
+N8N_TENTATIVAS = int(os.getenv('N8N_TENTATIVAS', '2'))
+N8N_BACKOFF = float(os.getenv('N8N_BACKOFF', '0.5'))
+N8N_CIRCUITO_FALHAS = int(os.getenv('N8N_CIRCUITO_FALHAS', '5'))
+N8N_CIRCUITO_LENTO = float(os.getenv('N8N_CIRCUITO_LENTO', '15'))
+N8N_CIRCUITO_ESPERA = float(os.getenv('N8N_CIRCUITO_ESPERA', '30'))
+
+# Estados do circuit breaker
+CIRCUITO_FECHADO = 'fechado'
+CIRCUITO_ABERTO = 'aberto'
+CIRCUITO_MEIO_ABERTO = 'meio_aberto'
+
+class CircuitoAberto(Exception):
+    """n8n marcado como indisponível: a chamada nem foi feita"""
+
+_sessao = None
+_lock = threading.Lock()
+
+_lock_circuito = threading.Lock()
+_circuito = {
+    'estado': CIRCUITO_FECHADO,
+    'falhas_seguidas': 0,
+    'aberto_em': None,
+    'teste_em_andamento': False,
+    'aberturas': 0,
+    'chamadas': 0,
+    'falhas': 0,
+    'lentas': 0,
+    'rejeitadas': 0,
+    'ultima_falha': None
+}
+
+def _criar_sessao():
+    retry = Retry(
+        total=N8N_TENTATIVAS,
+        connect=N8N_TENTATIVAS,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=N8N_BACKOFF,
+        raise_on_status=False
+    )
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=N8N_POOL_CONEXOES, max_retries=retry)
+
+    sessao = requests.Session()
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+def obter_sessao():
+    """Session compartilhada do processo (criada sob demanda, depois do fork do gunicorn)"""
+    global _sessao
+    if _sessao is None:
+        with _lock:
+            if _sessao is None:
+                _sessao = _criar_sessao()
+    return _sessao
+
+# ========================================
+# CIRCUIT BREAKER
+# ========================================
+
+def _liberar_chamada():
+    """Decide se a chamada pode seguir; levanta CircuitoAberto se não"""
+    with _lock_circuito:
+        if _circuito['estado'] == CIRCUITO_ABERTO:
+            if time.time() - _circuito['aberto_em'] < N8N_CIRCUITO_ESPERA:
+                _circuito['rejeitadas'] += 1
+                raise CircuitoAberto()
+            _circuito['estado'] = CIRCUITO_MEIO_ABERTO
+            print("🟡 Circuito do n8n meio aberto: testando com a próxima mensagem")
+        
+        if _circuito['estado'] == CIRCUITO_MEIO_ABERTO:
+            # Só uma chamada de teste por vez; as demais continuam falhando na hora
+            if _circuito['teste_em_andamento']:
+                _circuito['rejeitadas'] += 1
+                raise CircuitoAberto()
+            _circuito['teste_em_andamento'] = True
+        
+        _circuito['chamadas'] += 1
+
+def registrar_sucesso():
+    with _lock_circuito:
+        if _circuito['estado'] != CIRCUITO_FECHADO:
+            print("🟢 Circuito do n8n fechado: webhook respondendo novamente")
+        _circuito['estado'] = CIRCUITO_FECHADO
+        _circuito['falhas_seguidas'] = 0
+        _circuito['teste_em_andamento'] = False
+
+def registrar_falha(motivo):
+    """Conta uma falha (erro, HTTP 5xx ou resposta lenta) e abre o circuito se preciso"""
+    with _lock_circuito:
+        _circuito['falhas'] += 1
+        _circuito['falhas_seguidas'] += 1
+        _circuito['ultima_falha'] = motivo
+        
+        if _circuito['estado'] == CIRCUITO_MEIO_ABERTO or _circuito['falhas_seguidas'] >= N8N_CIRCUITO_FALHAS:
+            if _circuito['estado'] != CIRCUITO_ABERTO:
+                _circuito['aberturas'] += 1
+                print(f"🔴 Circuito do n8n aberto por {N8N_CIRCUITO_ESPERA:.0f}s "
+                      f"({_circuito['falhas_seguidas']} falha(s) seguida(s): {motivo})")
+            _circuito['estado'] = CIRCUITO_ABERTO
+            _circuito['aberto_em'] = time.time()
+        
+        _circuito['teste_em_andamento'] = False
+
+def estado_circuito():
+    """Cópia do estado e dos contadores do circuito (métricas)"""
+    with _lock_circuito:
+        estado = dict(_circuito)
+    
+    if estado['estado'] == CIRCUITO_ABERTO:
+        estado['reabre_em_segundos'] = max(0, round(N8N_CIRCUITO_ESPERA - (time.time() - estado['aberto_em']), 1))
+    estado.pop('aberto_em')
+    estado['limite_falhas'] = N8N_CIRCUITO_FALHAS
+    estado['limite_lento_segundos'] = N8N_CIRCUITO_LENTO
+    return estado
+
+def enviar_webhook(payload, stream=False):
+    """
+    POST da mensagem para o webhook do n8n
+    
+    Levanta CircuitoAberto se o n8n está marcado como fora do ar e
+    requests.exceptions.* em falha. Com stream=True o tempo medido é até os
+    cabeçalhos; falhas na leitura do corpo devem ser informadas com registrar_falha.
+    """
+    _liberar_chamada()
+    
+    inicio = time.time()
+    try:
+        response = obter_sessao().post(
+            N8N_WEBHOOK_URL,
+            json=payload,
+            timeout=(N8N_TIMEOUT_CONEXAO, N8N_TIMEOUT_LEITURA),
+            stream=stream
+        )
+    except Exception as e:
+        registrar_falha(type(e).__name__)
+        raise
+    
+    duracao = time.time() - inicio
+    if response.status_code >= 500:
+        registrar_falha(f'HTTP {response.status_code}')
+    elif duracao > N8N_CIRCUITO_LENTO:
+        with _lock_circuito:
+            _circuito['lentas'] += 1
+        registrar_falha(f'resposta lenta ({duracao:.1f}s)')
+    else:
+        registrar_sucesso()
+    
+    return response
@@ -0,0 +1,179 @@
+"""
+Script para exportar os apontamentos em Parquet (particionado por mês)
+- Uma pasta por mês: <destino>/ano=2025/mes=03/apontamentos.parquet
+- Colunas já enriquecidas (cliente, grupo, funcionário, departamento, horas)
+- Cada mês é consultado e gravado separadamente: a memória fica limitada a um mês
+
+Uso:
+    python exportar_parquet.py --ano 2025
+    python exportar_parquet.py --ano 2025 --mes 3 --departamento Fiscal --destino /dados/parquet
+
+Leitura no pandas (só as colunas necessárias):
+    pd.read_parquet('/dados/parquet', columns=['cliente', 'horas_trabalhadas'],
+                    filters=[('ano', '=', 2025)])
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+# =====================================================
+# CONFIGURAÇÕES DE CONEXÃO
+# =====================================================
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(dotenv_path)
+
+DB_CONFIG = {
+    'host': os.getenv('HOST_DW'),
+    'database': os.getenv('DBNAME_DW'),
+    'user': os.getenv('USER_DW'),
+    'password': os.getenv('PASS_DW'),
+    'port': os.getenv('PORT_DW'),
+    'options': '-c search_path=apontador_horas,public'
+}
+
+DESTINO_PADRAO = os.getenv('PARQUET_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files', 'parquet')
+
+# Linhas por ida ao banco (cursor no servidor)
+ITERSIZE = 5000
+
+COLUNAS = [
+    'apontamento_id', 'data_inicio', 'data_fim', 'horas_trabalhadas',
+    'usuario', 'funcionario', 'departamento',
+    'cnpj_cpf', 'cliente', 'cod_grupo_cliente', 'grupo_empresa',
+    'cod_grupo_tarefa', 'grupo_tarefa', 'tarefa', 'observacao'
+]
+
+# Colunas repetitivas viram category (dictionary encoding no Parquet)
+COLUNAS_CATEGORIA = [
+    'usuario', 'funcionario', 'departamento', 'cnpj_cpf', 'cliente',
+    'grupo_empresa', 'cod_grupo_tarefa', 'grupo_tarefa', 'tarefa'
+]
+
+QUERY_MES = """
+    SELECT
+        a.id,
+        (a.data_inicio AT TIME ZONE 'America/Sao_Paulo') AS data_inicio,
+        (a.data_fim AT TIME ZONE 'America/Sao_Paulo') AS data_fim,
+        EXTRACT(EPOCH FROM a.horas_trabalhadas) / 3600 AS horas_trabalhadas,
+        f.usuario,
+        f.nome_completo,
+        f.departamento,
+        c.num_cnpj_cpf,
+        c.nom_cliente,
+        c.cod_grupo_cliente,
+        c.des_grupo,
+        t.cod_grupo_tarefa,
+        gt.nome_grupo_tarefa,
+        t.nome_tarefa,
+        a.observacao
+    FROM apontamentos_horas a
+    INNER JOIN funcionarios f ON a.funcionario_id = f.id
+    INNER JOIN clientes c ON a.cliente_id = c.id
+    INNER JOIN tarefas_colaborador t ON a.tarefa_id = t.id
+    INNER JOIN grupo_tarefas gt ON t.cod_grupo_tarefa = gt.cod_grupo_tarefa
+    WHERE a.status = 'finalizado'
+      AND a.data_inicio >= (%(inicio)s::timestamp AT TIME ZONE 'America/Sao_Paulo')
+      AND a.data_inicio < (%(fim)s::timestamp AT TIME ZONE 'America/Sao_Paulo')
+      AND (%(departamento)s::text IS NULL OR f.departamento = %(departamento)s)
+    ORDER BY a.data_inicio, a.id
+"""
+
+# =====================================================
+# EXPORTAÇÃO DE UM MÊS
+# =====================================================
+def exportar_mes(conn, ano, mes, destino, departamento=None):
+    """
+    Grava o Parquet de um mês; retorna a quantidade de linhas exportadas
+    """
+    inicio = datetime(ano, mes, 1)
+    fim = datetime(ano + (mes == 12), mes % 12 + 1, 1)
+
+    # Intervalo no índice de data_inicio (sem EXTRACT na coluna)
+    cursor = conn.cursor(name=f'exportar_parquet_{ano}_{mes:02d}')
+    cursor.itersize = ITERSIZE
+    cursor.execute(QUERY_MES, {'inicio': inicio, 'fim': fim, 'departamento': departamento})
+
+    blocos = []
+    while True:
+        linhas = cursor.fetchmany(ITERSIZE)
+        if not linhas:
+            break
+        blocos.append(pd.DataFrame(linhas, columns=COLUNAS))
+    cursor.close()
+
+    if not blocos:
+        return 0
+
+    df = pd.concat(blocos, ignore_index=True)
+    df['horas_trabalhadas'] = df['horas_trabalhadas'].astype('float64')
+    df['data_inicio'] = pd.to_datetime(df['data_inicio'])
+    df['data_fim'] = pd.to_datetime(df['data_fim'])
+    for coluna in COLUNAS_CATEGORIA:
+        df[coluna] = df[coluna].astype('category')
+
+    pasta = os.path.join(destino, f"ano={ano}", f"mes={mes:02d}")
+    os.makedirs(pasta, exist_ok=True)
+
+    # Grava em arquivo temporário e substitui: leitores nunca veem um mês pela metade.
+    # O "_" no início faz a descoberta de datasets do pyarrow ignorar o temporário
+    arquivo = os.path.join(pasta, 'apontamentos.parquet')
+    temporario = os.path.join(pasta, '_apontamentos.parquet.tmp')
+    df.to_parquet(temporario, engine='pyarrow', compression='zstd', index=False)
+    os.replace(temporario, arquivo)
+
+    return len(df)
+
+# =====================================================
+# FUNÇÃO PRINCIPAL DE EXPORTAÇÃO
+# =====================================================
+def exportar_parquet(ano, mes=None, destino=DESTINO_PADRAO, departamento=None):
+    """
+    Exporta os apontamentos finalizados do ano (ou de um mês) em Parquet
+    """
+    print("=" * 60)
+    print("EXPORTAÇÃO DE APONTAMENTOS - PARQUET")
+    print("=" * 60)
+
+    meses = [mes] if mes else range(1, 13)
+    conn = None
+
+    try:
+        print(f"\n🔌 Conectando ao banco de dados...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        print(f"✅ Conectado com sucesso!")
+
+        total = 0
+        for m in meses:
+            linhas = exportar_mes(conn, ano, m, destino, departamento)
+            total += linhas
+            print(f"📦 {ano}-{m:02d}: {linhas} apontamento(s)")
+
+        print(f"\n✅ Exportação concluída: {total} apontamento(s) em {destino}")
+
+    except Exception as e:
+        print(f"\n❌ ERRO: {str(e)}")
+        raise
+
+    finally:
+        if conn:
+            conn.close()
+            print(f"🔌 Conexão fechada")
+
+# =====================================================
+# EXECUÇÃO DO SCRIPT
+# =====================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Exporta apontamentos em Parquet particionado por mês')
+    parser.add_argument('--ano', type=int, default=datetime.now().year)
+    parser.add_argument('--mes', type=int, choices=range(1, 13))
+    parser.add_argument('--departamento')
+    parser.add_argument('--destino', default=DESTINO_PADRAO)
+    args = parser.parse_args()
+
+    exportar_parquet(args.ano, args.mes, args.destino, args.departamento)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Script de pré-geração dos relatórios mensais (mês fechado)
+Executa toda noite via cron: gera o mês que acabou de fechar e regenera
+os meses invalidados por lançamentos atrasados
+
+Escopos gerados (os mesmos que get_usuarios_permitidos aplica na tela):
+- firma: sócios e admins, sem filtro de departamento
+- departamento: sócios e admins filtrando um departamento
+- gestor: coordenadores e supervisores (ele + subordinados)
+
+Uso:
+    python gerar_relatorios_mensais.py                 # mês anterior + meses invalidados
+    python gerar_relatorios_mensais.py --ano 2025 --mes 3
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+from psycopg2.extras import RealDictCursor
+
+from app import get_db_connection, montar_filtros_relatorio, consultar_relatorio_tempo, gravar_excel_relatorio
+from relatorios_mensais import (
+    FUSO_RELATORIOS, NIVEIS_GESTOR, escopo_firma, escopo_departamento, escopo_gestor,
+    versao_mes, relatorio_mensal_atualizado, caminhos_relatorio_mensal, gravar_relatorio_mensal
+)
+from versoes_cache import obter_versao
+
+# Quantos meses para trás são verificados em busca de invalidações
+MESES_VERIFICADOS = 12
+
+GERADO_POR = 'Fechamento mensal (pré-gerado)'
+
+def listar_escopos(cursor):
+    """Retorna [(escopo, usuarios_permitidos, departamento)] de todos os escopos pré-gerados"""
+    cursor.execute("SELECT usuario FROM funcionarios WHERE ativo = TRUE")
+    todos = [r['usuario'] for r in cursor.fetchall()]
+
+    escopos = [(escopo_firma(), todos, None)]
+
+    cursor.execute("""
+        SELECT DISTINCT departamento
+        FROM funcionarios
+        WHERE ativo = TRUE AND departamento IS NOT NULL
+        ORDER BY departamento
+    """)
+    for r in cursor.fetchall():
+        escopos.append((escopo_departamento(r['departamento']), todos, r['departamento']))
+
+    cursor.execute("""
+        SELECT g.usuario, ARRAY_AGG(DISTINCT s.usuario) AS equipe
+        FROM funcionarios g
+        INNER JOIN funcionarios s
+            ON s.ativo = TRUE AND (s.usuario = g.usuario OR s.nome_gestor = g.usuario)
+        WHERE g.ativo = TRUE AND g.nivel = ANY(%s)
+        GROUP BY g.usuario
+        ORDER BY g.usuario
+    """, (list(NIVEIS_GESTOR),))
+    for r in cursor.fetchall():
+        escopos.append((escopo_gestor(r['usuario']), r['equipe'], None))
+
+    return escopos
+
+def gerar_mes(conn, ano, mes, escopos, forcar=False):
+    """Gera os relatórios de um mês; retorna quantos escopos foram (re)gerados"""
+    gerados = 0
+
+    for escopo, usuarios_permitidos, departamento in escopos:
+        if not forcar and relatorio_mensal_atualizado(ano, mes, escopo, usuarios_permitidos):
+            continue
+
+        # Versão lida antes da consulta: lançamento atrasado durante a geração
+        # deixa o arquivo já invalidado
+        versao = obter_versao(versao_mes(ano, mes))
+
+        filtros = {'ano': ano, 'mes': mes, 'departamento': departamento}
+        where_sql, params = montar_filtros_relatorio(filtros, usuarios_permitidos)
+
+        caminho_json, caminho_xlsx = caminhos_relatorio_mensal(ano, mes, escopo)
+
+        dados, _ = consultar_relatorio_tempo(conn, where_sql, params)
+        with open(caminho_xlsx, 'wb') as arquivo:
+            total_registros = gravar_excel_relatorio(conn, where_sql, params, filtros, GERADO_POR, arquivo)
+        conn.rollback()  # Encerra a transação do cursor no servidor
+
+        if total_registros == 0:
+            os.remove(caminho_xlsx)  # Mês sem apontamentos: não há planilha
+
+        gravar_relatorio_mensal(caminho_json, ano, mes, escopo, versao, usuarios_permitidos, dados)
+        gerados += 1
+
+    return gerados
+
+def meses_anteriores(quantidade):
+    """Últimos meses fechados, do mais recente para o mais antigo"""
+    hoje = datetime.now(FUSO_RELATORIOS)
+    ano, mes = hoje.year, hoje.month
+    meses = []
+    for _ in range(quantidade):
+        ano, mes = (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+        meses.append((ano, mes))
+    return meses
+
+def main(ano=None, mes=None):
+    print(f"📅 Pré-gerando relatórios mensais - {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+
+    conn = get_db_connection()
+    if not conn:
+        print("❌ Não foi possível conectar ao banco de dados")
+        return
+
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        escopos = listar_escopos(cursor)
+        print(f"👥 {len(escopos)} escopo(s) de acesso")
+
+        meses = [(ano, mes)] if ano and mes else meses_anteriores(MESES_VERIFICADOS)
+
+        for a, m in meses:
+            gerados = gerar_mes(conn, a, m, escopos, forcar=bool(ano and mes))
+            if gerados:
+                print(f"✅ {m:02d}/{a}: {gerados} relatório(s) gerado(s)")
+
+        print("✅ Pré-geração concluída")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pré-gera os relatórios mensais por escopo de acesso')
+    parser.add_argument('--ano', type=int)
+    parser.add_argument('--mes', type=int, choices=range(1, 13))
+    args = parser.parse_args()
+
+    main(args.ano, args.mes)
@@ -0,0 +1,23 @@
+"""
+Configuração do Gunicorn para o app principal (porta 5000)
+
+Uso:
+    gunicorn -c gunicorn.conf.py app:app
+
+Workers com threads (gthread): uma chamada lenta ao n8n ocupa apenas uma
+thread, e as demais continuam atendendo timers, buscas e pausar/finalizar.
+O app limita quantas threads podem estar no chat ao mesmo tempo
+(CHAT_MAX_CONCORRENTES), então o chat nunca ocupa todas.
+"""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# Acima do timeout do n8n (30s) para o worker não ser reiniciado no meio de uma resposta
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
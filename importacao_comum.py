@@ -0,0 +1,153 @@
+"""
+Funções compartilhadas pelos scripts de importação (importar_*.py)
+- Trava por tabela (advisory lock do PostgreSQL): uma importação por tabela
+  de cada vez, venha do admin ou da linha de comando
+- Resultado no mesmo formato em todos os importadores: contadores de
+  progresso (lidas, válidas, inseridas...) e amostra do diff para a prévia
+- Linha de comando sem caminho fixo e sem input(): arquivo por argumento,
+  --simular mostra o diff sem gravar
+- Leitura da planilha em streaming (openpyxl read-only), em lotes de
+  IMPORTACOES_TAMANHO_LOTE linhas: a memória depende do lote, não do arquivo
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# Quantos registros de cada tipo (novos, alterados, ignorados) entram na amostra do diff
+AMOSTRA_DIFF = 20
+
+# Planilhas padrão da linha de comando: pasta files/ do projeto
+DIRETORIO_PLANILHAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+
+# Etapas informadas ao callback de progresso
+ETAPA_LENDO = 'lendo'
+ETAPA_VALIDANDO = 'validando'
+ETAPA_GRAVANDO = 'gravando'
+ETAPA_CONCLUIDA = 'concluida'
+
+# Linhas por lote na leitura da planilha (via .env, lido na chamada)
+TAMANHO_LOTE_PADRAO = 5000
+
+class ImportacaoEmAndamento(Exception):
+    """Já existe outra importação da mesma tabela rodando"""
+
+def ler_planilha_em_lotes(arquivo_excel, tamanho_lote=None):
+    """
+    Lê a primeira aba em streaming e gera DataFrames de até tamanho_lote linhas
+
+    A primeira linha é o cabeçalho (como no pd.read_excel). Linhas totalmente
+    vazias são puladas. As colunas ficam com dtype object: cada célula mantém
+    o próprio tipo (int, float, str...), então o resultado da normalização não
+    depende de onde o lote começa.
+    """
+    tamanho_lote = tamanho_lote or int(os.getenv('IMPORTACOES_TAMANHO_LOTE', TAMANHO_LOTE_PADRAO))
+
+    planilha = load_workbook(arquivo_excel, read_only=True, data_only=True)
+    try:
+        linhas = planilha.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+
+        colunas = [str(nome) if nome is not None else f'Unnamed: {i}' for i, nome in enumerate(cabecalho)]
+        total_colunas = len(colunas)
+
+        lote = []
+        for linha in linhas:
+            if all(valor is None for valor in linha):
+                continue
+            # Abas sem dimensão gravada podem vir com linhas de tamanhos diferentes
+            if len(linha) != total_colunas:
+                linha = (tuple(linha) + (None,) * total_colunas)[:total_colunas]
+            lote.append(linha)
+
+            if len(lote) >= tamanho_lote:
+                yield pd.DataFrame(lote, columns=colunas, dtype=object)
+                lote = []
+
+        if lote:
+            yield pd.DataFrame(lote, columns=colunas, dtype=object)
+    finally:
+        planilha.close()
+
+def travar_tabela(cursor, tabela):
+    """
+    Pega a trava de importação da tabela (advisory lock de sessão)
+
+    Não espera: levanta ImportacaoEmAndamento se outra sessão já tem a trava.
+    A trava é liberada no conn.close(), inclusive se o processo morrer.
+    """
+    cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f'importacao:{tabela}',))
+    if not cursor.fetchone()[0]:
+        raise ImportacaoEmAndamento(f"Já existe uma importação de {tabela} em andamento")
+
+def novo_resultado(tabela, simular):
+    """Resultado vazio de uma importação (contadores + amostra do diff)"""
+    return {
+        'tabela': tabela,
+        'simulacao': simular,
+        'etapa': ETAPA_LENDO,
+        'lidas': 0,
+        'validas': 0,
+        'inseridas': 0,
+        'atualizadas': 0,
+        'inalteradas': 0,
+        'ignoradas': 0,
+        'erros': [],
+        'diff': {'novos': [], 'alterados': [], 'ignorados': []}
+    }
+
+def registrar_diff(resultado, tipo, item):
+    """Guarda o item na amostra do diff (limitada a AMOSTRA_DIFF por tipo)"""
+    if len(resultado['diff'][tipo]) < AMOSTRA_DIFF:
+        resultado['diff'][tipo].append(item)
+
+def comparar_campos(atual, novo, campos):
+    """Campos que mudam: {campo: [valor no banco, valor da planilha]}"""
+    return {
+        campo: [atual[campo], novo[campo]]
+        for campo in campos
+        if atual[campo] != novo[campo]
+    }
+
+def informar_progresso(progresso, resultado, etapa):
+    """Atualiza a etapa e repassa o resultado parcial ao callback (se houver)"""
+    resultado['etapa'] = etapa
+    if progresso:
+        progresso(resultado)
+
+def argumentos_linha_comando(descricao, planilha_padrao):
+    """Argumentos comuns dos importadores: arquivo (opcional) e --simular"""
+    parser = argparse.ArgumentParser(description=descricao)
+    parser.add_argument('arquivo', nargs='?', default=os.path.join(DIRETORIO_PLANILHAS, planilha_padrao),
+                        help=f'Planilha .xlsx (padrão: files/{planilha_padrao})')
+    parser.add_argument('--simular', action='store_true',
+                        help='Só mostra o que mudaria (diff), sem gravar no banco')
+    return parser.parse_args()
+
+def imprimir_resultado(resultado):
+    """Resumo do resultado no terminal (linha de comando)"""
+    print(f"\n{'='*60}")
+    if resultado['simulacao']:
+        print(f"SIMULAÇÃO ({resultado['tabela']}): nada foi gravado")
+    else:
+        print(f"RESULTADO ({resultado['tabela']})")
+    print("="*60)
+    print(f"  Linhas lidas:     {resultado['lidas']}")
+    print(f"  Linhas válidas:   {resultado['validas']}")
+    print(f"  Novos:            {resultado['inseridas']}")
+    print(f"  Alterados:        {resultado['atualizadas']}")
+    print(f"  Sem alteração:    {resultado['inalteradas']}")
+    print(f"  Ignorados:        {resultado['ignoradas']}")
+
+    for erro in resultado['erros']:
+        print(f"  ❌ {erro}")
+
+    for item in resultado['diff']['alterados'][:5]:
+        mudancas = ', '.join(f"{campo}: {antes!r} → {depois!r}" for campo, (antes, depois) in item['campos'].items())
+        print(f"  ✏️ {item['chave']}: {mudancas}")
+    print(f"[{datetime.now()}] Fim")
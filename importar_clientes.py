@@ -2,12 +2,17 @@
 Script para importar dados de clientes do Excel para PostgreSQL
 """
 
-import pandas as pd
 import psycopg2
 import os
 from dotenv import load_dotenv
 from psycopg2.extras import execute_values
 from datetime import datetime
+from versoes_cache import incrementar_versao, VERSAO_CLIENTES
+import normalizacao_planilhas as normalizacao
+from importacao_comum import (
+    ler_planilha_em_lotes, travar_tabela, novo_resultado, registrar_diff, comparar_campos, informar_progresso,
+    argumentos_linha_comando, imprimir_resultado, ETAPA_VALIDANDO, ETAPA_GRAVANDO, ETAPA_CONCLUIDA
+)
 
 # =====================================================
 # CONFIGURAÇÕES DE CONEXÃO
@@ -26,80 +31,36 @@ DB_CONFIG = {
 }
 
 # =====================================================
-# FUNÇÃO PARA LIMPAR CNPJ/CPF
+# PREPARAÇÃO DE UM LOTE
 # =====================================================
-def limpar_cnpj_cpf(valor):
-    """
-    Converte o número científico para string de 11 dígitos (CPF) ou 14 dígitos (CNPJ)
-    """
-    if pd.isna(valor):
-        return None
-    try:
-        # Converter para inteiro primeiro, depois para string
-        numero = str(int(valor))
-        
-        # Determinar se é CPF ou CNPJ pelo tamanho
-        tamanho = len(numero)
-        
-        if tamanho <= 11:
-            # É CPF - preencher com zeros até 11 dígitos
-            return numero.zfill(11)
-        else:
-            # É CNPJ - preencher com zeros até 14 dígitos
-            return numero.zfill(14)
-    except:
-        return None
+CAMPOS_CLIENTE = ('nom_cliente', 'cod_grupo_cliente', 'des_grupo')
 
-# =====================================================
-# FUNÇÃO PRINCIPAL DE IMPORTAÇÃO
-# =====================================================
-def importar_clientes(arquivo_excel):
-    """
-    Importa clientes da planilha Excel para o PostgreSQL
+INSERT_CLIENTES = """
+    INSERT INTO clientes (num_cnpj_cpf, nom_cliente, cod_grupo_cliente, des_grupo)
+    VALUES %s
+    ON CONFLICT (num_cnpj_cpf) 
+    DO UPDATE SET
+        nom_cliente = EXCLUDED.nom_cliente,
+        cod_grupo_cliente = EXCLUDED.cod_grupo_cliente,
+        des_grupo = EXCLUDED.des_grupo
+"""
+
+def preparar_lote(df, vistos):
     """
+    Normaliza um lote e remove duplicatas de CNPJ, mantendo o registro com o
+    maior cod_grupo_cliente (com grupo > sem grupo), inclusive contra lotes anteriores
     
-    print(f"[{datetime.now()}] Iniciando importação...")
-    
-    # 1. Ler a planilha
-    print(f"[{datetime.now()}] Lendo planilha...")
-    df = pd.read_excel(arquivo_excel)
-    print(f"Total de registros na planilha: {len(df)}")
-    
-    # 2. Limpar e preparar os dados
-    print(f"[{datetime.now()}] Preparando dados...")
-    
-    # Limpar CNPJ/CPF
-    df['num_cnpj_cpf'] = df['num_cnpj_cpf'].apply(limpar_cnpj_cpf)
-    
-    # Converter cod_grupo_cliente para inteiro ou None
-    def converter_grupo(valor):
-        # Primeiro verifica se é NaN/None
-        if valor is None or pd.isna(valor) or valor != valor:  # valor != valor é True para NaN
-            return None
-        try:
-            num = float(valor)
-            # Verifica novamente se não é NaN após conversão
-            if pd.isna(num) or num != num:
-                return None
-            return int(num)
-        except (ValueError, TypeError, OverflowError):
-            return None
-    
-    df['cod_grupo_cliente'] = df['cod_grupo_cliente'].apply(converter_grupo)
-    
-    # Substituir NaN por None nas colunas de texto
-    df['nom_cliente'] = df['nom_cliente'].apply(lambda x: x if pd.notna(x) else None)
-    df['des_grupo'] = df['des_grupo'].apply(lambda x: x if pd.notna(x) else None)
+    vistos: {cnpj: cod_grupo_cliente vencedor (ou None)} dos lotes anteriores (atualizado aqui).
+    Retorna (registros a gravar, CNPJs que já tinham sido contados antes).
+    """
+    # Normalizar colunas (vetorizado: uma operação por coluna, não por linha)
+    df['num_cnpj_cpf'] = normalizacao.cnpj_cpf(df['num_cnpj_cpf'])
+    df['cod_grupo_cliente'] = normalizacao.inteiro(df['cod_grupo_cliente'])
+    df['nom_cliente'] = normalizacao.texto(df['nom_cliente'])
+    df['des_grupo'] = normalizacao.texto(df['des_grupo'])
     
     # Remover linhas onde tanto CNPJ quanto nome são nulos
     df_limpo = df.dropna(subset=['num_cnpj_cpf', 'nom_cliente'], how='all')
-    print(f"Registros após limpeza: {len(df_limpo)}")
-    
-    # Remover duplicatas de CNPJ, mantendo o registro mais completo
-    # Prioridade: registros COM grupo > registros SEM grupo
-    print(f"\n=== TRATAMENTO DE DUPLICATAS ===")
-    print(f"Registros antes de remover duplicatas: {len(df_limpo)}")
-    print(f"CNPJs únicos: {df_limpo['num_cnpj_cpf'].nunique()}")
     
     # Ordenar para manter o registro mais completo primeiro
     # Registros com grupo (não None) vêm primeiro
@@ -111,67 +72,117 @@ def importar_clientes(arquivo_excel):
     
     # Remover duplicatas mantendo o primeiro (mais completo)
     df_limpo = df_limpo.drop_duplicates(subset=['num_cnpj_cpf'], keep='first')
-    print(f"Registros após remover duplicatas: {len(df_limpo)}")
-    print(f"CNPJs únicos após limpeza: {df_limpo['num_cnpj_cpf'].nunique()}")
     
-    # Debug: mostrar alguns registros
-    print("\nPrimeiros registros preparados:")
-    for idx, row in df_limpo.head(5).iterrows():
-        print(f"  CNPJ: {row['num_cnpj_cpf']}, "
-              f"Nome: {row['nom_cliente'][:30] if row['nom_cliente'] else 'NULL'}..., "
-              f"Grupo: {row['cod_grupo_cliente']} (tipo: {type(row['cod_grupo_cliente']).__name__}), "
-              f"Desc: {row['des_grupo']}")
+    dados = []
+    substituidos = set()
+    for registro in normalizacao.registros(df_limpo, ('num_cnpj_cpf', 'nom_cliente', 'cod_grupo_cliente', 'des_grupo')):
+        cnpj, grupo = registro[0], registro[2]
+        if cnpj in vistos:
+            # Já veio em lote anterior: só substitui se agora o grupo é maior (ou antes não tinha)
+            grupo_anterior = vistos[cnpj]
+            if grupo is None or (grupo_anterior is not None and grupo <= grupo_anterior):
+                continue
+            substituidos.add(cnpj)
+        vistos[cnpj] = grupo
+        dados.append(registro)
     
-    # 3. Conectar ao banco de dados
+    return dados, substituidos
+
+# =====================================================
+# FUNÇÃO PRINCIPAL DE IMPORTAÇÃO
+# =====================================================
+def importar_clientes(arquivo_excel, simular=False, progresso=None):
+    """
+    Importa clientes da planilha Excel para o PostgreSQL
+    
+    A planilha é lida e gravada em lotes (memória limitada pelo tamanho do
+    lote), tudo em uma transação: um erro no meio não deixa importação parcial.
+    Com simular=True só calcula o diff (novos/alterados) sem gravar.
+    progresso(resultado) é chamado a cada lote. Retorna o resultado.
+    """
+    
+    print(f"[{datetime.now()}] Iniciando importação...")
+    resultado = novo_resultado('clientes', simular)
+    informar_progresso(progresso, resultado, resultado['etapa'])
+    
+    # 1. Conectar ao banco de dados
     print(f"[{datetime.now()}] Conectando ao banco de dados...")
+    conn = None
     try:
         conn = psycopg2.connect(**DB_CONFIG)
         cursor = conn.cursor()
+        travar_tabela(cursor, 'clientes')
         print("Conexão estabelecida com sucesso!")
         
-        # 4. Inserir dados
-        print(f"[{datetime.now()}] Inserindo dados...")
+        etapa = ETAPA_VALIDANDO if simular else ETAPA_GRAVANDO
+        vistos = {}
         
-        # Preparar dados para inserção
-        dados = [
-            (
-                row['num_cnpj_cpf'],
-                row['nom_cliente'],
-                row['cod_grupo_cliente'],
-                row['des_grupo']
-            )
-            for _, row in df_limpo.iterrows()
-        ]
+        # 2. Ler, preparar, comparar e gravar lote a lote
+        print(f"[{datetime.now()}] Lendo planilha em lotes...")
+        for numero_lote, df in enumerate(ler_planilha_em_lotes(arquivo_excel), start=1):
+            resultado['lidas'] += len(df)
+            dados, substituidos = preparar_lote(df, vistos)
+            resultado['validas'] += len(dados) - len(substituidos)
+            
+            # Comparar com o banco (diff)
+            cursor.execute("""
+                SELECT num_cnpj_cpf, nom_cliente, cod_grupo_cliente, des_grupo
+                FROM clientes
+                WHERE num_cnpj_cpf = ANY(%s)
+            """, ([registro[0] for registro in dados],))
+            existentes = {linha[0]: dict(zip(CAMPOS_CLIENTE, linha[1:])) for linha in cursor.fetchall()}
+            
+            for registro in dados:
+                if registro[0] in substituidos:
+                    continue
+                
+                novo = dict(zip(CAMPOS_CLIENTE, registro[1:]))
+                atual = existentes.get(registro[0])
+                if atual is None:
+                    resultado['inseridas'] += 1
+                    registrar_diff(resultado, 'novos', {'chave': registro[0], **novo})
+                    continue
+                
+                mudancas = comparar_campos(atual, novo, CAMPOS_CLIENTE)
+                if mudancas:
+                    resultado['atualizadas'] += 1
+                    registrar_diff(resultado, 'alterados', {'chave': registro[0], 'campos': mudancas})
+                else:
+                    resultado['inalteradas'] += 1
+            
+            # Executar inserção em lote (ON CONFLICT atualiza os existentes)
+            if not simular and dados:
+                execute_values(cursor, INSERT_CLIENTES, dados)
+            
+            resultado['ignoradas'] = resultado['lidas'] - resultado['validas']
+            print(f"  Lote {numero_lote}: {resultado['lidas']} linhas lidas, {resultado['validas']} válidas")
+            informar_progresso(progresso, resultado, etapa)
         
-        # Query de inserção (com ON CONFLICT para evitar duplicatas)
-        insert_query = """
-            INSERT INTO clientes (num_cnpj_cpf, nom_cliente, cod_grupo_cliente, des_grupo)
-            VALUES %s
-            ON CONFLICT (num_cnpj_cpf) 
-            DO UPDATE SET
-                nom_cliente = EXCLUDED.nom_cliente,
-                cod_grupo_cliente = EXCLUDED.cod_grupo_cliente,
-                des_grupo = EXCLUDED.des_grupo
-        """
+        print(f"Novos: {resultado['inseridas']}, alterados: {resultado['atualizadas']}, "
+              f"sem alteração: {resultado['inalteradas']}, ignorados: {resultado['ignoradas']}")
         
-        # Executar inserção em lote
-        execute_values(cursor, insert_query, dados)
+        if simular:
+            informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+            return resultado
         
-        # Commit
+        # 3. Commit
         conn.commit()
         
-        print(f"[{datetime.now()}] ✓ {len(dados)} registros inseridos/atualizados com sucesso!")
+        # Invalidar cache de clientes do app principal
+        incrementar_versao(VERSAO_CLIENTES)
         
-        # 5. Verificar resultado
+        print(f"[{datetime.now()}] ✓ {resultado['validas']} registros inseridos/atualizados com sucesso!")
+        
+        # 4. Verificar resultado
         cursor.execute("SELECT COUNT(*) FROM clientes")
         total = cursor.fetchone()[0]
         print(f"Total de registros na tabela: {total}")
         
-        # Fechar conexão
         cursor.close()
-        conn.close()
         
         print(f"[{datetime.now()}] Importação concluída!")
+        informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+        return resultado
         
     except psycopg2.Error as e:
         print(f"Erro no PostgreSQL: {e}")
@@ -181,13 +192,16 @@ def importar_clientes(arquivo_excel):
     except Exception as e:
         print(f"Erro: {e}")
         raise
+    finally:
+        # Fechar a conexão também libera a trava da tabela
+        if conn:
+            conn.close()
     
 # =====================================================
 # EXECUÇÃO
 # =====================================================
 if __name__ == "__main__":
-    # Caminho do arquivo
-    arquivo = "/home/jvfalves/documentos/projetos/chatbot_apontamento_horas/files/clientes.xlsx"
+    args = argumentos_linha_comando('Importa clientes da planilha Excel', 'clientes.xlsx')
     
     # Executar importação
-    importar_clientes(arquivo)
\ No newline at end of file
+    imprimir_resultado(importar_clientes(args.arquivo, simular=args.simular))
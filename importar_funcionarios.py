@@ -10,6 +10,11 @@ from dotenv import load_dotenv
 from psycopg2.extras import execute_values
 from datetime import datetime
 import hashlib
+import normalizacao_planilhas as normalizacao
+from importacao_comum import (
+    ler_planilha_em_lotes, travar_tabela, novo_resultado, registrar_diff, comparar_campos, informar_progresso,
+    argumentos_linha_comando, imprimir_resultado, ETAPA_VALIDANDO, ETAPA_GRAVANDO, ETAPA_CONCLUIDA
+)
 
 # =====================================================
 # CONFIGURAÇÕES DE CONEXÃO
@@ -27,6 +32,9 @@ DB_CONFIG = {
 }
 
 
+# Senha de quem não tem senha na planilha
+SENHA_PADRAO = "Booker@1010"
+
 # =====================================================
 # FUNÇÃO PARA GERAR HASH DE SENHA
 # =====================================================
@@ -36,174 +44,166 @@ def gerar_hash_senha(senha):
     """
     if pd.isna(senha) or senha is None:
         # Se não tem senha, usar uma senha padrão
-        senha = "Booker@1010"
+        senha = SENHA_PADRAO
     
     # Converter para string e gerar hash
     senha_str = str(senha).strip()
     hash_senha = hashlib.sha256(senha_str.encode('utf-8')).hexdigest()
     return hash_senha
 
+def gerar_hashes_senha(serie):
+    """Hash de uma coluna inteira de senhas (vazia → SENHA_PADRAO)"""
+    senhas = normalizacao.texto(serie).fillna(SENHA_PADRAO)
+    return [hashlib.sha256(senha.encode('utf-8')).hexdigest() for senha in senhas]
+
 # =====================================================
-# FUNÇÃO PARA NORMALIZAR VALORES
+# PREPARAÇÃO DE UM LOTE
 # =====================================================
-def normalizar_nivel(nivel):
-    """Normaliza o valor do nível"""
-    if pd.isna(nivel):
-        return 'funcionario'
+# Campos comparados no diff (senha_hash entra mascarada)
+CAMPOS_FUNCIONARIO = ('email', 'nome_completo', 'departamento', 'nivel', 'nome_gestor', 'ativo')
+
+COLUNAS_INSERCAO = ('usuario', 'senha_hash', 'email', 'nome_completo', 'departamento', 'nivel', 'nome_gestor', 'ativo')
+
+INSERT_FUNCIONARIOS = """
+    INSERT INTO apontador_horas.funcionarios 
+    (usuario, senha_hash, email, nome_completo, departamento, nivel, nome_gestor, ativo)
+    VALUES %s
+    ON CONFLICT (usuario) 
+    DO UPDATE SET
+        senha_hash = EXCLUDED.senha_hash,
+        email = EXCLUDED.email,
+        nome_completo = EXCLUDED.nome_completo,
+        departamento = EXCLUDED.departamento,
+        nivel = EXCLUDED.nivel,
+        nome_gestor = EXCLUDED.nome_gestor,
+        ativo = EXCLUDED.ativo
+"""
+
+def preparar_lote(df, usuarios_vistos, emails_vistos):
+    """
+    Normaliza um lote e remove duplicatas de usuário e de e-mail (fica o
+    primeiro da planilha, inclusive contra lotes anteriores)
     
-    nivel_lower = str(nivel).lower().strip()
+    usuarios_vistos / emails_vistos: sets dos lotes anteriores (atualizados aqui).
+    Retorna os registros a gravar, na ordem de COLUNAS_INSERCAO.
+    """
+    # Normalizar campos (vetorizado: uma operação por coluna, não por linha)
+    for coluna in ('usuario', 'email', 'nome_completo', 'departamento', 'nome_gestor'):
+        df[coluna] = normalizacao.texto(df[coluna])
     
-    # Mapeamento de valores aceitos
-    niveis_validos = [
-        'funcionario', 'coordenador', 'supervisor', 
-        'socio', 'prestador de servico', 'admin'
-    ]
+    df['nivel'] = normalizacao.nivel(df['nivel'])
+    df['ativo'] = normalizacao.ativo(df['ativo'])
     
-    if nivel_lower in niveis_validos:
-        return nivel_lower
+    # Gerar hash das senhas (a senha em texto plano não é mais usada)
+    df['senha_hash'] = gerar_hashes_senha(df['senha'])
     
-    return 'funcionario'
-
-def normalizar_ativo(ativo):
-    """Converte valores de ativo para boolean"""
-    if pd.isna(ativo):
-        return True
+    # Remover linhas sem usuário ou email
+    df_limpo = df.dropna(subset=['usuario', 'email'], how='any')
     
-    ativo_str = str(ativo).lower().strip()
+    dados = []
+    duplicados = []
+    for registro in normalizacao.registros(df_limpo, COLUNAS_INSERCAO):
+        usuario, email = registro[0], registro[2]
+        if usuario in usuarios_vistos:
+            duplicados.append(f"usuário {usuario}")
+            continue
+        # O usuário fica reservado mesmo se o e-mail for repetido (como antes: primeiro usuário, depois e-mail)
+        usuarios_vistos.add(usuario)
+        if email in emails_vistos:
+            duplicados.append(f"e-mail {email} ({usuario})")
+            continue
+        emails_vistos.add(email)
+        dados.append(registro)
     
-    # Valores considerados como True
-    valores_true = ['sim', 'yes', 's', 'y', 'true', '1', 'ativo']
+    if duplicados:
+        print(f"\nAVISO: {len(duplicados)} duplicado(s) ignorado(s), mantido o primeiro: {', '.join(duplicados[:10])}")
     
-    return ativo_str in valores_true
-
-def normalizar_texto(texto):
-    """Normaliza texto removendo espaços extras"""
-    if pd.isna(texto) or texto is None:
-        return None
-    return str(texto).strip()
+    return dados
 
 # =====================================================
 # FUNÇÃO PRINCIPAL DE IMPORTAÇÃO
 # =====================================================
-def importar_funcionarios(arquivo_excel):
+def importar_funcionarios(arquivo_excel, simular=False, progresso=None):
     """
     Importa funcionários da planilha Excel para o PostgreSQL
+    
+    A planilha é lida e gravada em lotes (memória limitada pelo tamanho do
+    lote), tudo em uma transação: um erro no meio não deixa importação parcial.
+    Com simular=True só calcula o diff (novos/alterados) sem gravar.
+    progresso(resultado) é chamado a cada lote. Retorna o resultado.
     """
     
     print(f"[{datetime.now()}] Iniciando importação de funcionários...")
+    resultado = novo_resultado('funcionarios', simular)
+    informar_progresso(progresso, resultado, resultado['etapa'])
     
-    # 1. Ler a planilha
-    print(f"[{datetime.now()}] Lendo planilha...")
-    df = pd.read_excel(arquivo_excel)
-    print(f"Total de registros na planilha: {len(df)}")
-    
-    # 2. Preparar os dados
-    print(f"[{datetime.now()}] Preparando dados...")
-    
-    # Normalizar campos de texto
-    df['usuario'] = df['usuario'].apply(normalizar_texto)
-    df['email'] = df['email'].apply(normalizar_texto)
-    df['nome_completo'] = df['nome_completo'].apply(normalizar_texto)
-    df['departamento'] = df['departamento'].apply(normalizar_texto)
-    df['nome_gestor'] = df['nome_gestor'].apply(normalizar_texto)
-    
-    # Normalizar nível e ativo
-    df['nivel'] = df['nivel'].apply(normalizar_nivel)
-    df['ativo'] = df['ativo'].apply(normalizar_ativo)
-    
-    # Gerar hash das senhas
-    print(f"[{datetime.now()}] Gerando hash das senhas...")
-    df['senha_hash'] = df['senha'].apply(gerar_hash_senha)
-    
-    # Remover coluna de senha em texto plano (não será mais necessária)
-    df = df.drop(columns=['senha'])
-    
-    # Remover linhas sem usuário ou email
-    df_limpo = df.dropna(subset=['usuario', 'email'], how='any')
-    print(f"Registros após limpeza: {len(df_limpo)}")
-    
-    # Verificar duplicatas
-    print(f"\n=== VERIFICAÇÃO DE DUPLICATAS ===")
-    print(f"Usuários únicos: {df_limpo['usuario'].nunique()}")
-    print(f"E-mails únicos: {df_limpo['email'].nunique()}")
-    
-    # Remover duplicatas de usuário (manter primeiro)
-    duplicados_usuario = df_limpo[df_limpo.duplicated(subset=['usuario'], keep=False)]
-    if len(duplicados_usuario) > 0:
-        print(f"\nAVISO: {len(duplicados_usuario)} usuários duplicados encontrados!")
-        print(duplicados_usuario[['usuario', 'email', 'nome_completo']])
-        df_limpo = df_limpo.drop_duplicates(subset=['usuario'], keep='first')
-        print(f"Mantido apenas o primeiro registro de cada usuário duplicado")
-    
-    # Remover duplicatas de email (manter primeiro)
-    duplicados_email = df_limpo[df_limpo.duplicated(subset=['email'], keep=False)]
-    if len(duplicados_email) > 0:
-        print(f"\nAVISO: {len(duplicados_email)} e-mails duplicados encontrados!")
-        print(duplicados_email[['usuario', 'email', 'nome_completo']])
-        df_limpo = df_limpo.drop_duplicates(subset=['email'], keep='first')
-        print(f"Mantido apenas o primeiro registro de cada e-mail duplicado")
-    
-    print(f"\nRegistros finais para importação: {len(df_limpo)}")
-    
-    # Debug: mostrar alguns registros
-    print("\n=== PRIMEIROS REGISTROS PREPARADOS ===")
-    for idx, row in df_limpo.head(3).iterrows():
-        print(f"  Usuário: {row['usuario']}, "
-              f"Email: {row['email']}, "
-              f"Nome: {row['nome_completo'][:30]}..., "
-              f"Nível: {row['nivel']}, "
-              f"Ativo: {row['ativo']}")
-    
-    # 3. Conectar ao banco de dados
+    # 1. Conectar ao banco de dados
     print(f"\n[{datetime.now()}] Conectando ao banco de dados...")
+    conn = None
     try:
         conn = psycopg2.connect(**DB_CONFIG)
         cursor = conn.cursor()
+        travar_tabela(cursor, 'funcionarios')
         print("Conexão estabelecida com sucesso!")
         
-        # 4. Inserir dados
-        print(f"[{datetime.now()}] Inserindo dados...")
+        etapa = ETAPA_VALIDANDO if simular else ETAPA_GRAVANDO
+        usuarios_vistos = set()
+        emails_vistos = set()
         
-        # Preparar dados para inserção
-        dados = [
-            (
-                row['usuario'],
-                row['senha_hash'],
-                row['email'],
-                row['nome_completo'],
-                row['departamento'],
-                row['nivel'],
-                row['nome_gestor'],
-                row['ativo']
-            )
-            for _, row in df_limpo.iterrows()
-        ]
+        # 2. Ler, preparar, comparar e gravar lote a lote
+        print(f"[{datetime.now()}] Lendo planilha em lotes...")
+        for numero_lote, df in enumerate(ler_planilha_em_lotes(arquivo_excel), start=1):
+            resultado['lidas'] += len(df)
+            dados = preparar_lote(df, usuarios_vistos, emails_vistos)
+            resultado['validas'] += len(dados)
+            
+            # Comparar com o banco (diff)
+            cursor.execute("""
+                SELECT usuario, senha_hash, email, nome_completo, departamento, nivel, nome_gestor, ativo
+                FROM apontador_horas.funcionarios
+                WHERE usuario = ANY(%s)
+            """, ([registro[0] for registro in dados],))
+            existentes = {linha[0]: linha[1:] for linha in cursor.fetchall()}
+            
+            for registro in dados:
+                novo = dict(zip(CAMPOS_FUNCIONARIO, registro[2:]))
+                linha_atual = existentes.get(registro[0])
+                if linha_atual is None:
+                    resultado['inseridas'] += 1
+                    registrar_diff(resultado, 'novos', {'chave': registro[0], **novo})
+                    continue
+                
+                mudancas = comparar_campos(dict(zip(CAMPOS_FUNCIONARIO, linha_atual[1:])), novo, CAMPOS_FUNCIONARIO)
+                if linha_atual[0] != registro[1]:
+                    mudancas['senha'] = ['***', 'redefinida']
+                
+                if mudancas:
+                    resultado['atualizadas'] += 1
+                    registrar_diff(resultado, 'alterados', {'chave': registro[0], 'campos': mudancas})
+                else:
+                    resultado['inalteradas'] += 1
+            
+            # Executar inserção em lote (ON CONFLICT atualiza os existentes)
+            if not simular and dados:
+                execute_values(cursor, INSERT_FUNCIONARIOS, dados)
+            
+            resultado['ignoradas'] = resultado['lidas'] - resultado['validas']
+            print(f"  Lote {numero_lote}: {resultado['lidas']} linhas lidas, {resultado['validas']} válidas")
+            informar_progresso(progresso, resultado, etapa)
         
-        # Query de inserção (com ON CONFLICT para evitar duplicatas)
-        insert_query = """
-            INSERT INTO apontador_horas.funcionarios 
-            (usuario, senha_hash, email, nome_completo, departamento, nivel, nome_gestor, ativo)
-            VALUES %s
-            ON CONFLICT (usuario) 
-            DO UPDATE SET
-                senha_hash = EXCLUDED.senha_hash,
-                email = EXCLUDED.email,
-                nome_completo = EXCLUDED.nome_completo,
-                departamento = EXCLUDED.departamento,
-                nivel = EXCLUDED.nivel,
-                nome_gestor = EXCLUDED.nome_gestor,
-                ativo = EXCLUDED.ativo
-        """
+        print(f"Novos: {resultado['inseridas']}, alterados: {resultado['atualizadas']}, "
+              f"sem alteração: {resultado['inalteradas']}, ignorados: {resultado['ignoradas']}")
         
-        # Executar inserção em lote
-        execute_values(cursor, insert_query, dados)
+        if simular:
+            informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+            return resultado
         
-        # Commit
+        # 3. Commit
         conn.commit()
         
-        print(f"[{datetime.now()}] ✓ {len(dados)} funcionários inseridos/atualizados com sucesso!")
+        print(f"[{datetime.now()}] ✓ {resultado['validas']} funcionários inseridos/atualizados com sucesso!")
         
-        # 5. Verificar resultado
+        # 4. Verificar resultado
         cursor.execute("SELECT COUNT(*) FROM apontador_horas.funcionarios")
         total = cursor.fetchone()[0]
         print(f"Total de funcionários na tabela: {total}")
@@ -230,11 +230,11 @@ def importar_funcionarios(arquivo_excel):
             status = "Ativo" if ativo else "Inativo"
             print(f"  {status}: {count}")
         
-        # Fechar conexão
         cursor.close()
-        conn.close()
         
         print(f"\n[{datetime.now()}] Importação concluída!")
+        informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+        return resultado
         
     except psycopg2.Error as e:
         print(f"Erro no PostgreSQL: {e}")
@@ -244,6 +244,10 @@ def importar_funcionarios(arquivo_excel):
     except Exception as e:
         print(f"Erro: {e}")
         raise
+    finally:
+        # Fechar a conexão também libera a trava da tabela
+        if conn:
+            conn.close()
 
 # =====================================================
 # FUNÇÃO AUXILIAR: VERIFICAR SENHA
@@ -259,17 +263,16 @@ def verificar_senha(senha_texto, senha_hash_bd):
 # EXECUÇÃO
 # =====================================================
 if __name__ == "__main__":
-    # Caminho do arquivo
-    arquivo = "/home/jvfalves/documentos/projetos/chatbot_apontamento_horas/files/Funcionarios.xlsx"
+    args = argumentos_linha_comando('Importa funcionários da planilha Excel', 'Funcionarios.xlsx')
     
     # Executar importação
-    importar_funcionarios(arquivo)
+    imprimir_resultado(importar_funcionarios(args.arquivo, simular=args.simular))
     
     print("\n" + "="*60)
     print("INFORMAÇÕES IMPORTANTES:")
     print("="*60)
     print("1. As senhas foram convertidas para hash SHA-256")
-    print("2. Senha padrão para todos: Booker@1010")
-    print("3. Hash da senha padrão:", gerar_hash_senha("Booker@1010"))
+    print(f"2. Senha padrão para todos: {SENHA_PADRAO}")
+    print("3. Hash da senha padrão:", gerar_hash_senha(SENHA_PADRAO))
     print("4. Para login, compare o hash da senha digitada com o hash no banco")
     print("="*60)
\ No newline at end of file
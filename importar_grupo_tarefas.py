@@ -3,10 +3,15 @@ Script para atualizar o campo DEPARTAMENTO dos grupos de tarefas
 Atualiza baseado no cod_grupo_tarefa
 """
 
-import pandas as pd
 import psycopg2
 import os
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+import normalizacao_planilhas as normalizacao
+from importacao_comum import (
+    ler_planilha_em_lotes, travar_tabela, novo_resultado, registrar_diff, informar_progresso,
+    argumentos_linha_comando, imprimir_resultado, ETAPA_VALIDANDO, ETAPA_GRAVANDO, ETAPA_CONCLUIDA
+)
 
 # Configurações
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -21,77 +26,133 @@ DB_CONFIG = {
     'options': '-c search_path=apontador_horas,public'
 }
 
-def atualizar_departamentos(arquivo_excel):
-    """Atualiza apenas o campo departamento dos grupos existentes"""
+UPDATE_DEPARTAMENTOS = """
+    UPDATE apontador_horas.grupo_tarefas g
+    SET departamento = v.departamento
+    FROM (VALUES %s) AS v(cod_grupo_tarefa, departamento)
+    WHERE g.cod_grupo_tarefa = v.cod_grupo_tarefa
+"""
+
+def ler_departamentos_lote(df):
+    """{cod_grupo_tarefa: departamento} do lote (código repetido: vale a última linha)"""
+    df['cod_grupo_tarefa'] = normalizacao.codigo_grupo_tarefa(df['cod_grupo_tarefa'])
+    departamento = normalizacao.texto(df['departamento'])
+    df['departamento'] = departamento.mask(departamento.eq('').fillna(False))
+    
+    df_limpo = df.dropna(subset=['cod_grupo_tarefa'])
+    return dict(normalizacao.registros(df_limpo, ('cod_grupo_tarefa', 'departamento')))
+
+def atualizar_departamentos(arquivo_excel, simular=False, progresso=None):
+    """
+    Atualiza apenas o campo departamento dos grupos existentes
     
-    print("Lendo planilha...")
-    df = pd.read_excel(arquivo_excel)
+    A planilha é lida e gravada em lotes, tudo em uma transação. Código
+    repetido na planilha: vale a última linha, mesmo em lotes diferentes.
+    Com simular=True só calcula o diff (alterados/não encontrados) sem gravar.
+    progresso(resultado) é chamado a cada lote. Retorna o resultado.
+    """
     
-    # Limpar dados
-    df['cod_grupo_tarefa'] = df['cod_grupo_tarefa'].astype(str).str.strip()
-    df['departamento'] = df['departamento'].fillna('').astype(str).str.strip()
-    df['departamento'] = df['departamento'].replace('', None)
+    resultado = novo_resultado('grupo_tarefas', simular)
+    informar_progresso(progresso, resultado, resultado['etapa'])
     
     # Conectar no banco
     conn = psycopg2.connect(**DB_CONFIG)
-    cursor = conn.cursor()
-    
-    print(f"Atualizando departamento de {len(df)} grupos...")
-    
-    atualizados = 0
-    nao_encontrados = []
-    
-    for _, row in df.iterrows():
-        cod = row['cod_grupo_tarefa']
-        dept = row['departamento']
+    try:
+        cursor = conn.cursor()
+        travar_tabela(cursor, 'grupo_tarefas')
         
-        # Verificar se o grupo existe
-        cursor.execute(
-            "SELECT cod_grupo_tarefa FROM apontador_horas.grupo_tarefas WHERE cod_grupo_tarefa = %s",
-            (cod,)
-        )
+        etapa = ETAPA_VALIDANDO if simular else ETAPA_GRAVANDO
+        # Por código (poucos: um por grupo cadastrado, não por linha da planilha)
+        departamentos = {}      # departamento da planilha
+        atuais = {}             # departamento no banco antes da importação
+        nao_encontrados = set()
+        gravados = set()
         
-        if cursor.fetchone():
-            # Atualizar departamento
+        print("Lendo planilha em lotes...")
+        for df in ler_planilha_em_lotes(arquivo_excel):
+            resultado['lidas'] += len(df)
+            lote = ler_departamentos_lote(df)
+            
+            # Uma consulta por lote, só para os códigos ainda não vistos
+            novos_codigos = [cod for cod in lote if cod not in atuais and cod not in nao_encontrados]
             cursor.execute(
-                "UPDATE apontador_horas.grupo_tarefas SET departamento = %s WHERE cod_grupo_tarefa = %s",
-                (dept, cod)
+                "SELECT cod_grupo_tarefa, departamento FROM apontador_horas.grupo_tarefas WHERE cod_grupo_tarefa = ANY(%s)",
+                (novos_codigos,)
             )
-            atualizados += 1
-        else:
-            nao_encontrados.append(cod)
-    
-    conn.commit()
-    
-    print(f"\n✓ {atualizados} grupos atualizados")
-    
-    if nao_encontrados:
-        print(f"\n⚠ {len(nao_encontrados)} códigos não encontrados no banco:")
-        for cod in nao_encontrados[:10]:
-            print(f"  - {cod}")
-        if len(nao_encontrados) > 10:
-            print(f"  ... e mais {len(nao_encontrados) - 10}")
-    
-    # Mostrar estatísticas
-    cursor.execute("""
-        SELECT 
-            COALESCE(departamento, 'Sem departamento') as dept,
-            COUNT(*) as total
-        FROM apontador_horas.grupo_tarefas 
-        GROUP BY departamento
-        ORDER BY total DESC
-    """)
-    
-    print("\nGrupos por departamento:")
-    for dept, total in cursor.fetchall():
-        print(f"  {dept}: {total}")
-    
-    cursor.close()
-    conn.close()
+            atuais.update(cursor.fetchall())
+            nao_encontrados.update(cod for cod in novos_codigos if cod not in atuais)
+            departamentos.update(lote)
+            
+            # Atualizar só o que mudou, em um único UPDATE por lote (código já
+            # gravado em lote anterior é regravado: vale a última linha)
+            if not simular:
+                alterados = [
+                    (cod, dept) for cod, dept in lote.items()
+                    if cod in atuais and (cod in gravados or atuais[cod] != dept)
+                ]
+                if alterados:
+                    execute_values(cursor, UPDATE_DEPARTAMENTOS, alterados, template='(%s, %s::varchar)')
+                    gravados.update(cod for cod, _ in alterados)
+            
+            # Contadores e diff sobre todos os códigos vistos até aqui
+            resultado['validas'] = len(departamentos)
+            resultado['atualizadas'] = resultado['inalteradas'] = 0
+            resultado['diff'] = {'novos': [], 'alterados': [], 'ignorados': []}
+            for cod, dept in departamentos.items():
+                if cod in nao_encontrados:
+                    registrar_diff(resultado, 'ignorados', {'chave': cod, 'motivo': 'Grupo não encontrado'})
+                elif atuais[cod] != dept:
+                    resultado['atualizadas'] += 1
+                    registrar_diff(resultado, 'alterados', {'chave': cod, 'campos': {'departamento': [atuais[cod], dept]}})
+                else:
+                    resultado['inalteradas'] += 1
+            resultado['ignoradas'] = len(nao_encontrados) + resultado['lidas'] - resultado['validas']
+            informar_progresso(progresso, resultado, etapa)
+        
+        if nao_encontrados:
+            print(f"\n⚠ {len(nao_encontrados)} códigos não encontrados no banco:")
+            for cod in sorted(nao_encontrados)[:10]:
+                print(f"  - {cod}")
+            if len(nao_encontrados) > 10:
+                print(f"  ... e mais {len(nao_encontrados) - 10}")
+        
+        if simular:
+            print(f"\n{resultado['atualizadas']} grupos seriam atualizados")
+            informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+            return resultado
+        
+        conn.commit()
+        
+        print(f"\n✓ {resultado['atualizadas']} grupos atualizados")
+        
+        # Mostrar estatísticas
+        cursor.execute("""
+            SELECT 
+                COALESCE(departamento, 'Sem departamento') as dept,
+                COUNT(*) as total
+            FROM apontador_horas.grupo_tarefas 
+            GROUP BY departamento
+            ORDER BY total DESC
+        """)
+        
+        print("\nGrupos por departamento:")
+        for dept, total in cursor.fetchall():
+            print(f"  {dept}: {total}")
+        
+        cursor.close()
+        
+        print("\n✓ Atualização concluída!")
+        informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+        return resultado
     
-    print("\n✓ Atualização concluída!")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Fechar a conexão também libera a trava da tabela
+        conn.close()
 
 
 if __name__ == "__main__":
-    arquivo = "/home/jvfalves/documentos/projetos/chatbot_apontamento_horas/files/Grupo tarefas.xlsx"
-    atualizar_departamentos(arquivo)
\ No newline at end of file
+    args = argumentos_linha_comando('Atualiza o departamento dos grupos de tarefas', 'Grupo tarefas.xlsx')
+    imprimir_resultado(atualizar_departamentos(args.arquivo, simular=args.simular))
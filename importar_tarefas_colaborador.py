@@ -12,7 +12,12 @@ import os
 from dotenv import load_dotenv
 from psycopg2.extras import execute_values, RealDictCursor
 from datetime import datetime
-import re
+from versoes_cache import incrementar_versao, VERSAO_TAREFAS
+import normalizacao_planilhas as normalizacao
+from importacao_comum import (
+    ler_planilha_em_lotes, travar_tabela, novo_resultado, registrar_diff, informar_progresso,
+    argumentos_linha_comando, imprimir_resultado, ETAPA_VALIDANDO, ETAPA_GRAVANDO, ETAPA_CONCLUIDA
+)
 
 # =====================================================
 # CONFIGURAÇÕES DE CONEXÃO
@@ -28,78 +33,20 @@ DB_CONFIG = {
     'port': os.getenv('PORT_DW')
 }
 
-# =====================================================
-# FUNÇÕES DE NORMALIZAÇÃO
-# =====================================================
-def normalizar_cnpj_cpf(valor):
-    """
-    Remove pontos, traços, barras e espaços do CNPJ/CPF
-    CPF: 11 dígitos
-    CNPJ: 14 dígitos
-    
-    Trata casos especiais:
-    - Menos de 11 dígitos → preenche com zeros até 11 (CPF)
-    - 12-13 dígitos → preenche com zeros até 14 (CNPJ)
-    - Mais de 14 dígitos → considera inválido
-    - Vazio ou só caracteres especiais → None
-    """
-    if pd.isna(valor) or valor is None:
-        return None
-    
-    # Converter para string e remover espaços em branco
-    valor_str = str(valor).strip()
-    
-    # Se estiver vazio após strip, retornar None
-    if not valor_str or valor_str == '-':
-        return None
-    
-    # Remover tudo que não for número
-    apenas_numeros = re.sub(r'\D', '', valor_str)
-    
-    # Se não tem números ou está vazio, retornar None
-    if not apenas_numeros or len(apenas_numeros) == 0:
-        return None
-    
-    # Determinar se é CPF ou CNPJ pelo tamanho
-    tamanho = len(apenas_numeros)
-    
-    if tamanho <= 11:
-        # É CPF - preencher com zeros até 11 dígitos
-        return apenas_numeros.zfill(11)
-    elif tamanho <= 14:
-        # É CNPJ - preencher com zeros até 14 dígitos
-        return apenas_numeros.zfill(14)
-    else:
-        # Mais de 14 dígitos - considerar inválido
-        print(f"⚠️ CNPJ/CPF com mais de 14 dígitos ignorado: {valor_str} ({apenas_numeros})")
-        return None
+# Colunas gravadas em tarefas_colaborador, na ordem do INSERT
+COLUNAS_INSERCAO = (
+    'cnpj_cpf_normalizado', 'nome_empresa', 'cod_grupo_tarefa_normalizado', 'nome_tarefa',
+    'colaborador_1', 'colaborador_2', 'estimativa_horas', 'prioridade'
+)
 
-def normalizar_cod_grupo_tarefa(valor):
-    """Converte código do grupo para string formatada"""
-    if pd.isna(valor):
-        return None
-    try:
-        # Se for float, formatar com 2 casas decimais
-        if isinstance(valor, float):
-            return f"{valor:.2f}"
-        return str(valor).strip()
-    except:
-        return None
+# Chave de duplicata: (CNPJ/CPF + Grupo + Nome Tarefa + Colaborador Principal)
+COLUNAS_CHAVE = ('cnpj_cpf_normalizado', 'cod_grupo_tarefa_normalizado', 'nome_tarefa', 'colaborador_1')
 
-def normalizar_texto(texto):
-    """Normaliza texto removendo espaços extras"""
-    if pd.isna(texto) or texto is None:
-        return None
-    return str(texto).strip()
-
-def normalizar_decimal(valor):
-    """Converte valor para decimal"""
-    if pd.isna(valor) or valor is None:
-        return None
-    try:
-        return float(valor)
-    except:
-        return None
+def imprimir_exemplos_tarefas(df, limite=5):
+    """Mostra algumas tarefas do DataFrame (empresa | grupo | tarefa | colaborador)"""
+    colunas = ('nome_empresa', 'cod_grupo_tarefa_normalizado', 'nome_tarefa', 'colaborador_1')
+    for empresa, grupo, tarefa, colaborador in normalizacao.registros(df.head(limite), colunas):
+        print(f"   - {(empresa or '')[:30]:30} | Grupo: {grupo} | {tarefa[:35]:35} | {colaborador}")
 
 # =====================================================
 # FUNÇÕES DE VALIDAÇÃO
@@ -147,230 +94,255 @@ def buscar_tarefas_existentes(conn):
     
     return tarefas_existentes
 
+# =====================================================
+# PREPARAÇÃO DE UM LOTE
+# =====================================================
+INSERT_TAREFAS = """
+    INSERT INTO apontador_horas.tarefas_colaborador 
+    (cnpj_cpf, nome_empresa, cod_grupo_tarefa, nome_tarefa, 
+     colaborador_1, colaborador_2, estimativa_horas, prioridade)
+    VALUES %s
+"""
+
+# Validações de foreign key: chave → (coluna, descrição do erro, orientação)
+VALIDACOES_FK = {
+    'clientes': ('cnpj_cpf_normalizado', "registros com CNPJ/CPF não encontrado na tabela clientes",
+                 "Adicione esses clientes antes de importar as tarefas."),
+    'grupos': ('cod_grupo_tarefa_normalizado', "registros com cod_grupo_tarefa não encontrado",
+               "Adicione esses grupos na tabela grupo_tarefas primeiro."),
+    'colaborador_1': ('colaborador_1', "registros com colaborador_1 não encontrado",
+                      "Cadastre esses usuários na tabela funcionarios primeiro."),
+    'colaborador_2': ('colaborador_2', "registros com colaborador_2 não encontrado",
+                      "Cadastre esses usuários na tabela funcionarios primeiro.")
+}
+
+def normalizar_lote(df):
+    """Normaliza as colunas do lote (vetorizado: uma operação por coluna, não por linha)"""
+    df['cnpj_cpf_normalizado'] = normalizacao.cnpj_cpf(df['cnpj_cpf'])
+    df['cod_grupo_tarefa_normalizado'] = normalizacao.codigo_grupo_tarefa(df['cod_grupo_tarefa'])
+    for coluna in ('nome_empresa', 'nome_tarefa', 'colaborador_1', 'colaborador_2', 'prioridade'):
+        df[coluna] = normalizacao.texto(df[coluna])
+    df['estimativa_horas'] = normalizacao.decimal(df['estimativa_horas'])
+    return df
+
+def motivos_remocao(df_removidos, limite):
+    """(empresa, motivos) das primeiras linhas removidas por dados incompletos"""
+    exemplos = []
+    for _, row in df_removidos.head(limite).iterrows():
+        motivos = []
+        if pd.isna(row['cnpj_cpf_normalizado']):
+            motivos.append(f"CNPJ/CPF inválido: '{row['cnpj_cpf']}'")
+        if pd.isna(row['cod_grupo_tarefa_normalizado']):
+            motivos.append("Grupo inválido")
+        if pd.isna(row['nome_tarefa']):
+            motivos.append("Sem nome de tarefa")
+        if pd.isna(row['colaborador_1']):
+            motivos.append("Sem colaborador_1")
+        
+        empresa = row['nome_empresa'] if pd.notna(row['nome_empresa']) else 'N/A'
+        exemplos.append((empresa, ', '.join(motivos)))
+    return exemplos
+
+def validar_foreign_keys(df_limpo, referencias, invalidos):
+    """
+    Acumula em invalidos[chave] = {'total', 'exemplos'} os registros do lote cujas
+    foreign keys não existem (exemplos: até 10 valores distintos por validação)
+    """
+    for chave, (coluna, _, _) in VALIDACOES_FK.items():
+        # colaborador_2 é opcional: só valida os não-nulos
+        valores = df_limpo[coluna].dropna()
+        valores_invalidos = valores[~valores.isin(referencias[chave])]
+        if len(valores_invalidos) == 0:
+            continue
+        
+        acumulado = invalidos.setdefault(chave, {'total': 0, 'exemplos': []})
+        acumulado['total'] += len(valores_invalidos)
+        for valor in valores_invalidos.unique():
+            if len(acumulado['exemplos']) >= 10:
+                break
+            if valor not in acumulado['exemplos']:
+                acumulado['exemplos'].append(valor)
+
 # =====================================================
 # FUNÇÃO PRINCIPAL DE IMPORTAÇÃO
 # =====================================================
-def importar_tarefas_colaborador(arquivo_excel):
+def importar_tarefas_colaborador(arquivo_excel, simular=False, progresso=None):
     """
     Importa tarefas de colaboradores da planilha Excel para o PostgreSQL
     COM VERIFICAÇÃO DE DUPLICATAS - não adiciona tarefas que já existem
+    
+    A planilha é lida, validada e gravada em lotes (memória limitada pelo
+    tamanho do lote), tudo em uma transação.
+    Com simular=True só calcula o diff (novas/já existentes) sem gravar.
+    Foreign keys inválidas em qualquer lote cancelam a importação inteira
+    (rollback): o motivo fica em resultado['erros'].
+    progresso(resultado) é chamado a cada lote. Retorna o resultado.
     """
     
     print(f"[{datetime.now()}] Iniciando importação de tarefas de colaboradores...")
     print("="*80)
+    resultado = novo_resultado('tarefas_colaborador', simular)
+    informar_progresso(progresso, resultado, resultado['etapa'])
     
-    # 1. Ler a planilha
-    print(f"\n[{datetime.now()}] Lendo planilha...")
-    df = pd.read_excel(arquivo_excel)
-    print(f"✓ Total de registros na planilha: {len(df)}")
-    
-    # 2. Conectar ao banco para buscar dados de referência
+    # 1. Conectar ao banco para buscar dados de referência
     print(f"\n[{datetime.now()}] Conectando ao banco para validação...")
+    conn = psycopg2.connect(**DB_CONFIG)
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        travar_tabela(cursor, 'tarefas_colaborador')
+        
         cnpjs_validos, grupos_validos, usuarios_validos = buscar_dados_referencia(conn)
+        referencias = {
+            'clientes': cnpjs_validos,
+            'grupos': grupos_validos,
+            'colaborador_1': usuarios_validos,
+            'colaborador_2': usuarios_validos
+        }
         
         print(f"✓ {len(cnpjs_validos)} clientes encontrados")
         print(f"✓ {len(grupos_validos)} grupos de tarefa encontrados")
         print(f"✓ {len(usuarios_validos)} funcionários encontrados")
         
-        # 2.1 Buscar tarefas que JÁ EXISTEM no banco
+        # 1.1 Buscar tarefas que JÁ EXISTEM no banco
         print(f"\n[{datetime.now()}] Buscando tarefas existentes no banco...")
         tarefas_existentes = buscar_tarefas_existentes(conn)
         print(f"✓ {len(tarefas_existentes)} tarefas já existem no banco")
         
-    except Exception as e:
-        print(f"❌ Erro ao buscar dados de referência: {e}")
-        if conn:
-            conn.close()
-        return
-    
-    # 3. Preparar os dados
-    print(f"\n{'='*80}")
-    print("PREPARANDO E VALIDANDO DADOS")
-    print("="*80)
-    
-    # Normalizar campos
-    df['cnpj_cpf_normalizado'] = df['cnpj_cpf'].apply(normalizar_cnpj_cpf)
-    df['cod_grupo_tarefa_normalizado'] = df['cod_grupo_tarefa'].apply(normalizar_cod_grupo_tarefa)
-    df['nome_empresa'] = df['nome_empresa'].apply(normalizar_texto)
-    df['nome_tarefa'] = df['nome_tarefa'].apply(normalizar_texto)
-    df['colaborador_1'] = df['colaborador_1'].apply(normalizar_texto)
-    df['colaborador_2'] = df['colaborador_2'].apply(normalizar_texto)
-    df['estimativa_horas'] = df['estimativa_horas'].apply(normalizar_decimal)
-    df['prioridade'] = df['prioridade'].apply(normalizar_texto)
-    
-    # Remover linhas sem dados essenciais
-    df_limpo = df.dropna(subset=['cnpj_cpf_normalizado', 'cod_grupo_tarefa_normalizado', 
-                                   'nome_tarefa', 'colaborador_1'], how='any')
-    
-    registros_removidos = len(df) - len(df_limpo)
-    if registros_removidos > 0:
-        print(f"\n⚠️ {registros_removidos} registros removidos por dados incompletos:")
-        
-        # Mostrar exemplos de registros removidos
-        df_removidos = df[~df.index.isin(df_limpo.index)]
-        print("\nExemplos de registros removidos:")
-        for idx, row in df_removidos.head(5).iterrows():
-            motivos = []
-            if pd.isna(row['cnpj_cpf_normalizado']):
-                motivos.append(f"CNPJ/CPF inválido: '{row['cnpj_cpf']}'")
-            if pd.isna(row['cod_grupo_tarefa_normalizado']):
-                motivos.append("Grupo inválido")
-            if pd.isna(row['nome_tarefa']):
-                motivos.append("Sem nome de tarefa")
-            if pd.isna(row['colaborador_1']):
-                motivos.append("Sem colaborador_1")
+        # 2. Ler, validar e gravar lote a lote
+        print(f"\n{'='*80}")
+        print("PREPARANDO E VALIDANDO DADOS (EM LOTES)")
+        print("="*80)
+        
+        etapa = ETAPA_VALIDANDO if simular else ETAPA_GRAVANDO
+        invalidos = {}
+        exemplos_removidos = []
+        exemplos_duplicadas = None
+        exemplos_novas = None
+        
+        for numero_lote, df in enumerate(ler_planilha_em_lotes(arquivo_excel), start=1):
+            resultado['lidas'] += len(df)
+            df = normalizar_lote(df)
             
-            print(f"  - {row.get('nome_empresa', 'N/A')[:40]}: {', '.join(motivos)}")
-    
-    print(f"\n✓ Registros após limpeza inicial: {len(df_limpo)}")
-    
-    # 4. Validar Foreign Keys
-    print(f"\n{'='*80}")
-    print("VALIDAÇÃO DE FOREIGN KEYS")
-    print("="*80)
-    
-    # Validar CNPJs
-    cnpjs_invalidos = df_limpo[~df_limpo['cnpj_cpf_normalizado'].isin(cnpjs_validos)]
-    if len(cnpjs_invalidos) > 0:
-        print(f"\n⚠️ AVISO: {len(cnpjs_invalidos)} registros com CNPJ/CPF não encontrado na tabela clientes:")
-        for idx, row in cnpjs_invalidos.head(10).iterrows():
-            print(f"  - {row['cnpj_cpf']} (normalizado: {row['cnpj_cpf_normalizado']}) - {row['nome_empresa']}")
-        if len(cnpjs_invalidos) > 10:
-            print(f"  ... e mais {len(cnpjs_invalidos) - 10} registros")
-        
-        print("\n❌ ImportaÃ§Ã£o cancelada. Corrija os CNPJs/CPFs invÃ¡lidos primeiro.")
-        print("   Adicione esses clientes na tabela 'clientes' antes de importar as tarefas.")
-        conn.close()
-        return
-    else:
-        print("✓ Todos os CNPJs/CPFs são válidos")
-    
-    # Validar grupos de tarefa
-    grupos_invalidos = df_limpo[~df_limpo['cod_grupo_tarefa_normalizado'].isin(grupos_validos)]
-    if len(grupos_invalidos) > 0:
-        print(f"\n⚠️ AVISO: {len(grupos_invalidos)} registros com cod_grupo_tarefa não encontrado:")
-        print(f"Códigos inválidos: {grupos_invalidos['cod_grupo_tarefa_normalizado'].unique()}")
-        print("❌ Importação cancelada. Adicione esses grupos na tabela grupo_tarefas primeiro.")
-        conn.close()
-        return
-    else:
-        print("✓ Todos os códigos de grupo são válidos")
-    
-    # Validar colaborador_1
-    colab1_invalidos = df_limpo[~df_limpo['colaborador_1'].isin(usuarios_validos)]
-    if len(colab1_invalidos) > 0:
-        print(f"\n⚠️ AVISO: {len(colab1_invalidos)} registros com colaborador_1 não encontrado:")
-        print(f"Usuários inválidos: {colab1_invalidos['colaborador_1'].unique()}")
-        print("❌ Importação cancelada. Cadastre esses usuários na tabela funcionarios primeiro.")
-        conn.close()
-        return
-    else:
-        print("✓ Todos os colaborador_1 são válidos")
-    
-    # Validar colaborador_2 (apenas os não-nulos)
-    df_com_colab2 = df_limpo[df_limpo['colaborador_2'].notna()]
-    colab2_invalidos = df_com_colab2[~df_com_colab2['colaborador_2'].isin(usuarios_validos)]
-    if len(colab2_invalidos) > 0:
-        print(f"\n⚠️ AVISO: {len(colab2_invalidos)} registros com colaborador_2 não encontrado:")
-        print(f"Usuários inválidos: {colab2_invalidos['colaborador_2'].unique()}")
-        print("❌ Importação cancelada. Cadastre esses usuários na tabela funcionarios primeiro.")
-        conn.close()
-        return
-    else:
-        print("✓ Todos os colaborador_2 são válidos")
-    
-    # 5. FILTRAR DUPLICATAS - NOVIDADE DA V2.0
-    print(f"\n{'='*80}")
-    print("VERIFICAÇÃO DE DUPLICATAS")
-    print("="*80)
-    
-    # Criar coluna com chave composta para verificação
-    # Chave: (CNPJ/CPF + Grupo + Nome Tarefa + Colaborador Principal)
-    df_limpo['chave_tarefa'] = df_limpo.apply(
-        lambda row: (row['cnpj_cpf_normalizado'], row['cod_grupo_tarefa_normalizado'], 
-                     row['nome_tarefa'], row['colaborador_1']),
-        axis=1
-    )
-    
-    # Filtrar apenas tarefas NOVAS (que não existem no banco)
-    df_novas = df_limpo[~df_limpo['chave_tarefa'].isin(tarefas_existentes)]
-    df_duplicadas = df_limpo[df_limpo['chave_tarefa'].isin(tarefas_existentes)]
-    
-    print(f"\n📊 Resultado da verificação:")
-    print(f"   • Total de tarefas na planilha (após limpeza): {len(df_limpo)}")
-    print(f"   • Tarefas que JÁ EXISTEM no banco: {len(df_duplicadas)}")
-    print(f"   • Tarefas NOVAS para importar: {len(df_novas)}")
-    
-    if len(df_duplicadas) > 0:
-        print(f"\n⚠️ Exemplos de tarefas duplicadas (NÃO serão importadas):")
-        for idx, row in df_duplicadas.head(5).iterrows():
-            print(f"   - {row['nome_empresa'][:30]:30} | Grupo: {row['cod_grupo_tarefa_normalizado']} | {row['nome_tarefa'][:35]:35} | {row['colaborador_1']}")
-        if len(df_duplicadas) > 5:
-            print(f"   ... e mais {len(df_duplicadas) - 5} tarefas duplicadas")
-    
-    if len(df_novas) == 0:
-        print(f"\n✓ Nenhuma tarefa nova para importar. Todas já existem no banco!")
-        conn.close()
-        return
-    
-    print(f"\n✅ {len(df_novas)} tarefas novas serão importadas")
-    
-    # Mostrar exemplos de tarefas que serão importadas
-    if len(df_novas) > 0:
-        print(f"\n📝 Exemplos de tarefas que SERÃO importadas:")
-        for idx, row in df_novas.head(5).iterrows():
-            print(f"   - {row['nome_empresa'][:30]:30} | Grupo: {row['cod_grupo_tarefa_normalizado']} | {row['nome_tarefa'][:35]:35} | {row['colaborador_1']}")
-        if len(df_novas) > 5:
-            print(f"   ... e mais {len(df_novas) - 5} tarefas novas")
-    
-    # 6. Confirmar importação
-    print(f"\n{'='*80}")
-    resposta = input(f"\n🔹 Deseja importar {len(df_novas)} tarefas novas? (s/n): ")
-    if resposta.lower() != 's':
-        print("❌ Importação cancelada pelo usuário.")
-        conn.close()
-        return
-    
-    # 7. Inserir dados
-    print(f"\n[{datetime.now()}] Inserindo {len(df_novas)} tarefas novas...")
-    
-    try:
-        cursor = conn.cursor()
+            # Remover linhas sem dados essenciais
+            df_limpo = df.dropna(subset=['cnpj_cpf_normalizado', 'cod_grupo_tarefa_normalizado', 
+                                           'nome_tarefa', 'colaborador_1'], how='any')
+            
+            registros_removidos = len(df) - len(df_limpo)
+            resultado['ignoradas'] += registros_removidos
+            if registros_removidos > 0:
+                df_removidos = df[~df.index.isin(df_limpo.index)]
+                for empresa, motivos in motivos_remocao(df_removidos, 5 - len(exemplos_removidos)):
+                    exemplos_removidos.append((empresa, motivos))
+                    registrar_diff(resultado, 'ignorados', {'chave': empresa, 'motivo': motivos})
+            
+            # Validar Foreign Keys (os erros são acumulados e reportados no fim)
+            validar_foreign_keys(df_limpo, referencias, invalidos)
+            resultado['validas'] += len(df_limpo)
+            
+            # Filtrar duplicatas: chave composta como MultiIndex, o isin compara as
+            # tuplas sem montar uma por linha em Python
+            ja_existe = pd.MultiIndex.from_frame(df_limpo[list(COLUNAS_CHAVE)]).isin(tarefas_existentes)
+            df_novas = df_limpo[~ja_existe]
+            df_duplicadas = df_limpo[ja_existe]
+            resultado['inseridas'] += len(df_novas)
+            resultado['inalteradas'] += len(df_duplicadas)
+            
+            if exemplos_duplicadas is None and len(df_duplicadas) > 0:
+                exemplos_duplicadas = df_duplicadas.head(5)
+            if exemplos_novas is None and len(df_novas) > 0:
+                exemplos_novas = df_novas.head(5)
+            
+            # Preparar dados para inserção
+            dados = normalizacao.registros(df_novas, COLUNAS_INSERCAO)
+            
+            for registro in dados:
+                registrar_diff(resultado, 'novos', {
+                    'chave': registro[1], 'grupo': registro[2], 'tarefa': registro[3],
+                    'colaborador_1': registro[4], 'colaborador_2': registro[5]
+                })
+            
+            # Inserir o lote (com erro de FK em algum lote, para de gravar e desfaz tudo no fim)
+            if not simular and not invalidos and dados:
+                execute_values(cursor, INSERT_TAREFAS, dados)
+            
+            print(f"  Lote {numero_lote}: {resultado['lidas']} linhas lidas, {resultado['inseridas']} tarefas novas")
+            informar_progresso(progresso, resultado, etapa)
+        
+        print(f"✓ Total de registros na planilha: {resultado['lidas']}")
+        
+        if resultado['ignoradas'] > 0:
+            print(f"\n⚠️ {resultado['ignoradas']} registros removidos por dados incompletos:")
+            print("\nExemplos de registros removidos:")
+            for empresa, motivos in exemplos_removidos:
+                print(f"  - {empresa[:40]}: {motivos}")
+        
+        print(f"\n✓ Registros após limpeza inicial: {resultado['validas']}")
+        
+        # 3. Resultado da validação de Foreign Keys
+        print(f"\n{'='*80}")
+        print("VALIDAÇÃO DE FOREIGN KEYS")
+        print("="*80)
+        
+        for chave, (coluna, descricao, orientacao) in VALIDACOES_FK.items():
+            if chave not in invalidos:
+                print(f"✓ Todos os valores de {coluna} são válidos")
+                continue
+            
+            total = invalidos[chave]['total']
+            exemplos = ', '.join(invalidos[chave]['exemplos'])
+            print(f"\n⚠️ AVISO: {total} {descricao}: {exemplos}")
+            resultado['erros'].append(f"{total} {descricao} ({exemplos}). {orientacao}")
+        
+        if resultado['erros']:
+            conn.rollback()
+            # Nada foi gravado: os lotes já inseridos foram desfeitos
+            resultado['validas'] = resultado['inseridas'] = resultado['inalteradas'] = 0
+            resultado['diff']['novos'] = []
+            print("\n❌ Importação cancelada. Corrija os registros acima primeiro.")
+            informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+            return resultado
+        
+        # 4. Duplicatas
+        print(f"\n{'='*80}")
+        print("VERIFICAÇÃO DE DUPLICATAS")
+        print("="*80)
+        
+        print(f"\n📊 Resultado da verificação:")
+        print(f"   • Total de tarefas na planilha (após limpeza): {resultado['validas']}")
+        print(f"   • Tarefas que JÁ EXISTEM no banco: {resultado['inalteradas']}")
+        print(f"   • Tarefas NOVAS para importar: {resultado['inseridas']}")
+        
+        if exemplos_duplicadas is not None:
+            print(f"\n⚠️ Exemplos de tarefas duplicadas (NÃO serão importadas):")
+            imprimir_exemplos_tarefas(exemplos_duplicadas)
+            if resultado['inalteradas'] > 5:
+                print(f"   ... e mais {resultado['inalteradas'] - 5} tarefas duplicadas")
+        
+        if resultado['inseridas'] == 0:
+            print(f"\n✓ Nenhuma tarefa nova para importar. Todas já existem no banco!")
+            informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+            return resultado
+        
+        # Mostrar exemplos de tarefas novas
+        print(f"\n📝 Exemplos de tarefas novas:")
+        imprimir_exemplos_tarefas(exemplos_novas)
+        if resultado['inseridas'] > 5:
+            print(f"   ... e mais {resultado['inseridas'] - 5} tarefas novas")
         
-        # Preparar dados para inserção
-        dados = [
-            (
-                row['cnpj_cpf_normalizado'],
-                row['nome_empresa'],
-                row['cod_grupo_tarefa_normalizado'],
-                row['nome_tarefa'],
-                row['colaborador_1'],
-                row['colaborador_2'],
-                row['estimativa_horas'],
-                row['prioridade']
-            )
-            for _, row in df_novas.iterrows()
-        ]
-        
-        # Query de inserção
-        insert_query = """
-            INSERT INTO apontador_horas.tarefas_colaborador 
-            (cnpj_cpf, nome_empresa, cod_grupo_tarefa, nome_tarefa, 
-             colaborador_1, colaborador_2, estimativa_horas, prioridade)
-            VALUES %s
-        """
-        
-        # Executar inserção em lote
-        execute_values(cursor, insert_query, dados)
-        
-        # Commit
+        # 5. Simulação: para aqui, sem gravar (substitui a confirmação por input())
+        if simular:
+            informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+            return resultado
+        
+        # 6. Commit (os lotes já foram inseridos na mesma transação)
         conn.commit()
         
-        print(f"[{datetime.now()}] ✅ {len(dados)} tarefas inseridas com sucesso!")
+        # Invalidar cache de tarefas do app principal
+        incrementar_versao(VERSAO_TAREFAS)
+        
+        print(f"[{datetime.now()}] ✅ {resultado['inseridas']} tarefas inseridas com sucesso!")
         
-        # 8. Verificar resultado
+        # 7. Verificar resultado
         cursor.execute("SELECT COUNT(*) FROM apontador_horas.tarefas_colaborador")
         total = cursor.fetchone()[0]
         print(f"\n📊 Total de tarefas na tabela agora: {total}")
@@ -411,41 +383,43 @@ def importar_tarefas_colaborador(arquivo_excel):
         for grupo, count in cursor.fetchall():
             print(f"   {grupo}: {count}")
         
-        # Fechar conexão
         cursor.close()
-        conn.close()
         
         print(f"\n{'='*80}")
         print(f"✅ IMPORTAÇÃO CONCLUÍDA COM SUCESSO!")
         print("="*80)
-        print(f"   • {len(df_novas)} tarefas novas adicionadas")
-        print(f"   • {len(df_duplicadas)} tarefas duplicadas ignoradas (já existiam)")
+        print(f"   • {resultado['inseridas']} tarefas novas adicionadas")
+        print(f"   • {resultado['inalteradas']} tarefas duplicadas ignoradas (já existiam)")
         print(f"   • {total} tarefas totais no banco de dados")
         print("="*80)
         
+        informar_progresso(progresso, resultado, ETAPA_CONCLUIDA)
+        return resultado
+        
     except psycopg2.Error as e:
         print(f"\n❌ Erro no PostgreSQL: {e}")
-        if conn:
-            conn.rollback()
+        conn.rollback()
         raise
     except Exception as e:
         print(f"\n❌ Erro: {e}")
         raise
+    finally:
+        # Fechar a conexão também libera a trava da tabela (e desfaz o que não teve commit)
+        conn.close()
 
 # =====================================================
 # EXECUÇÃO
 # =====================================================
 if __name__ == "__main__":
-    # Caminho do arquivo
-    arquivo = "/home/jvfalves/documentos/projetos/chatbot_apontamento_horas/files/tarefas_colaborador.xlsx"
+    args = argumentos_linha_comando('Importa tarefas de colaboradores da planilha Excel', 'tarefas_colaborador.xlsx')
     
     print("="*80)
     print(" IMPORTAÇÃO DE TAREFAS DE COLABORADORES - VERSÃO 2.0")
     print(" COM VERIFICAÇÃO DE DUPLICATAS")
     print("="*80)
     
-    # Executar importação
-    importar_tarefas_colaborador(arquivo)
+    # Executar importação (use --simular para conferir antes de gravar)
+    imprimir_resultado(importar_tarefas_colaborador(args.arquivo, simular=args.simular))
     
     print("\n" + "="*80)
     print("ℹ️  INFORMAÇÕES IMPORTANTES:")
@@ -0,0 +1,234 @@
+"""
+Importação de planilhas em segundo plano (admin)
+- O admin salva o .xlsx enviado e o importador roda em um pool de threads:
+  a requisição volta na hora e a página acompanha o progresso por polling
+- Estado, progresso e resultado (diff da simulação) ficam em disco
+- Uma importação por tabela de cada vez: recusada aqui no processo e
+  garantida no banco pela trava do importador (vale também para a linha de comando)
+- Jobs e planilhas expiram após IMPORTACOES_EXPIRACAO_HORAS
+- Job sem progresso há IMPORTACOES_TIMEOUT_MINUTOS (ex.: admin reiniciado no
+  meio) passa a erro na consulta: a página não fica acompanhando para sempre
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from importar_clientes import importar_clientes
+from importar_funcionarios import importar_funcionarios
+from importar_grupo_tarefas import atualizar_departamentos
+from importar_tarefas_colaborador import importar_tarefas_colaborador
+
+# Configurações lidas na importação: carregar o .env antes (admin_app.py importa este módulo primeiro)
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(dotenv_path)
+
+# Configurações (via .env)
+IMPORTACOES_WORKERS = int(os.getenv('IMPORTACOES_WORKERS', '2'))
+IMPORTACOES_EXPIRACAO_HORAS = float(os.getenv('IMPORTACOES_EXPIRACAO_HORAS', '72'))
+IMPORTACOES_TIMEOUT_MINUTOS = float(os.getenv('IMPORTACOES_TIMEOUT_MINUTOS', '30'))
+
+# Status possíveis de um job
+STATUS_PENDENTE = 'pendente'
+STATUS_EXECUTANDO = 'executando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+# Tipo de importação → tabela de destino e função do importar_*.py
+IMPORTADORES = {
+    'clientes': {'titulo': 'Clientes', 'tabela': 'clientes', 'funcao': importar_clientes},
+    'funcionarios': {'titulo': 'Funcionários', 'tabela': 'funcionarios', 'funcao': importar_funcionarios},
+    'grupos': {'titulo': 'Departamento dos grupos', 'tabela': 'grupo_tarefas', 'funcao': atualizar_departamentos},
+    'tarefas': {'titulo': 'Tarefas de colaboradores', 'tabela': 'tarefas_colaborador', 'funcao': importar_tarefas_colaborador}
+}
+
+_executor = None
+_lock = threading.Lock()
+_tabelas_em_uso = {}
+
+_PADRAO_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+def _diretorio_jobs():
+    """Diretório onde ficam estado dos jobs e planilhas enviadas (configurável via .env)"""
+    return os.getenv('IMPORTACOES_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.importacoes')
+
+def _caminho_estado(job_id):
+    return os.path.join(_diretorio_jobs(), f"{job_id}.json")
+
+def caminho_planilha(job_id):
+    """Caminho onde a planilha enviada é guardada"""
+    return os.path.join(_diretorio_jobs(), f"{job_id}.xlsx")
+
+def _gravar_estado(job):
+    """Escrita atômica do estado (leitores nunca veem JSON pela metade)"""
+    # pid + thread: o pool e uma consulta (_marcar_se_abandonado) podem gravar ao mesmo tempo
+    temporario = f"{_caminho_estado(job['id'])}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'w') as arquivo:
+        json.dump(job, arquivo, default=str)
+    os.replace(temporario, _caminho_estado(job['id']))
+
+def _obter_executor():
+    """Cria o pool sob demanda"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IMPORTACOES_WORKERS, thread_name_prefix='job-importacao')
+    return _executor
+
+def _marcar_se_abandonado(job, atualizado_em):
+    """
+    Job pendente/executando sem gravar progresso há IMPORTACOES_TIMEOUT_MINUTOS vira erro
+
+    O processo que o executava pode ter sido reiniciado sem gravar o fim (a
+    transação do importador é desfeita ao cair a conexão). Job na fila ou
+    rodando neste processo nunca é marcado.
+    """
+    if job['status'] not in (STATUS_PENDENTE, STATUS_EXECUTANDO):
+        return job
+
+    with _lock:
+        vivo = job['id'] in _tabelas_em_uso.values()
+    if vivo or time.time() - atualizado_em < IMPORTACOES_TIMEOUT_MINUTOS * 60:
+        return job
+
+    job['status'] = STATUS_ERRO
+    job['mensagem'] = f'A importação parou de responder há mais de {IMPORTACOES_TIMEOUT_MINUTOS:.0f} minutos. Envie de novo.'
+    job['concluido_em'] = datetime.now().isoformat(timespec='seconds')
+    try:
+        _gravar_estado(job)
+    except OSError as e:
+        print(f"⚠️ Erro ao gravar estado da importação {job['id']}: {e}")
+    print(f"⏱️ Importação {job['id']} ({job['tipo']}) abandonada: marcada como erro")
+    return job
+
+def obter_job(job_id):
+    """Retorna o estado do job ou None se não existe/expirou"""
+    if not job_id or not _PADRAO_JOB_ID.match(job_id):
+        return None
+    try:
+        # O estado é regravado a cada lote: a data do arquivo é a do último progresso
+        atualizado_em = os.path.getmtime(_caminho_estado(job_id))
+        with open(_caminho_estado(job_id)) as arquivo:
+            job = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+    return _marcar_se_abandonado(job, atualizado_em)
+
+def listar_jobs(limite=20):
+    """Jobs mais recentes primeiro (para a página de importações)"""
+    try:
+        nomes = [nome for nome in os.listdir(_diretorio_jobs()) if nome.endswith('.json')]
+    except OSError:
+        return []
+
+    jobs = [obter_job(nome[:-5]) for nome in nomes]
+    jobs = [job for job in jobs if job]
+    jobs.sort(key=lambda job: job['criado_em'], reverse=True)
+    return jobs[:limite]
+
+def novo_job_id():
+    """Id do job (a planilha é salva com ele antes de submeter)"""
+    os.makedirs(_diretorio_jobs(), exist_ok=True)
+    return uuid.uuid4().hex
+
+def submeter_importacao(job_id, usuario, tipo, nome_arquivo, simular, planilha=None):
+    """
+    Enfileira a importação da planilha já salva em caminho_planilha(job_id)
+    (ou em planilha, quando uma simulação é confirmada)
+
+    Retorna (job, None) ou (None, mensagem) se a tabela já tem importação em andamento.
+    """
+    importador = IMPORTADORES[tipo]
+    tabela = importador['tabela']
+
+    with _lock:
+        if tabela in _tabelas_em_uso:
+            return None, f"Já existe uma importação de {importador['titulo'].lower()} em andamento"
+        _tabelas_em_uso[tabela] = job_id
+
+    job = {
+        'id': job_id,
+        'usuario': usuario,
+        'tipo': tipo,
+        'titulo': importador['titulo'],
+        'arquivo': nome_arquivo,
+        'planilha': planilha or caminho_planilha(job_id),
+        'simular': simular,
+        'status': STATUS_PENDENTE,
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'concluido_em': None,
+        'mensagem': None,
+        'resultado': None
+    }
+    try:
+        _gravar_estado(job)
+        _obter_executor().submit(_executar_importacao, dict(job), importador['funcao'], tabela)
+    except Exception:
+        # Sem isso a tabela ficaria "em andamento" até o admin reiniciar
+        with _lock:
+            _tabelas_em_uso.pop(tabela, None)
+        raise
+
+    print(f"📥 Importação {job_id} ({tipo}{', simulação' if simular else ''}) enfileirada: {usuario}")
+    return job, None
+
+def _executar_importacao(job, funcao, tabela):
+    inicio = time.time()
+
+    def progresso(resultado):
+        job['resultado'] = resultado
+        try:
+            _gravar_estado(job)
+        except OSError as e:
+            print(f"⚠️ Erro ao gravar progresso da importação {job['id']}: {e}")
+
+    try:
+        job['status'] = STATUS_EXECUTANDO
+        _gravar_estado(job)
+
+        job['resultado'] = funcao(job['planilha'], simular=job['simular'], progresso=progresso)
+        job['status'] = STATUS_CONCLUIDO
+        print(f"✅ Importação {job['id']} ({job['tipo']}) concluída em {time.time() - inicio:.1f}s")
+    except Exception as e:
+        job['status'] = STATUS_ERRO
+        job['mensagem'] = str(e)
+        print(f"❌ Erro na importação {job['id']} ({job['tipo']}): {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        job['concluido_em'] = datetime.now().isoformat(timespec='seconds')
+        try:
+            _gravar_estado(job)
+        except OSError as e:
+            print(f"⚠️ Erro ao gravar estado da importação {job['id']}: {e}")
+        with _lock:
+            _tabelas_em_uso.pop(tabela, None)
+
+def limpar_jobs_expirados():
+    """Remove estado e planilha de importações mais antigas que a expiração"""
+    limite = time.time() - IMPORTACOES_EXPIRACAO_HORAS * 3600
+    removidos = 0
+
+    try:
+        nomes = os.listdir(_diretorio_jobs())
+    except OSError:
+        return 0
+
+    for nome in nomes:
+        caminho = os.path.join(_diretorio_jobs(), nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+                removidos += nome.endswith('.json')
+        except OSError:
+            pass
+
+    if removidos:
+        print(f"🗑️ Removidas {removidos} importação(ões) expirada(s)")
+    return removidos
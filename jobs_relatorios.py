@@ -0,0 +1,229 @@
+"""
+Execução assíncrona de relatórios pesados
+- Os jobs rodam em um pool de threads limitado (por processo do gunicorn)
+- Estado e resultado ficam em disco: qualquer worker responde ao polling
+- Jobs e arquivos expiram após RELATORIOS_JOBS_EXPIRACAO_HORAS
+- Job executando há mais de RELATORIOS_JOBS_TIMEOUT_MINUTOS (ex.: worker
+  reciclado no meio) passa a erro na consulta: o polling não fica esperando
+  para sempre. O tempo na fila não conta
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# Configurações lidas na importação: carregar o .env antes (app.py importa este módulo primeiro)
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(dotenv_path)
+
+# Configurações (via .env)
+JOBS_WORKERS = int(os.getenv('RELATORIOS_JOBS_WORKERS', '2'))
+JOBS_FILA_MAX = int(os.getenv('RELATORIOS_JOBS_FILA_MAX', '10'))
+JOBS_EXPIRACAO_HORAS = float(os.getenv('RELATORIOS_JOBS_EXPIRACAO_HORAS', '24'))
+JOBS_TIMEOUT_MINUTOS = float(os.getenv('RELATORIOS_JOBS_TIMEOUT_MINUTOS', '30'))
+
+# Status possíveis de um job
+STATUS_PENDENTE = 'pendente'
+STATUS_EXECUTANDO = 'executando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+_executor = None
+_lock = threading.Lock()
+_jobs_em_aberto = 0
+_jobs_na_fila = set()  # pendentes no pool deste processo (nunca são abandonados)
+
+_PADRAO_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+def _diretorio_jobs():
+    """Diretório onde ficam estado e resultado dos jobs (configurável via .env)"""
+    return os.getenv('RELATORIOS_JOBS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jobs_relatorios')
+
+def _caminho_estado(job_id):
+    return os.path.join(_diretorio_jobs(), f"{job_id}.json")
+
+def caminho_resultado(job):
+    """Caminho do arquivo de resultado de um job (ou do arquivo pré-gerado que ele aponta)"""
+    # ".resultado": o relatório JSON não pode ter o mesmo nome do estado ({id}.json)
+    return job.get('arquivo') or os.path.join(_diretorio_jobs(), f"{job['id']}.resultado.{job['extensao']}")
+
+def _gravar_estado(job):
+    """Escrita atômica do estado (leitores nunca veem JSON pela metade)"""
+    # pid + thread: o pool e uma consulta (_marcar_se_abandonado) podem gravar ao mesmo tempo
+    temporario = f"{_caminho_estado(job['id'])}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'w') as arquivo:
+        json.dump(job, arquivo, default=str)
+    os.replace(temporario, _caminho_estado(job['id']))
+
+def _obter_executor():
+    """Cria o pool sob demanda (depois do fork do gunicorn)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOBS_WORKERS, thread_name_prefix='job-relatorio')
+    return _executor
+
+def _marcar_se_abandonado(job, atualizado_em):
+    """
+    Job parado há mais de JOBS_TIMEOUT_MINUTOS vira erro
+
+    O processo que o executava pode ter morrido (worker reciclado) sem gravar o
+    fim. O relógio começa na última gravação do estado (a passagem para
+    executando); pendente na fila deste processo nunca é marcado. Se ainda
+    estiver rodando, a gravação final dele prevalece.
+    """
+    if job['status'] not in (STATUS_PENDENTE, STATUS_EXECUTANDO):
+        return job
+
+    with _lock:
+        na_fila = job['id'] in _jobs_na_fila
+    if na_fila or time.time() - atualizado_em < JOBS_TIMEOUT_MINUTOS * 60:
+        return job
+
+    job['status'] = STATUS_ERRO
+    job['mensagem'] = f'O relatório não terminou em {JOBS_TIMEOUT_MINUTOS:.0f} minutos. Tente novamente.'
+    job['concluido_em'] = datetime.now().isoformat(timespec='seconds')
+    try:
+        _gravar_estado(job)
+    except OSError as e:
+        print(f"⚠️ Erro ao gravar estado do job {job['id']}: {e}")
+    print(f"⏱️ Job {job['id']} ({job['tipo']}) abandonado: marcado como erro")
+    return job
+
+def obter_job(job_id):
+    """Retorna o estado do job ou None se não existe/expirou"""
+    if not job_id or not _PADRAO_JOB_ID.match(job_id):
+        return None
+    try:
+        atualizado_em = os.path.getmtime(_caminho_estado(job_id))
+        with open(_caminho_estado(job_id)) as arquivo:
+            job = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+    return _marcar_se_abandonado(job, atualizado_em)
+
+def submeter_job(usuario, tipo, extensao, funcao, *args):
+    """
+    Enfileira um job; funcao(caminho_resultado, *args) grava o arquivo e
+    retorna um dict com informações extras (ex.: total_registros)
+
+    Retorna o job criado, ou None se a fila deste processo está cheia.
+    """
+    global _jobs_em_aberto
+
+    with _lock:
+        if _jobs_em_aberto >= JOBS_FILA_MAX:
+            return None
+        _jobs_em_aberto += 1
+
+    job = {
+        'id': uuid.uuid4().hex,
+        'usuario': usuario,
+        'tipo': tipo,
+        'extensao': extensao,
+        'status': STATUS_PENDENTE,
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'concluido_em': None,
+        'mensagem': None,
+        'info': {}
+    }
+    with _lock:
+        _jobs_na_fila.add(job['id'])
+    try:
+        os.makedirs(_diretorio_jobs(), exist_ok=True)
+        _gravar_estado(job)
+        _obter_executor().submit(_executar_job, dict(job), funcao, args)
+    except Exception:
+        # Sem isso a vaga ficaria ocupada até o processo reiniciar
+        with _lock:
+            _jobs_em_aberto -= 1
+            _jobs_na_fila.discard(job['id'])
+        raise
+
+    print(f"📥 Job {job['id']} ({tipo}) enfileirado: {usuario}")
+    return job
+
+def registrar_job_concluido(usuario, tipo, extensao, arquivo=None, gravar=None, info=None):
+    """
+    Registra um job já concluído, para resultados que já existem (ex.: relatório
+    mensal pré-gerado): o cliente segue o mesmo fluxo de polling e download
+
+    arquivo: resultado fora do diretório de jobs (não é removido na expiração);
+    sem ele, gravar(caminho_resultado) grava o resultado antes do job aparecer.
+    """
+    os.makedirs(_diretorio_jobs(), exist_ok=True)
+    agora = datetime.now().isoformat(timespec='seconds')
+    job = {
+        'id': uuid.uuid4().hex,
+        'usuario': usuario,
+        'tipo': tipo,
+        'extensao': extensao,
+        'arquivo': arquivo,
+        'status': STATUS_CONCLUIDO,
+        'criado_em': agora,
+        'concluido_em': agora,
+        'mensagem': None,
+        'info': info or {}
+    }
+    if gravar:
+        gravar(caminho_resultado(job))
+    _gravar_estado(job)
+    return job
+
+def _executar_job(job, funcao, args):
+    global _jobs_em_aberto
+    inicio = time.time()
+
+    try:
+        job['status'] = STATUS_EXECUTANDO
+        _gravar_estado(job)
+        with _lock:
+            _jobs_na_fila.discard(job['id'])
+
+        job['info'] = funcao(caminho_resultado(job), *args) or {}
+        job['status'] = STATUS_CONCLUIDO
+        print(f"✅ Job {job['id']} ({job['tipo']}) concluído em {time.time() - inicio:.1f}s")
+    except Exception as e:
+        job['status'] = STATUS_ERRO
+        job['mensagem'] = str(e)
+        print(f"❌ Erro no job {job['id']} ({job['tipo']}): {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        job['concluido_em'] = datetime.now().isoformat(timespec='seconds')
+        try:
+            _gravar_estado(job)
+        except OSError as e:
+            print(f"⚠️ Erro ao gravar estado do job {job['id']}: {e}")
+        with _lock:
+            _jobs_em_aberto -= 1
+            _jobs_na_fila.discard(job['id'])
+
+def limpar_jobs_expirados():
+    """Remove estado e resultado de jobs mais antigos que a expiração"""
+    limite = time.time() - JOBS_EXPIRACAO_HORAS * 3600
+    removidos = 0
+
+    try:
+        nomes = os.listdir(_diretorio_jobs())
+    except OSError:
+        return 0
+
+    for nome in nomes:
+        caminho = os.path.join(_diretorio_jobs(), nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+                removidos += nome.endswith('.json') and '.resultado.' not in nome
+        except OSError:
+            pass
+
+    if removidos:
+        print(f"🗑️ Removidos {removidos} job(s) de relatório expirado(s)")
+    return removidos
@@ -0,0 +1,93 @@
+"""
+Normalização vetorizada das colunas das planilhas de importação
+- Cada função recebe uma coluna (Series) inteira e devolve outra: as
+  operações rodam nos métodos .str / to_numeric do pandas, sem apply por linha
+- Aceita colunas de dtype object (lotes da leitura em streaming): cada
+  célula é tratada pelo próprio tipo, não pelo tipo inferido para a coluna
+- Valores ausentes ficam como <NA> (dtypes 'string', 'Int64', 'Float64');
+  registros() converte para tuplas Python com None, prontas para o execute_values
+- Usado por importar_clientes, importar_funcionarios, importar_grupo_tarefas
+  e importar_tarefas_colaborador
+"""
+
+import numpy as np
+import pandas as pd
+
+# Níveis aceitos na tabela funcionarios (fora da lista vira o padrão)
+NIVEIS_VALIDOS = ['funcionario', 'coordenador', 'supervisor', 'socio', 'prestador de servico', 'admin']
+NIVEL_PADRAO = 'funcionario'
+
+# Valores considerados verdadeiros na coluna "ativo"
+VALORES_VERDADEIROS = ['sim', 'yes', 's', 'y', 'true', '1', 'ativo']
+
+def _celulas_numericas(serie):
+    """Valor numérico das células e máscara das que são número de verdade (não texto)"""
+    numeros = pd.to_numeric(serie, errors='coerce')
+    e_numero = numeros.notna()
+    if serie.dtype == object:
+        # Texto ("12.345.678/0001-90", "1.1") segue como texto, mesmo que pareça número
+        e_numero &= ~serie.map(type).eq(str)
+    return numeros, e_numero
+
+def texto(serie):
+    """Texto sem espaços nas pontas (ausente → <NA>)"""
+    return serie.astype('string').str.strip()
+
+def cnpj_cpf(serie):
+    """
+    Só os dígitos do CNPJ/CPF, completados com zeros
+    - Até 11 dígitos → CPF (11); 12 a 14 → CNPJ (14); mais de 14 → inválido
+    - Células numéricas (o Excel guarda CNPJ como número, às vezes em notação
+      científica) são convertidas pelo valor inteiro, não pelo texto "1.23e+13"
+    - Vazio, "-" ou sem dígitos → <NA>
+    """
+    numeros, e_numero = _celulas_numericas(serie)
+
+    digitos = serie.astype('string').str.replace(r'\D', '', regex=True)
+    digitos = digitos.mask(e_numero, numeros.round().astype('Int64').astype('string'))
+
+    tamanho = digitos.str.len().fillna(0)
+    normalizado = pd.Series(pd.NA, index=serie.index, dtype='string')
+    normalizado = normalizado.mask((tamanho > 0) & (tamanho <= 11), digitos.str.zfill(11))
+    normalizado = normalizado.mask((tamanho > 11) & (tamanho <= 14), digitos.str.zfill(14))
+
+    longos = serie[tamanho > 14]
+    if len(longos):
+        print(f"⚠️ {len(longos)} CNPJ/CPF com mais de 14 dígitos ignorado(s): {', '.join(map(str, longos.head(5)))}")
+
+    return normalizado
+
+def codigo_grupo_tarefa(serie):
+    """
+    Código do grupo como texto; células numéricas viram "1.10" (2 casas, como
+    no cadastro), inclusive as inteiras: o Excel grava 2,00 como 2
+    """
+    numeros, e_numero = _celulas_numericas(serie)
+
+    codigo = texto(serie)
+    if e_numero.any():
+        codigo[e_numero] = np.char.mod('%.2f', numeros[e_numero].to_numpy(dtype=float))
+    return codigo
+
+def decimal(serie):
+    """Número decimal (texto que não é número → <NA>)"""
+    return pd.to_numeric(serie, errors='coerce').astype('Float64')
+
+def inteiro(serie):
+    """Número inteiro, truncando decimais (texto que não é número → <NA>)"""
+    return np.trunc(pd.to_numeric(serie, errors='coerce')).astype('Int64')
+
+def nivel(serie):
+    """Nível em minúsculas; vazio ou desconhecido → NIVEL_PADRAO"""
+    normalizado = texto(serie).str.lower()
+    return normalizado.where(normalizado.isin(NIVEIS_VALIDOS), NIVEL_PADRAO).astype('string')
+
+def ativo(serie):
+    """Sim/não → bool; célula vazia conta como ativo"""
+    normalizado = texto(serie).str.lower()
+    return (normalizado.isin(VALORES_VERDADEIROS) | serie.isna()).astype(bool)
+
+def registros(df, colunas):
+    """Linhas do DataFrame como tuplas Python (<NA>/NaN → None), na ordem das colunas"""
+    selecao = df[list(colunas)].astype(object)
+    return list(selecao.where(df[list(colunas)].notna(), None).itertuples(index=False, name=None))
@@ -0,0 +1,148 @@
+"""
+Relatórios mensais pré-gerados (mês fechado)
+- gerar_relatorios_mensais.py grava, por escopo de acesso, o JSON do relatório
+  de tempo e o xlsx de cada mês fechado
+- app.py serve esses arquivos quando os filtros batem com um escopo pré-gerado
+- Lançamentos atrasados incrementam a versão do mês (versoes_cache); arquivo
+  gerado com versão antiga é ignorado até a próxima geração
+- O arquivo guarda a assinatura dos usuários permitidos do escopo: mudou a
+  equipe (nome_gestor, ativo...), ele é ignorado e o relatório é calculado na hora
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from versoes_cache import obter_versao, incrementar_versao
+
+FUSO_RELATORIOS = ZoneInfo('America/Sao_Paulo')
+
+# Níveis que enxergam a firma inteira / só a própria equipe (ver get_usuarios_permitidos)
+NIVEIS_FIRMA = ('admin', 'socio')
+NIVEIS_GESTOR = ('coordenador', 'supervisor')
+
+def _diretorio_relatorios():
+    """Diretório dos relatórios pré-gerados (configurável via .env)"""
+    return os.getenv('RELATORIOS_MENSAIS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.relatorios_mensais')
+
+def versao_mes(ano, mes):
+    """Nome da versão (versoes_cache) que invalida os relatórios do mês"""
+    return f"relatorio_mensal_{ano}_{mes:02d}"
+
+def _vazio(valor):
+    return not valor or valor == 'Todos'
+
+def mes_fechado(ano, mes):
+    """True se o mês já terminou (no fuso dos apontamentos)"""
+    hoje = datetime.now(FUSO_RELATORIOS)
+    return (ano, mes) < (hoje.year, hoje.month)
+
+def escopo_firma():
+    return 'firma'
+
+def escopo_departamento(departamento):
+    return f"departamento:{departamento}"
+
+def escopo_gestor(usuario):
+    return f"gestor:{usuario}"
+
+def escopo_relatorio_mensal(filtros, usuario, nivel):
+    """
+    Retorna (ano, mes, escopo) se os filtros correspondem a um relatório
+    pré-gerado, ou None se o relatório precisa ser calculado
+    """
+    try:
+        ano, mes = int(filtros.get('ano')), int(filtros.get('mes'))
+    except (TypeError, ValueError):
+        return None
+
+    if not 1 <= mes <= 12 or not mes_fechado(ano, mes):
+        return None
+
+    if not (_vazio(filtros.get('funcionario')) and _vazio(filtros.get('grupo')) and _vazio(filtros.get('tarefa'))):
+        return None
+
+    departamento = filtros.get('departamento')
+
+    if nivel in NIVEIS_FIRMA:
+        escopo = escopo_firma() if _vazio(departamento) else escopo_departamento(departamento)
+    elif nivel in NIVEIS_GESTOR and _vazio(departamento):
+        escopo = escopo_gestor(usuario)
+    else:
+        return None
+
+    return ano, mes, escopo
+
+def _caminho_base(ano, mes, escopo):
+    # Escopo pode conter qualquer caractere (nome de departamento): usa hash no nome do arquivo
+    nome = hashlib.sha1(escopo.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(_diretorio_relatorios(), f"{ano}-{mes:02d}", nome)
+
+def assinatura_usuarios(usuarios_permitidos):
+    """Hash do conjunto de usuários permitidos (a ordem não importa)"""
+    return hashlib.sha1('\n'.join(sorted(set(usuarios_permitidos))).encode('utf-8')).hexdigest()
+
+def obter_relatorio_mensal(ano, mes, escopo, usuarios_permitidos):
+    """
+    Retorna (dados, caminho_xlsx) do relatório pré-gerado, ou None se não
+    existe, foi invalidado por lançamento atrasado ou foi gerado para outro
+    conjunto de usuários permitidos (equipe mudou desde a geração)
+    """
+    base = _caminho_base(ano, mes, escopo)
+    try:
+        with open(f"{base}.json") as arquivo:
+            relatorio = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+    if relatorio.get('escopo') != escopo or relatorio.get('versao_mes') != obter_versao(versao_mes(ano, mes)):
+        return None
+
+    if relatorio.get('usuarios') != assinatura_usuarios(usuarios_permitidos):
+        return None
+
+    caminho_xlsx = f"{base}.xlsx"
+    return relatorio['dados'], (caminho_xlsx if os.path.exists(caminho_xlsx) else None)
+
+def relatorio_mensal_atualizado(ano, mes, escopo, usuarios_permitidos):
+    """True se o escopo já tem relatório válido para a versão atual do mês e a equipe atual"""
+    return obter_relatorio_mensal(ano, mes, escopo, usuarios_permitidos) is not None
+
+def caminhos_relatorio_mensal(ano, mes, escopo):
+    """Caminhos (json, xlsx) onde o gerador grava o relatório do escopo"""
+    base = _caminho_base(ano, mes, escopo)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    return f"{base}.json", f"{base}.xlsx"
+
+def gravar_relatorio_mensal(caminho_json, ano, mes, escopo, versao, usuarios_permitidos, dados):
+    """Grava o JSON (por último: só fica visível depois do xlsx pronto)"""
+    temporario = f"{caminho_json}.{os.getpid()}.tmp"
+    with open(temporario, 'w') as arquivo:
+        json.dump({
+            'escopo': escopo,
+            'versao_mes': versao,
+            'usuarios': assinatura_usuarios(usuarios_permitidos),
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'dados': dados
+        }, arquivo)
+    os.replace(temporario, caminho_json)
+
+def invalidar_relatorios_mensais(datas_inicio):
+    """
+    Invalida os relatórios pré-gerados dos meses fechados afetados
+    (datas naive são consideradas no fuso America/Sao_Paulo)
+    """
+    meses = set()
+    for data in datas_inicio:
+        if isinstance(data, str):
+            data = datetime.fromisoformat(data)
+        if data.tzinfo is not None:
+            data = data.astimezone(FUSO_RELATORIOS)
+        if mes_fechado(data.year, data.month):
+            meses.add((data.year, data.month))
+
+    for ano, mes in sorted(meses):
+        incrementar_versao(versao_mes(ano, mes))
+        print(f"♻️ Relatório pré-gerado de {mes:02d}/{ano} invalidado (lançamento atrasado)")
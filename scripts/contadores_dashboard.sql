@@ -0,0 +1,173 @@
+-- =====================================================
+-- CONTADORES DO DASHBOARD DO ADMIN
+-- Totais mantidos por triggers (nível de comando, com tabelas de transição):
+-- qualquer caminho de escrita (admin, importadores, SQL manual) atualiza o
+-- contador, e o dashboard lê uma única tabela pequena em vez de COUNT(*)
+--
+-- Executar (também recalibra os totais se rodar de novo):
+--   psql -h HOST -U USER -d DATABASE -f scripts/contadores_dashboard.sql
+-- =====================================================
+
+SET search_path = apontador_horas, public;
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS contadores_dashboard (
+    nome VARCHAR(30) PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- =====================================================
+-- FUNÇÕES DOS TRIGGERS
+-- TG_ARGV[0] = nome do contador
+-- =====================================================
+
+-- Conta todas as linhas (clientes, tarefas, grupos)
+CREATE OR REPLACE FUNCTION contador_dashboard_linhas()
+RETURNS TRIGGER AS $$
+DECLARE
+    delta BIGINT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT COUNT(*) INTO delta FROM novas;
+    ELSE
+        SELECT -COUNT(*) INTO delta FROM antigas;
+    END IF;
+
+    IF delta <> 0 THEN
+        UPDATE contadores_dashboard
+        SET total = total + delta, atualizado_em = NOW()
+        WHERE nome = TG_ARGV[0];
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Conta só funcionários ativos (UPDATE também muda o total ao ativar/desativar)
+CREATE OR REPLACE FUNCTION contador_dashboard_usuarios_ativos()
+RETURNS TRIGGER AS $$
+DECLARE
+    entraram BIGINT := 0;
+    sairam BIGINT := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COUNT(*) INTO entraram FROM novas WHERE ativo;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COUNT(*) INTO sairam FROM antigas WHERE ativo;
+    END IF;
+
+    IF entraram <> sairam THEN
+        UPDATE contadores_dashboard
+        SET total = total + entraram - sairam, atualizado_em = NOW()
+        WHERE nome = TG_ARGV[0];
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION contador_dashboard_zerar()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE contadores_dashboard
+    SET total = 0, atualizado_em = NOW()
+    WHERE nome = TG_ARGV[0];
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- TRIGGERS (um por evento: tabelas de transição exigem evento único)
+-- =====================================================
+
+-- Clientes
+DROP TRIGGER IF EXISTS trg_contador_clientes_insert ON clientes;
+CREATE TRIGGER trg_contador_clientes_insert
+    AFTER INSERT ON clientes REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_linhas('clientes');
+
+DROP TRIGGER IF EXISTS trg_contador_clientes_delete ON clientes;
+CREATE TRIGGER trg_contador_clientes_delete
+    AFTER DELETE ON clientes REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_linhas('clientes');
+
+DROP TRIGGER IF EXISTS trg_contador_clientes_truncate ON clientes;
+CREATE TRIGGER trg_contador_clientes_truncate
+    AFTER TRUNCATE ON clientes
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_zerar('clientes');
+
+-- Tarefas
+DROP TRIGGER IF EXISTS trg_contador_tarefas_insert ON tarefas_colaborador;
+CREATE TRIGGER trg_contador_tarefas_insert
+    AFTER INSERT ON tarefas_colaborador REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_linhas('tarefas');
+
+DROP TRIGGER IF EXISTS trg_contador_tarefas_delete ON tarefas_colaborador;
+CREATE TRIGGER trg_contador_tarefas_delete
+    AFTER DELETE ON tarefas_colaborador REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_linhas('tarefas');
+
+DROP TRIGGER IF EXISTS trg_contador_tarefas_truncate ON tarefas_colaborador;
+CREATE TRIGGER trg_contador_tarefas_truncate
+    AFTER TRUNCATE ON tarefas_colaborador
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_zerar('tarefas');
+
+-- Grupos de tarefas
+DROP TRIGGER IF EXISTS trg_contador_grupos_insert ON grupo_tarefas;
+CREATE TRIGGER trg_contador_grupos_insert
+    AFTER INSERT ON grupo_tarefas REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_linhas('grupos');
+
+DROP TRIGGER IF EXISTS trg_contador_grupos_delete ON grupo_tarefas;
+CREATE TRIGGER trg_contador_grupos_delete
+    AFTER DELETE ON grupo_tarefas REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_linhas('grupos');
+
+DROP TRIGGER IF EXISTS trg_contador_grupos_truncate ON grupo_tarefas;
+CREATE TRIGGER trg_contador_grupos_truncate
+    AFTER TRUNCATE ON grupo_tarefas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_zerar('grupos');
+
+-- Usuários ativos
+DROP TRIGGER IF EXISTS trg_contador_usuarios_insert ON funcionarios;
+CREATE TRIGGER trg_contador_usuarios_insert
+    AFTER INSERT ON funcionarios REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_usuarios_ativos('usuarios');
+
+DROP TRIGGER IF EXISTS trg_contador_usuarios_update ON funcionarios;
+CREATE TRIGGER trg_contador_usuarios_update
+    AFTER UPDATE ON funcionarios REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_usuarios_ativos('usuarios');
+
+DROP TRIGGER IF EXISTS trg_contador_usuarios_delete ON funcionarios;
+CREATE TRIGGER trg_contador_usuarios_delete
+    AFTER DELETE ON funcionarios REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_usuarios_ativos('usuarios');
+
+DROP TRIGGER IF EXISTS trg_contador_usuarios_truncate ON funcionarios;
+CREATE TRIGGER trg_contador_usuarios_truncate
+    AFTER TRUNCATE ON funcionarios
+    FOR EACH STATEMENT EXECUTE FUNCTION contador_dashboard_zerar('usuarios');
+
+-- =====================================================
+-- CARGA INICIAL / RECALIBRAÇÃO
+-- Dentro da mesma transação dos triggers: LOCK evita escritas entre a
+-- contagem e a gravação
+-- =====================================================
+LOCK TABLE funcionarios, clientes, tarefas_colaborador, grupo_tarefas IN SHARE MODE;
+
+INSERT INTO contadores_dashboard (nome, total)
+VALUES
+    ('usuarios', (SELECT COUNT(*) FROM funcionarios WHERE ativo)),
+    ('clientes', (SELECT COUNT(*) FROM clientes)),
+    ('tarefas', (SELECT COUNT(*) FROM tarefas_colaborador)),
+    ('grupos', (SELECT COUNT(*) FROM grupo_tarefas))
+ON CONFLICT (nome) DO UPDATE
+SET total = EXCLUDED.total, atualizado_em = NOW();
+
+COMMIT;
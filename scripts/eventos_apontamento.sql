@@ -0,0 +1,151 @@
+-- =====================================================
+-- LINHA DO TEMPO DOS APONTAMENTOS (append-only)
+-- Cada transição (inicio/pausa/retomada/finalizacao) vira um INSERT em
+-- eventos_apontamento. O trigger aplica a transição em apontamentos_horas
+-- e pausas, mantendo o estado atual que o resto do sistema já consulta.
+--
+-- Executar (uma vez, antes de subir a versão do app que grava eventos):
+--   psql -h HOST -U USER -d DATABASE -f scripts/eventos_apontamento.sql
+-- =====================================================
+
+SET search_path = apontador_horas, public;
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS eventos_apontamento (
+    id BIGSERIAL PRIMARY KEY,
+    apontamento_id INTEGER NOT NULL REFERENCES apontamentos_horas(id) ON DELETE CASCADE,
+    tipo VARCHAR(20) NOT NULL CHECK (tipo IN ('inicio', 'pausa', 'retomada', 'finalizacao')),
+    ocorrido_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_eventos_apontamento_linha_tempo
+    ON eventos_apontamento (apontamento_id, ocorrido_em, id);
+
+-- =====================================================
+-- CARGA INICIAL: reconstruir a linha do tempo do histórico existente
+-- (antes de criar os triggers, para não reaplicar transições)
+-- =====================================================
+INSERT INTO eventos_apontamento (apontamento_id, tipo, ocorrido_em)
+SELECT id, 'inicio', data_inicio
+FROM apontamentos_horas
+WHERE NOT EXISTS (SELECT 1 FROM eventos_apontamento);
+
+INSERT INTO eventos_apontamento (apontamento_id, tipo, ocorrido_em)
+SELECT p.apontamento_id, 'pausa', p.data_pausa
+FROM pausas p
+WHERE NOT EXISTS (SELECT 1 FROM eventos_apontamento e WHERE e.tipo = 'pausa');
+
+INSERT INTO eventos_apontamento (apontamento_id, tipo, ocorrido_em)
+SELECT p.apontamento_id, 'retomada', p.data_retomada
+FROM pausas p
+INNER JOIN apontamentos_horas a ON a.id = p.apontamento_id
+WHERE p.data_retomada IS NOT NULL
+  -- Pausa fechada pela finalização não é uma retomada
+  AND p.data_retomada IS DISTINCT FROM a.data_fim
+  AND NOT EXISTS (SELECT 1 FROM eventos_apontamento e WHERE e.tipo = 'retomada');
+
+INSERT INTO eventos_apontamento (apontamento_id, tipo, ocorrido_em)
+SELECT id, 'finalizacao', data_fim
+FROM apontamentos_horas
+WHERE data_fim IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM eventos_apontamento e WHERE e.tipo = 'finalizacao');
+
+-- =====================================================
+-- TRIGGER: aplica o evento no estado atual
+-- Transição inválida (ex.: pausar tarefa já pausada) gera erro e o
+-- evento não é gravado
+-- =====================================================
+CREATE OR REPLACE FUNCTION aplicar_evento_apontamento()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Eventos gerados por registrar_inicio_apontamento() apenas registram
+    -- um estado que já foi gravado em apontamentos_horas
+    IF pg_trigger_depth() > 1 OR NEW.tipo = 'inicio' THEN
+        RETURN NEW;
+    END IF;
+
+    IF NEW.tipo = 'pausa' THEN
+        UPDATE apontamentos_horas
+        SET status = 'pausado', atualizado_em = NEW.ocorrido_em
+        WHERE id = NEW.apontamento_id AND status = 'em_andamento';
+
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Tarefa % não pode ser pausada', NEW.apontamento_id
+                USING ERRCODE = 'check_violation';
+        END IF;
+
+        INSERT INTO pausas (apontamento_id, data_pausa)
+        VALUES (NEW.apontamento_id, NEW.ocorrido_em);
+
+    ELSIF NEW.tipo = 'retomada' THEN
+        UPDATE apontamentos_horas
+        SET status = 'em_andamento', atualizado_em = NEW.ocorrido_em
+        WHERE id = NEW.apontamento_id AND status = 'pausado';
+
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Tarefa % não está pausada', NEW.apontamento_id
+                USING ERRCODE = 'check_violation';
+        END IF;
+
+        UPDATE pausas
+        SET data_retomada = NEW.ocorrido_em
+        WHERE apontamento_id = NEW.apontamento_id AND data_retomada IS NULL;
+
+    ELSIF NEW.tipo = 'finalizacao' THEN
+        UPDATE apontamentos_horas
+        SET data_fim = NEW.ocorrido_em,
+            status = 'finalizado',
+            atualizado_em = NEW.ocorrido_em
+        WHERE id = NEW.apontamento_id AND status IN ('em_andamento', 'pausado');
+
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Tarefa % já finalizada', NEW.apontamento_id
+                USING ERRCODE = 'check_violation';
+        END IF;
+
+        UPDATE pausas
+        SET data_retomada = NEW.ocorrido_em
+        WHERE apontamento_id = NEW.apontamento_id AND data_retomada IS NULL;
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_aplicar_evento_apontamento ON eventos_apontamento;
+CREATE TRIGGER trg_aplicar_evento_apontamento
+    BEFORE INSERT ON eventos_apontamento
+    FOR EACH ROW EXECUTE FUNCTION aplicar_evento_apontamento();
+
+-- =====================================================
+-- TRIGGER: novos apontamentos (iniciados ou atrasados) entram na linha do tempo
+-- =====================================================
+CREATE OR REPLACE FUNCTION registrar_inicio_apontamento()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO eventos_apontamento (apontamento_id, tipo, ocorrido_em)
+    VALUES (NEW.id, 'inicio', NEW.data_inicio);
+
+    -- Apontamento atrasado já nasce finalizado
+    IF NEW.data_fim IS NOT NULL THEN
+        INSERT INTO eventos_apontamento (apontamento_id, tipo, ocorrido_em)
+        VALUES (NEW.id, 'finalizacao', NEW.data_fim);
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_registrar_inicio_apontamento ON apontamentos_horas;
+CREATE TRIGGER trg_registrar_inicio_apontamento
+    AFTER INSERT ON apontamentos_horas
+    FOR EACH ROW EXECUTE FUNCTION registrar_inicio_apontamento();
+
+COMMIT;
+
+-- Linha do tempo de um apontamento (auditoria):
+-- SELECT tipo, ocorrido_em AT TIME ZONE 'America/Sao_Paulo'
+-- FROM eventos_apontamento
+-- WHERE apontamento_id = 123
+-- ORDER BY ocorrido_em, id;
@@ -0,0 +1,46 @@
+-- =====================================================
+-- DETECÇÃO DE SOBREPOSIÇÃO DE APONTAMENTOS
+-- Índice GiST sobre o intervalo (data_inicio, data_fim) por funcionário
+-- Usado por /api/verificar-sobreposicao (app.py)
+--
+-- Executar:
+--   psql -h HOST -U USER -d DATABASE -f scripts/indice_sobreposicao_apontamentos.sql
+-- =====================================================
+
+SET search_path = apontador_horas, public;
+
+-- Permite combinar funcionario_id (igualdade) com o intervalo no mesmo índice GiST
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- data_fim NULL (tarefa em andamento/pausada) vira intervalo aberto até o infinito.
+-- data_inicio/data_fim são TIMESTAMP sem fuso: tsrange (IMMUTABLE) e não tstzrange,
+-- cuja conversão depende do TimeZone da sessão e não pode ser indexada.
+-- Linhas com data_fim < data_inicio ficam de fora (tsrange levanta erro nelas).
+-- Expressão e WHERE devem ser IDÊNTICOS aos da consulta em buscar_sobreposicoes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_apontamentos_funcionario_periodo
+    ON apontamentos_horas
+    USING gist (funcionario_id, tsrange(data_inicio, data_fim))
+    WHERE data_fim IS NULL OR data_fim >= data_inicio;
+
+-- =====================================================
+-- OPCIONAL: impedir sobreposição no banco
+-- ⚠️ O app permite várias tarefas simultâneas (multi-tarefa). Só ative se a
+-- política mudar para "um apontamento por vez". Falha se já existirem
+-- sobreposições - liste-as antes com a consulta abaixo.
+-- =====================================================
+
+-- SELECT a.funcionario_id, a.id, b.id
+-- FROM apontamentos_horas a
+-- JOIN apontamentos_horas b
+--   ON a.funcionario_id = b.funcionario_id
+--  AND a.id < b.id
+--  AND (a.data_fim IS NULL OR a.data_fim >= a.data_inicio)
+--  AND (b.data_fim IS NULL OR b.data_fim >= b.data_inicio)
+--  AND tsrange(a.data_inicio, a.data_fim) && tsrange(b.data_inicio, b.data_fim);
+
+-- ALTER TABLE apontamentos_horas
+--     ADD CONSTRAINT apontamentos_sem_sobreposicao
+--     EXCLUDE USING gist (
+--         funcionario_id WITH =,
+--         tsrange(data_inicio, data_fim) WITH &&
+--     ) WHERE (data_fim IS NULL OR data_fim >= data_inicio);
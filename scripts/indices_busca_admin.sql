@@ -0,0 +1,33 @@
+-- =====================================================
+-- BUSCA DOS CAMPOS COM AUTOCOMPLETAR DO ADMIN
+-- Atende /api/opcoes/<tipo> (admin_app.py): ILIKE '%termo%' usa os índices
+-- trigram; prefixo de CNPJ/CPF e de código usa os índices text_pattern_ops
+--
+-- Executar:
+--   psql -h HOST -U USER -d DATABASE -f scripts/indices_busca_admin.sql
+-- =====================================================
+
+SET search_path = apontador_horas, public;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Clientes: nome (contém) e CNPJ/CPF (prefixo)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clientes_nome_trgm
+    ON clientes USING gin (nom_cliente gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clientes_documento_prefixo
+    ON clientes (num_cnpj_cpf text_pattern_ops);
+
+-- Colaboradores: nome e usuário
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_funcionarios_nome_trgm
+    ON funcionarios USING gin (nome_completo gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_funcionarios_usuario_trgm
+    ON funcionarios USING gin (usuario gin_trgm_ops);
+
+-- Grupos de tarefa: código e nome
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_grupo_tarefas_codigo_trgm
+    ON grupo_tarefas USING gin (cod_grupo_tarefa gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_grupo_tarefas_nome_trgm
+    ON grupo_tarefas USING gin (nome_grupo_tarefa gin_trgm_ops);
@@ -0,0 +1,31 @@
+-- =====================================================
+-- PAGINAÇÃO DAS LISTAGENS DO ADMIN (keyset)
+-- Índices na mesma ordem usada por paginar_listagem (admin_app.py):
+-- cada página lê só as linhas seguintes ao cursor, sem ordenar a tabela
+--
+-- Executar:
+--   psql -h HOST -U USER -d DATABASE -f scripts/indices_paginacao_admin.sql
+-- =====================================================
+
+SET search_path = apontador_horas, public;
+
+-- As expressões devem ser IDÊNTICAS às do ORDER BY: COALESCE(coluna, '')
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_funcionarios_paginacao
+    ON funcionarios (COALESCE(nome_completo, ''), id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clientes_paginacao
+    ON clientes (COALESCE(nom_cliente, ''), id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_grupo_tarefas_paginacao
+    ON grupo_tarefas (COALESCE(departamento, ''), cod_grupo_tarefa);
+
+-- Tarefas são ordenadas pelo nome do cliente (JOIN): o índice abaixo atende
+-- o JOIN por CNPJ e a ordem dentro de cada cliente
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tarefas_colaborador_cliente_nome
+    ON tarefas_colaborador (cnpj_cpf, COALESCE(nome_tarefa, ''), id);
+
+-- reltuples (total estimado) é atualizado pelo autovacuum/ANALYZE
+ANALYZE funcionarios;
+ANALYZE clientes;
+ANALYZE grupo_tarefas;
+ANALYZE tarefas_colaborador;
@@ -0,0 +1,129 @@
+"""
+Verificação do cliente do n8n (cliente_n8n.py) contra um webhook falso local
+- Várias chamadas reaproveitam a mesma conexão TCP (keep-alive)
+- Falha de conexão é repetida (N8N_TENTATIVAS novas tentativas)
+- Falha de leitura (mensagem já enviada) NÃO é repetida
+
+Não precisa do n8n nem do banco. Executar na raiz do projeto:
+    python scripts/verificar_cliente_n8n.py
+Termina com código 1 se alguma verificação falhar.
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TENTATIVAS = 2
+TIMEOUT_LEITURA = 0.5
+
+class WebhookFalso(BaseHTTPRequestHandler):
+    """Responde {"output": "ok"}; em /lento segura a resposta além do timeout de leitura"""
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    portas_cliente = []
+    chamadas_lentas = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if self.path == '/lento':
+            WebhookFalso.chamadas_lentas += 1
+            time.sleep(TIMEOUT_LEITURA * 3)
+        else:
+            WebhookFalso.portas_cliente.append(self.client_address[1])
+
+        corpo = b'{"output": "ok"}'
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+        except OSError:
+            pass  # cliente já desistiu (timeout de leitura)
+
+    def log_message(self, *args):
+        pass
+
+def porta_fechada():
+    """Porta local sem ninguém escutando (conexão recusada)"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def main():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), WebhookFalso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url_base = f"http://127.0.0.1:{servidor.server_port}"
+
+    # Configuração antes de importar o cliente (lida na importação)
+    os.environ.update({
+        'N8N_WEBHOOK_URL': f"{url_base}/chat",
+        'N8N_TENTATIVAS': str(TENTATIVAS),
+        'N8N_BACKOFF': '0',
+        'N8N_TIMEOUT_CONEXAO': '1',
+        'N8N_TIMEOUT_LEITURA': str(TIMEOUT_LEITURA),
+        'N8N_CIRCUITO_FALHAS': '100'
+    })
+
+    import requests
+    import urllib3.connection
+    import cliente_n8n
+
+    falhas = []
+
+    def verificar(condicao, mensagem):
+        print(f"{'✅' if condicao else '❌'} {mensagem}")
+        if not condicao:
+            falhas.append(mensagem)
+
+    # 1. Keep-alive: 4 chamadas, uma conexão
+    for _ in range(4):
+        cliente_n8n.enviar_webhook({'chatInput': 'oi'}).close()
+    portas = set(WebhookFalso.portas_cliente)
+    verificar(len(WebhookFalso.portas_cliente) == 4 and len(portas) == 1,
+              f"4 chamadas usaram {len(portas)} conexão(ões) TCP (esperado: 1)")
+
+    # 2. Falha de conexão: tentativa original + TENTATIVAS novas
+    conexoes = []
+    new_conn_original = urllib3.connection.HTTPConnection._new_conn
+
+    def new_conn_contando(self):
+        conexoes.append(self.port)
+        return new_conn_original(self)
+
+    urllib3.connection.HTTPConnection._new_conn = new_conn_contando
+    cliente_n8n.N8N_WEBHOOK_URL = f"http://127.0.0.1:{porta_fechada()}/chat"
+    try:
+        cliente_n8n.enviar_webhook({'chatInput': 'oi'})
+        verificar(False, "porta fechada deveria levantar ConnectionError")
+    except requests.exceptions.ConnectionError:
+        verificar(len(conexoes) == TENTATIVAS + 1,
+                  f"conexão recusada tentada {len(conexoes)} vez(es) (esperado: {TENTATIVAS + 1})")
+    finally:
+        urllib3.connection.HTTPConnection._new_conn = new_conn_original
+
+    # 3. Falha de leitura: o POST chegou ao n8n, não pode ser repetido
+    cliente_n8n.N8N_WEBHOOK_URL = f"{url_base}/lento"
+    try:
+        cliente_n8n.enviar_webhook({'chatInput': 'oi'})
+        verificar(False, "resposta lenta deveria levantar ReadTimeout")
+    except requests.exceptions.RequestException:
+        # ReadTimeout; se a leitura fosse repetida, viria como ConnectionError (MaxRetryError)
+        verificar(WebhookFalso.chamadas_lentas == 1,
+                  f"timeout de leitura enviou {WebhookFalso.chamadas_lentas} POST(s) (esperado: 1)")
+
+    servidor.shutdown()
+
+    if falhas:
+        print(f"\n❌ {len(falhas)} verificação(ões) falharam")
+        sys.exit(1)
+    print("\n✅ Cliente do n8n OK")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+// ========================================
+// CAMPOS COM AUTOCOMPLETAR (admin)
+// ========================================
+// Um <input class="busca-opcoes" data-opcoes="clientes" data-alvo="id_do_select">
+// busca em /api/opcoes/<tipo> enquanto o usuário digita e preenche o <select>
+// alvo, que continua sendo o campo enviado no formulário.
+// data-valor="nome" usa o nome (em vez do código) como valor das opções.
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('.busca-opcoes').forEach(configurarBuscaOpcoes);
+});
+
+function configurarBuscaOpcoes(input) {
+    const select = document.getElementById(input.dataset.alvo);
+    let temporizador = null;
+    let ultimaBusca = null;
+    
+    const buscar = async () => {
+        const termo = input.value.trim();
+        if (termo === ultimaBusca) return;
+        ultimaBusca = termo;
+        
+        try {
+            const response = await fetch(`/api/opcoes/${input.dataset.opcoes}?q=${encodeURIComponent(termo)}`);
+            const data = await response.json();
+            
+            // Resposta atrasada de uma busca anterior: ignora
+            if (!data.success || termo !== ultimaBusca) return;
+            
+            preencherOpcoes(select, data.opcoes, input.dataset.valor || 'valor');
+        } catch (error) {
+            console.error('Erro ao buscar opções:', error);
+        }
+    };
+    
+    input.addEventListener('input', () => {
+        clearTimeout(temporizador);
+        temporizador = setTimeout(buscar, 250);
+    });
+    
+    // Primeiro foco: mostra as primeiras opções sem precisar digitar
+    input.addEventListener('focus', buscar, { once: true });
+}
+
+function preencherOpcoes(select, opcoes, campoValor) {
+    const selecionada = select.options[select.selectedIndex];
+    const valorAtual = select.value;
+    
+    // Mantém a opção vazia ("Selecione...") e a seleção atual
+    const vazia = select.querySelector('option[value=""]');
+    select.innerHTML = '';
+    if (vazia) select.appendChild(vazia);
+    if (valorAtual && !opcoes.some(o => o[campoValor] === valorAtual)) {
+        select.appendChild(selecionada);
+    }
+    
+    opcoes.forEach(opcao => {
+        const option = document.createElement('option');
+        option.value = opcao[campoValor];
+        option.textContent = opcao.texto;
+        option.selected = opcao[campoValor] === valorAtual;
+        select.appendChild(option);
+    });
+    
+    // Um único resultado novo: já seleciona
+    if (!valorAtual && opcoes.length === 1) {
+        select.value = opcoes[0][campoValor];
+    }
+}
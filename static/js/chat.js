@@ -103,6 +103,8 @@ function adicionarMensagem(texto, tipo, tempo = new Date()) {
     
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    return p;
 }
 
 function formatarHora(data) {
@@ -161,6 +163,7 @@ async function buscarClientes(query) {
 
 function mostrarResultadosClientes(clientes) {
     clientResults.innerHTML = '';
+    clientResults.dataset.modo = 'clientes';
     
     if (clientes.length === 0) {
         clientResults.innerHTML = '<div class="no-results">Nenhum cliente encontrado</div>';
@@ -196,7 +199,7 @@ function selecionarCliente(cliente) {
     clientSearch.value = '';
     clientResults.classList.remove('show');
     
-    carregarTarefasCliente(cliente.num_cnpj_cpf);
+    return carregarTarefasCliente(cliente.num_cnpj_cpf);
 }
 
 clearClientBtn.addEventListener('click', () => {
@@ -270,6 +273,106 @@ taskSelect.addEventListener('change', function() {
     btnStartTask.disabled = !this.value;
 });
 
+// ========================================
+// MINHAS TAREFAS (LISTA PAGINADA)
+// ========================================
+const TAMANHO_PAGINA_TAREFAS = 50;
+let minhasTarefasCursor = null;
+let minhasTarefasCarregando = false;
+let minhasTarefasFim = false;
+
+// Campo de busca vazio: mostrar todas as tarefas do usuário
+clientSearch.addEventListener('focus', () => {
+    if (clientSearch.value.trim().length === 0) {
+        mostrarMinhasTarefas();
+    }
+});
+
+function mostrarMinhasTarefas() {
+    clientResults.innerHTML = '';
+    clientResults.dataset.modo = 'minhas-tarefas';
+    clientResults.scrollTop = 0;
+    minhasTarefasCursor = null;
+    minhasTarefasFim = false;
+    
+    carregarPaginaMinhasTarefas();
+}
+
+async function carregarPaginaMinhasTarefas() {
+    if (minhasTarefasCarregando || minhasTarefasFim) return;
+    minhasTarefasCarregando = true;
+    
+    try {
+        const response = await fetch('/api/buscar-tarefas', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                limite: TAMANHO_PAGINA_TAREFAS,
+                cursor: minhasTarefasCursor
+            })
+        });
+        
+        const data = await response.json();
+        
+        // Usuário começou a buscar clientes enquanto a página carregava
+        if (!data.success || clientResults.dataset.modo !== 'minhas-tarefas') return;
+        
+        if (data.tarefas.length === 0 && !minhasTarefasCursor) {
+            clientResults.innerHTML = '<div class="no-results">Nenhuma tarefa atribuída</div>';
+        }
+        
+        data.tarefas.forEach(tarefa => {
+            const item = document.createElement('div');
+            item.className = 'search-result-item';
+            item.innerHTML = `
+                <span class="client-name">${tarefa.nome_tarefa} (${tarefa.prioridade || 'Sem prioridade'})</span>
+                <span class="client-cnpj">${tarefa.nom_cliente || formatarCNPJ(tarefa.cnpj_cpf)}</span>
+            `;
+            
+            item.addEventListener('click', () => {
+                selecionarTarefaDaLista(tarefa);
+            });
+            
+            clientResults.appendChild(item);
+        });
+        
+        minhasTarefasCursor = data.proximo_cursor;
+        minhasTarefasFim = !data.proximo_cursor;
+        clientResults.classList.add('show');
+    } catch (error) {
+        console.error('Erro ao carregar minhas tarefas:', error);
+    } finally {
+        minhasTarefasCarregando = false;
+    }
+}
+
+// Carregar próxima página ao chegar perto do fim da lista
+clientResults.addEventListener('scroll', () => {
+    if (clientResults.dataset.modo !== 'minhas-tarefas') return;
+    
+    if (clientResults.scrollTop + clientResults.clientHeight >= clientResults.scrollHeight - 50) {
+        carregarPaginaMinhasTarefas();
+    }
+});
+
+async function selecionarTarefaDaLista(tarefa) {
+    await selecionarCliente({
+        num_cnpj_cpf: tarefa.cnpj_cpf,
+        nom_cliente: tarefa.nom_cliente
+    });
+    
+    const opcao = Array.from(taskSelect.options).find(
+        option => option.value && JSON.parse(option.value).id === tarefa.id
+    );
+    
+    if (opcao) {
+        taskSelect.value = opcao.value;
+        btnStartTask.disabled = false;
+    }
+}
+
 // ========================================
 // CRIAR CARD DE TAREFA
 // ========================================
@@ -517,6 +620,10 @@ window.pausarTarefa = async function(taskId) {
             }
             
             adicionarMensagem('Tarefa pausada', 'bot');
+        } else if (response.status === 409) {
+            // Tarefa mudou de estado em outra aba: alinhar cards com o servidor
+            adicionarMensagem(data.message, 'bot');
+            await sincronizarTarefasAtivas();
         }
     } catch (error) {
         console.error('Erro ao pausar:', error);
@@ -574,6 +681,10 @@ window.retomarTarefa = async function(taskId) {
             }
             
             adicionarMensagem('Tarefa retomada', 'bot');
+        } else if (response.status === 409) {
+            // Tarefa mudou de estado em outra aba: alinhar cards com o servidor
+            adicionarMensagem(data.message, 'bot');
+            await sincronizarTarefasAtivas();
         }
     } catch (error) {
         console.error('Erro ao retomar:', error);
@@ -633,6 +744,10 @@ window.finalizarTarefa = async function(taskId) {
             activeTasks = activeTasks.filter(t => t.id !== taskId);
             removerTaskCard(taskId);
             console.log('✅ Tarefa removida:', taskId);
+        } else if (response.status === 409) {
+            // Já finalizada/alterada em outra aba: o servidor é a fonte da verdade
+            adicionarMensagem(data.message, 'bot');
+            await sincronizarTarefasAtivas();
         } else {
             console.error('❌ Erro do backend:', data.message);
             adicionarMensagem('Erro ao finalizar tarefa: ' + (data.message || 'Erro desconhecido'), 'bot');
@@ -668,7 +783,7 @@ chatForm.addEventListener('submit', async (e) => {
     mensagemInput.disabled = true;
     
     try {
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -676,14 +791,20 @@ chatForm.addEventListener('submit', async (e) => {
             body: JSON.stringify({ mensagem })
         });
         
-        const data = await response.json();
-        mostrarDigitando(false);
-        
-        if (data.success) {
-            adicionarMensagem(data.resposta, 'bot');
-        } else {
-            adicionarMensagem('Desculpe, ocorreu um erro. Tente novamente.', 'bot');
+        if (!response.ok) {
+            const data = await response.json();
+            mostrarDigitando(false);
+            
+            if (response.status === 503) {
+                // Assistente ocupado: o servidor recusou na hora em vez de enfileirar
+                adicionarMensagem(data.message, 'bot');
+            } else {
+                adicionarMensagem('Desculpe, ocorreu um erro. Tente novamente.', 'bot');
+            }
+            return;
         }
+        
+        await lerRespostaStream(response);
     } catch (error) {
         mostrarDigitando(false);
         adicionarMensagem('Erro de conexão. Verifique sua internet.', 'bot');
@@ -693,13 +814,104 @@ chatForm.addEventListener('submit', async (e) => {
     }
 });
 
+// ========================================
+// FINALIZAR TODAS (uma requisição para o lote)
+// ========================================
+async function finalizarTodasTarefas() {
+    const ids = activeTasks.map(t => t.id);
+    
+    try {
+        const response = await fetch('/api/tarefas/lote', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ acao: 'finalizar', apontamento_ids: ids })
+        });
+        
+        const data = await response.json();
+        
+        if (!data.success) {
+            adicionarMensagem('Erro ao finalizar tarefas: ' + (data.message || 'Erro desconhecido'), 'bot');
+            await sincronizarTarefasAtivas();
+            return false;
+        }
+        
+        const finalizadas = data.resultados.filter(r => r.success);
+        const totalHoras = finalizadas.reduce((soma, r) => soma + (Number(r.horas_trabalhadas) || 0), 0);
+        
+        finalizadas.forEach(r => {
+            activeTasks = activeTasks.filter(t => t.id !== r.apontamento_id);
+            removerTaskCard(r.apontamento_id);
+        });
+        
+        adicionarMensagem(`✔️ ${finalizadas.length} tarefa(s) finalizada(s) | Total: ${totalHoras.toFixed(2)}h`, 'bot');
+        return true;
+    } catch (error) {
+        console.error('❌ Erro ao finalizar tarefas em lote:', error);
+        adicionarMensagem('Erro ao finalizar tarefas: ' + error.message, 'bot');
+        return false;
+    }
+}
+
+// Lê o NDJSON do /api/chat/stream e vai preenchendo a mensagem do bot
+async function lerRespostaStream(response) {
+    const leitor = response.body.getReader();
+    const decodificador = new TextDecoder();
+    let pendente = '';
+    let textoBot = '';
+    let paragrafo = null;
+    
+    while (true) {
+        const { value, done } = await leitor.read();
+        if (done) break;
+        
+        pendente += decodificador.decode(value, { stream: true });
+        const linhas = pendente.split('\n');
+        pendente = linhas.pop();
+        
+        for (const linha of linhas) {
+            if (!linha.trim()) continue;
+            const evento = JSON.parse(linha);
+            
+            if (evento.tipo === 'token') {
+                textoBot += evento.texto;
+                
+                if (!paragrafo) {
+                    // Primeiro token: troca o "digitando" pela mensagem
+                    mostrarDigitando(false);
+                    paragrafo = adicionarMensagem(textoBot, 'bot');
+                } else {
+                    paragrafo.innerHTML = processarFormatacao(textoBot);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
+            } else if (evento.tipo === 'erro') {
+                mostrarDigitando(false);
+                adicionarMensagem(evento.texto || 'Desculpe, ocorreu um erro. Tente novamente.', 'bot');
+            } else if (evento.tipo === 'fim' && evento.atualizar_tarefas) {
+                // Comando local alterou as tarefas (ex.: "pausar tudo"): recarrega os cards
+                sincronizarTarefasAtivas();
+            }
+        }
+    }
+    
+    mostrarDigitando(false);
+}
+
 // ========================================
 // LOGOUT
 // ========================================
 btnLogout.addEventListener('click', async () => {
     if (activeTasks.length > 0) {
-        const confirmar = confirm('Você tem tarefas ativas. Deseja realmente sair?');
-        if (!confirmar) return;
+        const finalizarTudo = confirm(`Você tem ${activeTasks.length} tarefa(s) ativa(s). Deseja finalizar todas e sair?`);
+        
+        if (finalizarTudo) {
+            const finalizou = await finalizarTodasTarefas();
+            if (!finalizou) return;
+        } else {
+            const confirmar = confirm('Sair sem finalizar as tarefas ativas?');
+            if (!confirmar) return;
+        }
     }
     
     try {
@@ -745,6 +957,19 @@ async function verificarTarefasAtivas() {
     }
 }
 
+// Recarrega os cards a partir do servidor (após conflito de estado)
+async function sincronizarTarefasAtivas() {
+    activeTasks.forEach(t => {
+        const card = document.getElementById(`task-${t.id}`);
+        if (card) card.remove();
+        pararTimerTarefa(t.id);
+    });
+    activeTasks = [];
+    
+    await verificarTarefasAtivas();
+    atualizarUITarefas();
+}
+
 // Fechar resultados ao clicar fora
 document.addEventListener('click', (e) => {
     if (!clientSearch.contains(e.target) && !clientResults.contains(e.target)) {
@@ -952,6 +1177,16 @@ lateTaskForm.addEventListener('submit', async (e) => {
     btnRegisterLate.textContent = 'Registrando...';
     
     try {
+        // Avisar se o período se sobrepõe a outros apontamentos
+        const sobreposicao = await verificarSobreposicao(lateStartDateTime.value, lateEndDateTime.value);
+        if (sobreposicao.length > 0) {
+            const lista = sobreposicao
+                .map(a => `• ${a.cliente_nome} - ${a.tarefa_nome} (${a.data_inicio} até ${a.data_fim || 'em aberto'})`)
+                .join('\n');
+            const confirmar = confirm(`Este período se sobrepõe a ${sobreposicao.length} apontamento(s):\n\n${lista}\n\nDeseja registrar mesmo assim?`);
+            if (!confirmar) return;
+        }
+        
         const response = await fetch('/api/registrar-atrasado', {
             method: 'POST',
             headers: {
@@ -1003,6 +1238,25 @@ lateTaskForm.addEventListener('submit', async (e) => {
     }
 });
 
+async function verificarSobreposicao(dataInicio, dataFim) {
+    try {
+        const response = await fetch('/api/verificar-sobreposicao', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ data_inicio: dataInicio, data_fim: dataFim })
+        });
+        
+        const data = await response.json();
+        return data.success ? data.apontamentos : [];
+    } catch (error) {
+        // A verificação é só um aviso: não impede o registro
+        console.error('Erro ao verificar sobreposição:', error);
+        return [];
+    }
+}
+
 function formatarDataHora(data) {
     return data.toLocaleString('pt-BR', {
         day: '2-digit',
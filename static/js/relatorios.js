@@ -42,6 +42,11 @@ document.addEventListener('DOMContentLoaded', () => {
     if (btnExportar) {
         btnExportar.addEventListener('click', exportarExcel);
     }
+    
+    const btnExportarCSV = document.getElementById('btnExportarCSV');
+    if (btnExportarCSV) {
+        btnExportarCSV.addEventListener('click', exportarCSV);
+    }
 });
 
 // ========================================
@@ -126,41 +131,31 @@ async function gerarRelatorio() {
     btnAplicar.textContent = '⏳ Gerando...';
     
     try {
-        const filtros = {
-            ano: document.getElementById('filtroAno').value,
-            mes: document.getElementById('filtroMes').value,
-            departamento: document.getElementById('filtroDepartamento').value,
-            funcionario: document.getElementById('filtroFuncionario').value,
-            grupo: document.getElementById('filtroGrupo').value,
-            tarefa: document.getElementById('filtroTarefa').value
-        };
-        
-        const response = await fetch('/api/relatorio-tempo', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(filtros)
-        });
-        
-        const data = await response.json();
+        // Calculado em segundo plano (job): relatórios do ano inteiro não prendem o servidor
+        const job = await executarJobRelatorio({ tipo: 'relatorio', ...lerFiltrosRelatorio() });
         
-        if (data.success) {
-            renderizarRelatorio(data.dados);
+        if (job.status === 'concluido') {
+            const response = await fetch(job.download_url);
+            const dados = await response.json();
+            
+            renderizarRelatorio(dados);
             
             // Mostrar botão de exportar se houver dados
             const btnExportar = document.getElementById('btnExportarExcel');
-            if (Object.keys(data.dados).length > 0) {
+            const btnExportarCSV = document.getElementById('btnExportarCSV');
+            if (Object.keys(dados).length > 0) {
                 btnExportar.style.display = 'inline-block';
+                btnExportarCSV.style.display = 'inline-block';
             } else {
                 btnExportar.style.display = 'none';
+                btnExportarCSV.style.display = 'none';
             }
         } else {
-            alert('Erro ao gerar relatório: ' + data.message);
+            alert('Erro ao gerar relatório: ' + (job.mensagem || job.message || 'Erro desconhecido'));
         }
     } catch (error) {
         console.error('Erro ao gerar relatório:', error);
-        alert('Erro ao gerar relatório. Tente novamente.');
+        alert('Erro ao gerar relatório: ' + error.message);
     } finally {
         btnAplicar.disabled = false;
         btnAplicar.textContent = '🔍 Aplicar Filtros';
@@ -435,46 +430,104 @@ function limparFiltros() {
     
     // Esconder botão de exportar
     document.getElementById('btnExportarExcel').style.display = 'none';
+    document.getElementById('btnExportarCSV').style.display = 'none';
+}
+
+// ========================================
+// EXPORTAR APONTAMENTOS (CSV LINHA A LINHA)
+// ========================================
+
+async function exportarCSV() {
+    const btnExportarCSV = document.getElementById('btnExportarCSV');
+    const textoOriginal = btnExportarCSV.textContent;
+    btnExportarCSV.disabled = true;
+    btnExportarCSV.textContent = '⏳ Exportando...';
+    
+    try {
+        // Gerado em segundo plano (job): milhões de linhas não prendem o servidor
+        const job = await executarJobRelatorio({ tipo: 'csv', formato: 'csv', ...lerFiltrosRelatorio() });
+        
+        if (job.status === 'concluido') {
+            window.location.href = job.download_url;
+        } else {
+            alert('Erro ao exportar: ' + (job.mensagem || job.message || 'Erro desconhecido'));
+        }
+    } catch (error) {
+        console.error('Erro ao exportar CSV:', error);
+        alert('Erro ao exportar CSV: ' + error.message);
+    } finally {
+        btnExportarCSV.disabled = false;
+        btnExportarCSV.textContent = textoOriginal;
+    }
 }
 
 // ========================================
 // EXPORTAR RELATÓRIO PARA EXCEL
 // ========================================
 
+// Espera máxima no navegador (o servidor marca como erro após RELATORIOS_JOBS_TIMEOUT_MINUTOS)
+const ESPERA_MAXIMA_JOB_MS = 35 * 60 * 1000;
+
+// Consulta o job até terminar (concluido/erro) ou estourar a espera máxima
+async function aguardarJobRelatorio(jobId, intervaloMs = 2000, esperaMaximaMs = ESPERA_MAXIMA_JOB_MS) {
+    const limite = Date.now() + esperaMaximaMs;
+    
+    while (Date.now() < limite) {
+        const response = await fetch(`/api/relatorios/jobs/${jobId}`);
+        const job = await response.json();
+        
+        if (!job.success || job.status === 'concluido' || job.status === 'erro') {
+            return job;
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, intervaloMs));
+    }
+    
+    return { success: false, status: 'erro', message: 'O relatório demorou demais para ficar pronto. Tente novamente.' };
+}
+
+function lerFiltrosRelatorio() {
+    return {
+        ano: document.getElementById('filtroAno').value,
+        mes: document.getElementById('filtroMes').value,
+        departamento: document.getElementById('filtroDepartamento').value,
+        funcionario: document.getElementById('filtroFuncionario').value,
+        grupo: document.getElementById('filtroGrupo').value,
+        tarefa: document.getElementById('filtroTarefa').value
+    };
+}
+
+// Enfileira o job (tipo relatorio, excel ou csv) e espera terminar; erro ao enfileirar → exceção
+// (mês fechado pré-gerado: o job já vem concluído)
+async function executarJobRelatorio(corpo) {
+    const response = await fetch('/api/relatorios/jobs', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(corpo)
+    });
+    
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.message || 'Erro desconhecido');
+    }
+    
+    return aguardarJobRelatorio(data.job_id);
+}
+
 async function exportarExcel() {
     const btnExportar = document.getElementById('btnExportarExcel');
     btnExportar.disabled = true;
     btnExportar.textContent = '⏳ Exportando...';
     
     try {
-        const filtros = {
-            ano: document.getElementById('filtroAno').value,
-            mes: document.getElementById('filtroMes').value,
-            departamento: document.getElementById('filtroDepartamento').value,
-            funcionario: document.getElementById('filtroFuncionario').value,
-            grupo: document.getElementById('filtroGrupo').value,
-            tarefa: document.getElementById('filtroTarefa').value
-        };
-        
-        const response = await fetch('/api/exportar-relatorio-excel', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(filtros)
-        });
+        // Relatório gerado em segundo plano: o servidor devolve um job para acompanhar
+        const job = await executarJobRelatorio({ tipo: 'excel', ...lerFiltrosRelatorio() });
         
-        if (response.ok) {
-            // Baixar arquivo
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = `relatorio_horas_${new Date().getTime()}.xlsx`;
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
+        if (job.status === 'concluido') {
+            // Download direto do arquivo gerado
+            window.location.href = job.download_url;
             
             // Feedback visual
             btnExportar.textContent = '✅ Exportado!';
@@ -482,12 +535,13 @@ async function exportarExcel() {
                 btnExportar.textContent = '📥 Exportar Excel';
             }, 2000);
         } else {
-            const data = await response.json();
-            alert('Erro ao exportar: ' + (data.message || 'Erro desconhecido'));
+            alert('Erro ao exportar: ' + (job.mensagem || job.message || 'Erro desconhecido'));
+            btnExportar.textContent = '📥 Exportar Excel';
         }
     } catch (error) {
         console.error('Erro ao exportar Excel:', error);
-        alert('Erro ao exportar Excel. Tente novamente.');
+        alert('Erro ao exportar Excel: ' + error.message);
+        btnExportar.textContent = '📥 Exportar Excel';
     } finally {
         btnExportar.disabled = false;
     }
@@ -0,0 +1,45 @@
+"""
+Controle de versões dos caches em memória
+- app.py guarda caches por worker e compara a versão antes de usá-los
+- admin_app.py e os scripts de importação incrementam a versão após gravar
+- A versão fica em arquivo local: consultar não custa ida ao banco
+"""
+
+import os
+import uuid
+
+# Nomes de versão usados pelos caches
+VERSAO_TAREFAS = 'tarefas'
+VERSAO_CLIENTES = 'clientes'
+
+def _diretorio_versoes():
+    """Diretório onde ficam os arquivos de versão (configurável via .env)"""
+    return os.getenv('CACHE_VERSOES_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_versoes')
+
+def _caminho_versao(nome):
+    return os.path.join(_diretorio_versoes(), f"{nome}.versao")
+
+def obter_versao(nome):
+    """Retorna a versão atual de um cache (None se nunca foi incrementada)"""
+    try:
+        with open(_caminho_versao(nome)) as arquivo:
+            return arquivo.read().strip()
+    except OSError:
+        return None
+
+def incrementar_versao(nome):
+    """Gera uma nova versão para o cache, invalidando as cópias em memória"""
+    try:
+        os.makedirs(_diretorio_versoes(), exist_ok=True)
+        nova_versao = uuid.uuid4().hex
+
+        # Escrita atômica: grava em arquivo temporário e substitui
+        temporario = f"{_caminho_versao(nome)}.{os.getpid()}.tmp"
+        with open(temporario, 'w') as arquivo:
+            arquivo.write(nova_versao)
+        os.replace(temporario, _caminho_versao(nome))
+
+        return nova_versao
+    except OSError as e:
+        print(f"⚠️ Erro ao incrementar versão do cache '{nome}': {e}")
+        return None